@@ -0,0 +1,74 @@
+"""Per-response cost of serializing an auth response.
+
+Compares the old path (hand-built dict, `-> Dict` validation, jsonable_encoder,
+json.dumps as done by JSONResponse) with UserPayload rendered by orjson.
+
+    python -m benchmarks.bench_user_serialization
+"""
+import json
+import os
+import timeit
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Dict
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+import orjson
+
+from src.auth.models import UserRole
+from src.auth.serializers import TokenPayload, UserPayload
+
+ROUNDS = 50_000
+
+user = SimpleNamespace(
+    id=42,
+    username="ada",
+    email="ada@example.com",
+    profile_picture_url="https://storage.googleapis.com/bucket/profile_pictures/42.png",
+    latitude=6.5244,
+    longitude=3.3792,
+    role=UserRole.user,
+    created_dt=datetime(2024, 5, 1, 12, 30),
+    expo_push_token="ExponentPushToken[xxxxxxxxxxxxxxxxxxxxxx]",
+    is_super_admin=False,
+)
+dict_field = TypeAdapter(Dict)
+
+
+def legacy():
+    content = {
+        "access_token": "a" * 180,
+        "refresh_token": "r" * 200,
+        "token_type": "bearer",
+        "user": {
+            "id": user.id,
+            "username": user.username,
+            "email": user.email,
+            "profile_picture_url": user.profile_picture_url,
+            "latitude": user.latitude,
+            "longitude": user.longitude,
+            "role": user.role.value,
+            "created_dt": user.created_dt,
+            "expo_push_token": user.expo_push_token,
+        },
+    }
+    content = jsonable_encoder(dict_field.validate_python(content))
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def payload():
+    return orjson.dumps(TokenPayload("a" * 180, "r" * 200, UserPayload.from_user(user)))
+
+
+def main():
+    assert json.loads(legacy()) == json.loads(payload())
+    for name, fn in (("legacy dict + JSONResponse", legacy), ("UserPayload + orjson", payload)):
+        best = min(timeit.repeat(fn, number=ROUNDS, repeat=5))
+        print(f"{name:<28} {best / ROUNDS * 1e6:8.2f} us/response")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+"""Load test of the API's hot paths against a real uvicorn server.
+
+Each scenario runs for a fixed time with a pool of virtual users, each sending one request after
+another; throughput and p50/p95/p99 latency are reported per scenario and can be compared with a
+stored baseline. Firebase Storage and the Expo push service are replaced by in-process fakes with
+a configurable delay, so runs need no credentials and do not leave the machine.
+
+    # Server started in-process on a throwaway SQLite database
+    python -m benchmarks.load_test run --duration 10 --concurrency 16
+
+    # Postgres, with the server in its own processes (the same fakes are installed in every worker)
+    DATABASE_URL=postgresql://... python -m benchmarks.load_test serve --port 8000 --workers 4
+    python -m benchmarks.load_test run --url http://127.0.0.1:8000 --database-url postgresql://...
+
+    # Record a baseline, then fail (exit 1) when a later run is more than 15% worse
+    python -m benchmarks.load_test run --save-baseline benchmarks/baselines/local.json
+    python -m benchmarks.load_test run --baseline benchmarks/baselines/local.json --tolerance 0.15
+"""
+import argparse
+import asyncio
+import io
+import itertools
+import json
+import math
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from tests.fakes import configure_environment, install_fakes
+
+BENCH_PASSWORD = "bench-password"
+# 1x1 transparent PNG
+PNG_BYTES = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c63000100000500010d0a2db40000000049454e44ae426082"
+)
+LISTING_WORDS = ("dog", "cat", "parrot", "rabbit", "puppy", "kitten")
+
+
+def app_factory():
+    """uvicorn factory for `serve`; every worker process installs the fakes before importing the app."""
+    configure_environment(os.environ.get("DATABASE_URL") or default_database_url())
+    install_fakes()
+    from src.main import app
+    return app
+
+
+def default_database_url() -> str:
+    return f"sqlite:///{os.path.join(tempfile.gettempdir(), 'vetlink_bench.db')}"
+
+
+def seed(users: int) -> Dict:
+    """Creates bench users, approved vets near them, listings and chat rooms; reuses them when present."""
+    import src.main  # noqa: F401 - registers every model and creates the tables
+    from src.database import SessionLocal
+    from src.auth.models import User, UserRole
+    from src.auth.services import bcrypt_context
+    from src.chat.models import ChatRoom
+    from src.petlisting.models import PetListing
+    from src.veterinarians.models import Veterinarian
+
+    db = SessionLocal()
+    try:
+        hashed = bcrypt_context.hash(BENCH_PASSWORD)
+        existing = {user.username: user for user in db.query(User).filter(User.username.like("bench%")).all()}
+        for i in range(users):
+            if f"bench{i}" not in existing:
+                db.add(User(username=f"bench{i}", email=f"bench{i}@example.com", hashed_password=hashed, role=UserRole.user, latitude=6.52, longitude=3.38))
+        if "benchvet0" not in existing:
+            for i in range(20):
+                vet_user = User(username=f"benchvet{i}", email=f"benchvet{i}@example.com", hashed_password=hashed, role=UserRole.veterinarian)
+                db.add(vet_user)
+                db.flush()
+                db.add(Veterinarian(user_id=vet_user.id, clinic_name=f"Bench Clinic {i}", specialty=["general"], services_offered=["vaccination"],
+                                    approved=True, latitude=6.52 + i * 0.01, longitude=3.38 + i * 0.01))
+            owner = db.query(User).filter(User.username == "benchvet0").first()
+            for i, word in zip(range(300), itertools.cycle(LISTING_WORDS)):
+                db.add(PetListing(title=f"Friendly {word} #{i}", description=f"A healthy {word}. " * 40, price=100 + i, location="Lagos",
+                                  pet_type=word, breed="mixed", age=1.5, sex="female", user_id=owner.id))
+        db.commit()
+
+        vet = db.query(Veterinarian).order_by(Veterinarian.id).first()
+        listing = db.query(PetListing).order_by(PetListing.id).first()
+        rooms = {}
+        for i in range(users):
+            user = db.query(User).filter(User.username == f"bench{i}").first()
+            room = db.query(ChatRoom).filter(ChatRoom.user_id == user.id, ChatRoom.veterinarian_id == vet.id).first()
+            if room is None:
+                room = ChatRoom(user_id=user.id, veterinarian_id=vet.id)
+                db.add(room)
+                db.commit()
+            rooms[f"bench{i}"] = room.id
+        return {"veterinarian_id": vet.id, "listing_id": listing.id, "chat_rooms": rooms}
+    finally:
+        db.close()
+
+
+class VirtualUser:
+    def __init__(self, username: str, token: str, chat_room_id: int):
+        self.username = username
+        self.token = token
+        self.chat_room_id = chat_room_id
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.websocket = None
+
+
+def expect(response, *statuses):
+    if response.status_code not in (statuses or (200,)):
+        raise RuntimeError(f"{response.request.method} {response.request.url.path} -> {response.status_code}")
+
+
+async def login(client, user: VirtualUser, data: Dict):
+    expect(await client.post("/v1/auth/token", json={"identifier": user.username, "password": BENCH_PASSWORD}))
+
+async def profile(client, user: VirtualUser, data: Dict):
+    expect(await client.get("/v1/auth/profile", headers=user.headers))
+
+async def appointments(client, user: VirtualUser, data: Dict):
+    expect(await client.get("/v1/appointments/", headers=user.headers))
+
+async def pet_records(client, user: VirtualUser, data: Dict):
+    expect(await client.get("/v1/pet-records/", headers=user.headers))
+
+async def nearby_vets(client, user: VirtualUser, data: Dict):
+    expect(await client.post("/v1/vet/nearby", json={"latitude": 6.52, "longitude": 3.38}, headers=user.headers))
+
+_search_words = itertools.cycle(LISTING_WORDS)
+
+async def listing_search(client, user: VirtualUser, data: Dict):
+    expect(await client.get("/v1/listings/search", params={"search_term": next(_search_words)}))
+
+async def book_appointment(client, user: VirtualUser, data: Dict):
+    # Less than a day ahead, so no reminder timer thread is scheduled per booking
+    appointment_date = (datetime.now() + timedelta(hours=6)).isoformat()
+    payload = {"veterinarian_id": data["veterinarian_id"], "appointment_date": appointment_date, "notes": "load test"}
+    expect(await client.post("/v1/appointments/", json=payload, headers=user.headers), 201)
+
+async def image_upload(client, user: VirtualUser, data: Dict):
+    files = {"images": ("pet.png", io.BytesIO(PNG_BYTES), "image/png")}
+    expect(await client.post(f"/v1/listings/{data['listing_id']}/images/", files=files, headers=user.headers))
+
+_message_ids = itertools.count()
+
+async def chat_message(client, user: VirtualUser, data: Dict):
+    import websockets
+    if user.websocket is None:
+        url = f"{data['ws_url']}/v1/chat/ws/{user.chat_room_id}?token={user.token}"
+        user.websocket = await websockets.connect(url)
+    marker = f"{user.username}:{next(_message_ids)}"
+    await user.websocket.send(marker)
+    # Every message is broadcast to all open sockets; wait for our own echo
+    while marker not in await user.websocket.recv():
+        pass
+
+SCENARIOS: Dict[str, Callable] = {
+    "login": login,
+    "profile": profile,
+    "appointments": appointments,
+    "pet_records": pet_records,
+    "nearby_vets": nearby_vets,
+    "listing_search": listing_search,
+    "book_appointment": book_appointment,
+    "image_upload": image_upload,
+    "chat_websocket": chat_message,
+}
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    # Nearest rank
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+async def run_scenario(client, scenario: Callable, users: List[VirtualUser], data: Dict, duration: float) -> Dict:
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    deadline = time.monotonic() + duration
+
+    async def virtual_user(user: VirtualUser):
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                await scenario(client, user, data)
+            except Exception as e:
+                key = str(e)[:120]
+                errors[key] = errors.get(key, 0) + 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    started = time.monotonic()
+    await asyncio.gather(*(virtual_user(user) for user in users))
+    elapsed = time.monotonic() - started
+    for user in users:
+        if user.websocket is not None:
+            await user.websocket.close()
+            user.websocket = None
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": sum(errors.values()),
+        "error_samples": dict(sorted(errors.items(), key=lambda item: -item[1])[:3]),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+def start_server(port: int) -> None:
+    import uvicorn
+    from src.main import app
+
+    # Signal handlers are only installed from the main thread, so the server runs fine in a daemon thread
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, name="bench-server", daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+
+def free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+async def run(args) -> Dict:
+    import httpx
+
+    data = seed(args.concurrency)
+    base_url = args.url
+    if base_url is None:
+        port = free_port()
+        start_server(port)
+        base_url = f"http://127.0.0.1:{port}"
+    data["ws_url"] = base_url.replace("http", "ws", 1)
+
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency * 2)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        users = []
+        for i in range(args.concurrency):
+            response = await client.post("/v1/auth/token", json={"identifier": f"bench{i}", "password": BENCH_PASSWORD})
+            expect(response)
+            users.append(VirtualUser(f"bench{i}", response.json()["access_token"], data["chat_rooms"][f"bench{i}"]))
+
+        results = {}
+        for name in args.scenarios:
+            # A short warm-up fills caches and pools so the measured window is steady state
+            await run_scenario(client, SCENARIOS[name], users, data, min(1.0, args.duration / 5))
+            results[name] = await run_scenario(client, SCENARIOS[name], users, data, args.duration)
+            print_row(name, results[name])
+    return results
+
+
+def print_row(name: str, result: Dict) -> None:
+    print(f"{name:<18} {result['requests']:>8} {result['errors']:>7} {result['rps']:>9.1f} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} {result['p99_ms']:>9.2f}")
+    for message, count in result["error_samples"].items():
+        print(f"{'':<18} {count} x {message}")
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if previous is None:
+            continue
+        for metric in ("p50_ms", "p95_ms", "p99_ms"):
+            if previous[metric] and result[metric] > previous[metric] * (1 + tolerance):
+                regressions.append(f"{name}: {metric} {previous[metric]} -> {result[metric]}")
+        if previous["rps"] and result["rps"] < previous["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: rps {previous['rps']} -> {result['rps']}")
+        if result["errors"] > previous.get("errors", 0):
+            regressions.append(f"{name}: errors {previous.get('errors', 0)} -> {result['errors']}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.load_test")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run the scenarios and report latency percentiles")
+    run_parser.add_argument("--url", help="Server to test; by default one is started in-process")
+    run_parser.add_argument("--database-url", default=os.environ.get("DATABASE_URL") or default_database_url(),
+                            help="Database to seed (and serve from, when the server is in-process)")
+    run_parser.add_argument("--duration", type=float, default=10, help="Seconds per scenario")
+    run_parser.add_argument("--concurrency", type=int, default=8, help="Virtual users per scenario")
+    run_parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma separated subset of: " + ", ".join(SCENARIOS))
+    run_parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    run_parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed slowdown before a metric counts as a regression")
+    run_parser.add_argument("--save-baseline", help="Write this run's results here")
+
+    serve_parser = commands.add_parser("serve", help="Run the app under uvicorn with the fakes installed")
+    serve_parser.add_argument("--port", type=int, default=8000)
+    serve_parser.add_argument("--workers", type=int, default=1)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        import uvicorn
+        uvicorn.run("benchmarks.load_test:app_factory", factory=True, host="127.0.0.1", port=args.port, workers=args.workers, log_level="warning")
+        return 0
+
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+
+    configure_environment(args.database_url)
+    install_fakes()
+    print(f"{'scenario':<18} {'requests':>8} {'errors':>7} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    results = asyncio.run(run(args))
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save_baseline)), exist_ok=True)
+        with open(args.save_baseline, "w") as f:
+            json.dump({"created_at": datetime.utcnow().isoformat(), "duration": args.duration, "concurrency": args.concurrency, "scenarios": results}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("\nNo regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
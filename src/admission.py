@@ -0,0 +1,162 @@
+# src/admission.py
+import asyncio
+import math
+import os
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+from cachetools import TTLCache
+from jose import JWTError
+from starlette.responses import JSONResponse
+from src.auth.services import decode_access_token
+
+
+class RouteClass:
+    """Concurrency, queueing and per-client rate limits shared by a group of routes."""
+
+    def __init__(self, name: str, concurrency: int, queue_size: int, queue_timeout: float, rate: float, burst: int):
+        self.name = name
+        self.concurrency = int(os.getenv(f"ADMISSION_{name.upper()}_CONCURRENCY", concurrency))
+        self.queue_size = int(os.getenv(f"ADMISSION_{name.upper()}_QUEUE", queue_size))
+        self.queue_timeout = float(os.getenv(f"ADMISSION_{name.upper()}_QUEUE_TIMEOUT", queue_timeout))
+        self.rate = float(os.getenv(f"ADMISSION_{name.upper()}_RATE", rate))  # Tokens per second per client
+        self.burst = int(os.getenv(f"ADMISSION_{name.upper()}_BURST", burst))
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        # client key -> (tokens, last refill); idle clients fall out after a minute
+        self.buckets: TTLCache = TTLCache(maxsize=100_000, ttl=60)
+        self.in_flight = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected_rate_limited = 0
+        self.rejected_overloaded = 0
+
+    def take_token(self, key: str) -> float:
+        """Spends one token from the client's bucket; returns 0 or the seconds until one is available."""
+        now = time.monotonic()
+        tokens, last = self.buckets.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        if tokens < 1:
+            self.buckets[key] = (tokens, now)
+            return (1 - tokens) / self.rate
+        self.buckets[key] = (tokens - 1, now)
+        return 0.0
+
+    async def acquire(self) -> bool:
+        if not self.semaphore.locked() and not self.queued:
+            await self.semaphore.acquire()
+            return True
+        if self.queued >= self.queue_size:
+            return False
+        self.queued += 1
+        try:
+            await asyncio.wait_for(self.semaphore.acquire(), self.queue_timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.queued -= 1
+
+    def stats(self) -> Dict:
+        return {
+            "concurrency": self.concurrency,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "queue_size": self.queue_size,
+            "admitted": self.admitted,
+            "rejected_rate_limited": self.rejected_rate_limited,
+            "rejected_overloaded": self.rejected_overloaded,
+        }
+
+
+ROUTE_CLASSES: Dict[str, RouteClass] = {
+    # bcrypt and Firebase verification make logins CPU heavy
+    "auth": RouteClass("auth", concurrency=8, queue_size=32, queue_timeout=2.0, rate=1.0, burst=10),
+    # Multi-image uploads hold the worker for the whole Firebase round trip
+    "upload": RouteClass("upload", concurrency=4, queue_size=8, queue_timeout=5.0, rate=0.5, burst=5),
+    # Nearby vets computes a geodesic distance per approved vet
+    "geo": RouteClass("geo", concurrency=8, queue_size=16, queue_timeout=1.0, rate=2.0, burst=10),
+    "default": RouteClass("default", concurrency=64, queue_size=256, queue_timeout=2.0, rate=20.0, burst=40),
+}
+
+ROUTE_PATTERNS: List[Tuple[str, "re.Pattern", str]] = [
+    ("POST", re.compile(r"^/v1/auth/(token(/google|/facebook)?|signup)$"), "auth"),
+    ("POST", re.compile(r"^/v1/listings/\d+/images/?$"), "upload"),
+    ("POST", re.compile(r"^/v1/auth/upload-profile-picture$"), "upload"),
+    ("POST", re.compile(r"^/v1/vet/upload-document$"), "upload"),
+    ("POST", re.compile(r"^/v1/auth/admin/import$"), "upload"),
+    ("POST", re.compile(r"^/v1/vet/nearby$"), "geo"),
+]
+
+
+def classify(method: str, path: str) -> RouteClass:
+    for route_method, pattern, name in ROUTE_PATTERNS:
+        if method == route_method and pattern.match(path):
+            return ROUTE_CLASSES[name]
+    return ROUTE_CLASSES["default"]
+
+
+def client_key(scope, by_user: bool = True) -> str:
+    """Keys by the user id of a validly signed bearer token, else by client IP.
+
+    Only signed tokens count: an unverified claim would let a caller pick a fresh bucket per request,
+    or spend someone else's. Pass by_user=False for routes that callers reach before logging in.
+    """
+    if by_user:
+        for name, value in scope.get("headers", ()):
+            if name == b"authorization" and value[:7].lower() == b"bearer ":
+                try:
+                    claims = decode_access_token(value[7:].decode("latin-1"))
+                    return f"user:{int(claims['id'])}"
+                except (JWTError, KeyError, TypeError, ValueError):
+                    break
+    client = scope.get("client")
+    return f"ip:{client[0]}" if client else "ip:unknown"
+
+
+def rejection(status_code: int, detail: str, retry_after: float) -> JSONResponse:
+    return JSONResponse({"detail": detail}, status_code=status_code, headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+
+def admission_stats() -> Dict[str, Dict]:
+    return {name: route_class.stats() for name, route_class in ROUTE_CLASSES.items()}
+
+
+class AdmissionControlMiddleware:
+    """Fails fast with 429/503 instead of letting expensive routes starve cheap ones."""
+
+    def __init__(self, app, exempt_paths: Optional[List[str]] = None, hold_slot: bool = True):
+        self.app = app
+        # False for batch sub-requests: they still spend their class's rate tokens, but the batch request
+        # already holds a concurrency slot, and waiting for a second one would queue behind itself
+        self.hold_slot = hold_slot
+        # Event streams stay open for the whole session and would pin a concurrency slot each
+        self.exempt_paths = set(exempt_paths or ["/", "/admission", "/pool", "/metrics", "/loop-blocking", "/v1/events/stream"])
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+
+        route_class = classify(scope["method"], scope["path"])
+        # Login and signup are what brute forcing targets, so their buckets are per IP whatever the token says
+        retry_after = route_class.take_token(client_key(scope, by_user=route_class.name != "auth"))
+        if retry_after:
+            route_class.rejected_rate_limited += 1
+            await rejection(429, "Too many requests", retry_after)(scope, receive, send)
+            return
+        if not self.hold_slot:
+            await self.app(scope, receive, send)
+            return
+
+        if not await route_class.acquire():
+            route_class.rejected_overloaded += 1
+            await rejection(503, "Server is busy, please retry", route_class.queue_timeout)(scope, receive, send)
+            return
+
+        route_class.in_flight += 1
+        route_class.admitted += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            route_class.in_flight -= 1
+            route_class.semaphore.release()
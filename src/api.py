@@ -5,6 +5,10 @@ from src.appointments.views import router as appointments_router
 from src.petRecord.views import router as pet_records_router
 from src.petlisting.views import router as pet_listing_router
 from src.chat.views import router as chat_router
+from src.sync.views import router as sync_router
+from src.events.views import router as events_router
+from src.batch.views import router as batch_router
+from src.profiling import router as profiling_router
 
 
 
@@ -17,3 +21,7 @@ router.include_router(appointments_router)
 router.include_router(pet_records_router)
 router.include_router(pet_listing_router)
 router.include_router(chat_router)
+router.include_router(sync_router)
+router.include_router(events_router)
+router.include_router(batch_router)
+router.include_router(profiling_router)
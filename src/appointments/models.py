@@ -14,6 +14,7 @@ class Appointment(Base):
     phone_number = Column(String, nullable=True)  # Phone number for contact
     status = Column(String, nullable=False, default="pending")
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # Relationships
     user = relationship("User", back_populates="appointments")
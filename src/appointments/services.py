@@ -1,10 +1,15 @@
 import os
+import time
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
-from typing import List
+from typing import List, Optional
 from src.appointments.models import Appointment
 from src.appointments.schemas import AppointmentCreate, AppointmentUpdate
 from src.auth.models import User
+from src.events.services import publish_event
+from src.fieldsets import Fields, column_options
+from src.metrics import NOTIFICATION_LATENCY, NOTIFICATION_FAILURES
 from datetime import datetime, timedelta
 import threading
 from exponent_server_sdk import PushClient, PushMessage, PushServerError, DeviceNotRegisteredError
@@ -21,6 +26,7 @@ def create_appointment(db: Session, user_id: int, appointment_data: AppointmentC
     db.add(appointment)
     db.commit()
     db.refresh(appointment)
+    publish_event("appointment.created", appointment.id, appointment.user_id, appointment.veterinarian_id, status=appointment.status)
 
     # Send notification to the veterinarian about the new appointment if created by the user
     if creator_role == 'user':
@@ -56,6 +62,7 @@ def update_appointment(db: Session, appointment_id: int, appointment_data: Appoi
     
     db.commit()
     db.refresh(appointment)
+    publish_event("appointment.updated", appointment.id, appointment.user_id, appointment.veterinarian_id, status=appointment.status)
 
     recipient_id = appointment.user_id if updater_role == 'veterinarian' else appointment.veterinarian_id
     
@@ -77,11 +84,20 @@ def get_appointment_by_id(db: Session, appointment_id: int) -> Appointment:
         raise HTTPException(status_code=404, detail="Appointment not found")
     return appointment
 
-def get_user_appointments(db: Session, user_id: int) -> List[Appointment]:
-    return db.query(Appointment).filter(Appointment.user_id == user_id).all()
+def get_user_appointments(db: Session, user_id: int, fields: Fields = None) -> List[Appointment]:
+    return db.query(Appointment).options(*column_options(Appointment, fields)).filter(Appointment.user_id == user_id).all()
 
-def get_veterinarian_appointments(db: Session, veterinarian_id: int) -> List[Appointment]:
-    return db.query(Appointment).filter(Appointment.veterinarian_id == veterinarian_id).all()
+def get_veterinarian_appointments(db: Session, veterinarian_id: int, fields: Fields = None) -> List[Appointment]:
+    return db.query(Appointment).options(*column_options(Appointment, fields)).filter(Appointment.veterinarian_id == veterinarian_id).all()
+
+# Row count, newest change and highest id: changes whenever a listed appointment is added, edited or cancelled
+def get_appointments_version(db: Session, user_id: Optional[int] = None, veterinarian_id: Optional[int] = None) -> tuple:
+    query = db.query(func.count(Appointment.id), func.max(Appointment.updated_at), func.max(Appointment.id))
+    if veterinarian_id is not None:
+        query = query.filter(Appointment.veterinarian_id == veterinarian_id)
+    else:
+        query = query.filter(Appointment.user_id == user_id)
+    return tuple(query.one())
 
 def send_notification(title: str, body: str, recipient_user_id: int, db: Session):
     user = db.query(User).filter(User.id == recipient_user_id).first()
@@ -95,16 +111,22 @@ def send_notification(title: str, body: str, recipient_user_id: int, db: Session
         data={"extra": "data"}  
     )
 
+    started = time.perf_counter()
     try:
         response = PushClient().publish(message)
         response.validate_response() 
     except DeviceNotRegisteredError:
+        NOTIFICATION_FAILURES.labels("device_not_registered").inc()
         user.expo_push_token = None
         db.commit()
     except PushServerError as exc:
+        NOTIFICATION_FAILURES.labels("push_server_error").inc()
         print(f"Push server error: {exc}")
     except Exception as e:
+        NOTIFICATION_FAILURES.labels("error").inc()
         print(f"Failed to send notification: {str(e)}")
+    finally:
+        NOTIFICATION_LATENCY.observe(time.perf_counter() - started)
 
 def schedule_reminder(appointment: Appointment, db: Session):
     def send_reminder():
@@ -135,5 +157,7 @@ def cancel_appointment(db: Session, appointment_id: int, current_user: User):
         db=db
     )
 
+    audience = (appointment.id, appointment.user_id, appointment.veterinarian_id)
     db.delete(appointment)
     db.commit()
+    publish_event("appointment.canceled", *audience, status="canceled", canceled_by=canceled_by.lower())
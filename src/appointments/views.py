@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from src.database import get_db
-from src.auth.services import get_current_user
+from src.auth.services import get_current_user, get_current_principal, Principal
+from src.auth.models import UserRole
 from src.appointments.schemas import AppointmentCreate, AppointmentUpdate, AppointmentSchema
 from src.appointments.services import (
     create_appointment,
@@ -11,7 +12,10 @@ from src.appointments.services import (
     get_user_appointments,
     get_veterinarian_appointments,
     cancel_appointment,
+    get_appointments_version,
 )
+from src.caching import make_etag, etag_matches, not_modified
+from src.fieldsets import FIELDS_QUERY, parse_fields, partial_response
 
 router = APIRouter(prefix="/appointments", tags=["appointments"])
 
@@ -41,25 +45,40 @@ async def update_appointment_route(
     updater_role = 'veterinarian' if current_user.id == appointment.veterinarian_id else 'user'
     return update_appointment(db, appointment_id, appointment_data, updater_id=current_user.id, updater_role=updater_role)
 
-# List all appointments for the current user
+# List all appointments for the current user; fields= limits the columns fetched and returned
 @router.get("/", response_model=List[AppointmentSchema])
 async def list_user_appointments(
+    request: Request,
+    response: Response,
+    fields: Optional[str] = FIELDS_QUERY,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    principal: Principal = Depends(get_current_principal)
 ):
-    if current_user.role == 'veterinarian':
-        return get_veterinarian_appointments(db, current_user.id)
-    return get_user_appointments(db, current_user.id)
+    selected = parse_fields(fields, AppointmentSchema)
+    is_veterinarian = principal.role == UserRole.veterinarian and principal.veterinarian_id
+    filters = {"veterinarian_id": principal.veterinarian_id} if is_veterinarian else {"user_id": principal.id}
+    etag = make_etag("appointments", principal.id, get_appointments_version(db, **filters), selected)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+
+    if is_veterinarian:
+        appointments = get_veterinarian_appointments(db, principal.veterinarian_id, selected)
+    else:
+        appointments = get_user_appointments(db, principal.id, selected)
+    if selected:
+        return partial_response(AppointmentSchema, selected, appointments, headers={"ETag": etag})
+    return appointments
 
 # Get details of a specific appointment
 @router.get("/{appointment_id}", response_model=AppointmentSchema)
 async def get_appointment_route(
     appointment_id: int,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    principal: Principal = Depends(get_current_principal)
 ):
     appointment = get_appointment_by_id(db, appointment_id)
-    if appointment.user_id != current_user.id and appointment.veterinarian_id != current_user.id:
+    if appointment.user_id != principal.id and (principal.veterinarian_id is None or appointment.veterinarian_id != principal.veterinarian_id):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to view this appointment")
     return appointment
 
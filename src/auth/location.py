@@ -0,0 +1,123 @@
+import logging
+import math
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from cachetools import TTLCache
+from sqlalchemy import update
+from sqlalchemy.orm.attributes import set_committed_value
+from src.auth.models import User
+from src.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Updates closer than this to the last accepted position are dropped...
+LOCATION_MIN_DISTANCE_METERS = float(os.getenv("LOCATION_MIN_DISTANCE_METERS", "50"))
+# ...unless this much time has passed since it was accepted
+LOCATION_MIN_INTERVAL_SECONDS = float(os.getenv("LOCATION_MIN_INTERVAL_SECONDS", "300"))
+# How often buffered positions are written to the users table
+LOCATION_FLUSH_INTERVAL_SECONDS = float(os.getenv("LOCATION_FLUSH_INTERVAL_SECONDS", "5"))
+
+# Users whose last accepted position is remembered for deduplication, per worker
+LOCATION_TRACKED_USERS = int(os.getenv("LOCATION_TRACKED_USERS", "100000"))
+
+EARTH_RADIUS_METERS = 6371000.0
+
+
+def distance_meters(a: Tuple[float, float], b: Tuple[float, float]) -> float:
+    # Haversine is plenty accurate at these distances and much cheaper than geodesic
+    lat1, lon1, lat2, lon2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_METERS * math.asin(math.sqrt(h))
+
+
+class LocationBuffer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # user_id -> (latitude, longitude) accepted but not yet written; _flushing holds the batch being written
+        self._pending: Dict[int, Tuple[float, float]] = {}
+        self._flushing: Dict[int, Tuple[float, float]] = {}
+        # user_id -> (latitude, longitude, accepted_at) of the last position we kept. Only used to drop
+        # near-duplicates, so entries expire once LOCATION_MIN_INTERVAL_SECONDS would let a repeat through anyway.
+        self._accepted: TTLCache = TTLCache(maxsize=LOCATION_TRACKED_USERS, ttl=LOCATION_MIN_INTERVAL_SECONDS)
+        self._flusher: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def record(self, user: User, latitude: float, longitude: float) -> bool:
+        """Buffers a position; returns False when it was dropped as too close and too recent."""
+        now = time.monotonic()
+        with self._lock:
+            last = self._accepted.get(user.id)
+            if last is not None:
+                moved = distance_meters((last[0], last[1]), (latitude, longitude))
+                if moved < LOCATION_MIN_DISTANCE_METERS and now - last[2] < LOCATION_MIN_INTERVAL_SECONDS:
+                    return False
+            elif user.latitude is not None and user.longitude is not None:
+                # Nothing accepted recently in this process, so compare with the stored position only
+                if distance_meters((user.latitude, user.longitude), (latitude, longitude)) < LOCATION_MIN_DISTANCE_METERS:
+                    return False
+            self._accepted[user.id] = (latitude, longitude, now)
+            self._pending[user.id] = (latitude, longitude)
+        self._ensure_flusher()
+        return True
+
+    def latest(self, user_id: int) -> Optional[Tuple[float, float]]:
+        """The position this worker accepted but has not written yet; once written, the users table is authoritative."""
+        with self._lock:
+            return self._pending.get(user_id) or self._flushing.get(user_id)
+
+    def apply(self, user: User) -> User:
+        # Show a still unwritten position on a loaded user without marking it dirty
+        latest = self.latest(user.id)
+        if latest is not None:
+            set_committed_value(user, "latitude", latest[0])
+            set_committed_value(user, "longitude", latest[1])
+        return user
+
+    def flush(self) -> int:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._flushing = pending
+        if not pending:
+            return 0
+        db = SessionLocal()
+        try:
+            # One executemany UPDATE keyed by primary key for the whole batch
+            db.execute(update(User), [
+                {"id": user_id, "latitude": latitude, "longitude": longitude}
+                for user_id, (latitude, longitude) in pending.items()
+            ])
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            with self._lock:
+                for user_id, position in pending.items():
+                    self._pending.setdefault(user_id, position)
+            logger.warning("Failed to flush %d buffered locations, retrying next flush: %s", len(pending), e)
+            return 0
+        finally:
+            with self._lock:
+                self._flushing = {}
+            db.close()
+        return len(pending)
+
+    def _ensure_flusher(self) -> None:
+        if self._flusher is not None:
+            return
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._run, name="location-flusher", daemon=True)
+            self._flusher.start()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(LOCATION_FLUSH_INTERVAL_SECONDS):
+            self.flush()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self.flush()
+
+
+location_buffer = LocationBuffer()
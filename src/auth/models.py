@@ -1,6 +1,6 @@
 from sqlalchemy import Column, DateTime, Integer, String, Float, Boolean, Enum
 from datetime import datetime
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, validates
 from src.database import Base
 import enum
 
@@ -26,6 +26,7 @@ class User(Base):
     google_id = Column(String, nullable=True)  # Store Google ID
     facebook_id = Column(String, nullable=True)  # Store Facebook ID
     expo_push_token = Column(String, nullable=True)
+    token_version = Column(Integer, default=0, nullable=False)  # Bumped to revoke access tokens, e.g. on role changes
 
     # Relationships
     veterinarian = relationship("Veterinarian", back_populates="user", uselist=False)
@@ -35,3 +36,17 @@ class User(Base):
     pet_listings = relationship("PetListing", back_populates="user")
     chat_rooms = relationship("ChatRoom", back_populates="user")  # Ensure this is defined
     chat_messages = relationship("ChatMessage", back_populates="sender")  # Ensure this is defined
+
+    # Emails are stored lowercased so lookups can compare against the plain unique index
+    @validates("email")
+    def normalize_email(self, key, email):
+        return email.lower() if email else email
+
+
+class RevokedRefreshToken(Base):
+    __tablename__ = "revoked_refresh_tokens"
+
+    id = Column(Integer, primary_key=True, index=True)
+    token_key = Column(String, unique=True, index=True, nullable=False)  # "token:<jti>" or "family:<family id>"
+    revoked_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)  # After this no token it covers can still be valid
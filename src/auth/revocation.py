@@ -0,0 +1,138 @@
+import hashlib
+import logging
+import math
+import os
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from src.auth.models import RevokedRefreshToken
+from src.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Minimum number of live revocations the filter is sized for, and its tolerated false-positive rate.
+# Every refresh revokes the rotated token for REFRESH_TOKEN_EXPIRE_DAYS, so the live count is roughly
+# refreshes per day * 30; the filter is resized from the actual row count when it fills up.
+REVOCATION_FILTER_CAPACITY = int(os.getenv("REVOCATION_FILTER_CAPACITY", "100000"))
+REVOCATION_FILTER_ERROR_RATE = float(os.getenv("REVOCATION_FILTER_ERROR_RATE", "0.01"))
+# How often a worker picks up revocations written by other workers. A family revoked on one worker
+# (logout, detected reuse) is still refreshable on another for up to this long. Reusing a single
+# rotated token is caught immediately on every worker, by the unique insert in revoke().
+REVOCATION_SYNC_SECONDS = 5
+# How often expired rows are purged and the filter rebuilt from scratch, in a background thread
+REVOCATION_REBUILD_SECONDS = 3600
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.count = 0
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        # Double hashing: k positions from the two halves of a single digest
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, key: str) -> None:
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    @property
+    def full(self) -> bool:
+        # Past its capacity the false-positive rate climbs and most lookups fall through to the DB
+        return self.count > self.capacity
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class RefreshTokenRevocations:
+    """Revoked refresh tokens and families, answered from a Bloom filter.
+
+    A miss in the filter is definitive, so the common case costs no query; only a possible
+    hit is confirmed against the revoked_refresh_tokens table. The filter lags other workers'
+    revocations by up to REVOCATION_SYNC_SECONDS.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._filter = BloomFilter(REVOCATION_FILTER_CAPACITY, REVOCATION_FILTER_ERROR_RATE)
+        self._last_id = 0
+        self._synced_at = 0.0
+        # The first sync loads every live row, so the first purge can wait a full interval
+        self._rebuilt_at = time.monotonic()
+        self._rebuilding = False
+
+    # Read-only on the caller's session: picks up rows inserted since the last sync
+    def _sync(self, db: Session) -> None:
+        rows = db.query(RevokedRefreshToken.id, RevokedRefreshToken.token_key).filter(
+            RevokedRefreshToken.id > self._last_id
+        ).order_by(RevokedRefreshToken.id).all()
+        for row in rows:
+            self._filter.add(row.token_key)
+            self._last_id = row.id
+        self._synced_at = time.monotonic()
+
+    # Runs in its own thread and session, so no request waits for the purge or the full reload
+    def _rebuild(self) -> None:
+        db = SessionLocal()
+        try:
+            db.query(RevokedRefreshToken).filter(RevokedRefreshToken.expires_at < datetime.utcnow()).delete(synchronize_session=False)
+            db.commit()
+            # Twice the live rows, so the filter has room for the revocations until the next rebuild
+            live = db.query(func.count(RevokedRefreshToken.id)).scalar() or 0
+            rebuilt = BloomFilter(max(REVOCATION_FILTER_CAPACITY, 2 * live), REVOCATION_FILTER_ERROR_RATE)
+            last_id = 0
+            for row in db.query(RevokedRefreshToken.id, RevokedRefreshToken.token_key).order_by(RevokedRefreshToken.id):
+                rebuilt.add(row.token_key)
+                last_id = row.id
+            with self._lock:
+                self._filter = rebuilt
+                self._last_id = last_id
+                # Rows committed after the reload above are picked up by the next request's sync
+                self._synced_at = 0.0
+        except Exception:
+            logger.exception("Failed to rebuild the refresh token revocation filter")
+        finally:
+            db.close()
+            self._rebuilt_at = time.monotonic()
+            self._rebuilding = False
+
+    def _refresh(self, db: Session) -> None:
+        now = time.monotonic()
+        if (now - self._rebuilt_at >= REVOCATION_REBUILD_SECONDS or self._filter.full) and not self._rebuilding:
+            self._rebuilding = True
+            threading.Thread(target=self._rebuild, daemon=True).start()
+        if now - self._synced_at >= REVOCATION_SYNC_SECONDS:
+            with self._lock:
+                self._sync(db)
+
+    def is_revoked(self, db: Session, key: str) -> bool:
+        self._refresh(db)
+        if key not in self._filter:
+            return False
+        return db.query(RevokedRefreshToken.id).filter(RevokedRefreshToken.token_key == key).first() is not None
+
+    def revoke(self, db: Session, key: str, expires_at: datetime) -> bool:
+        """Returns False when the key was already revoked, e.g. by a concurrent request."""
+        try:
+            db.add(RevokedRefreshToken(token_key=key, expires_at=expires_at))
+            db.commit()
+            revoked = True
+        except IntegrityError:
+            db.rollback()
+            revoked = False
+        self._filter.add(key)
+        return revoked
+
+
+refresh_token_revocations = RefreshTokenRevocations()
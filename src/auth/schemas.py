@@ -19,6 +19,11 @@ class UserUpdate(BaseModel):
     email: Optional[EmailStr]
     expo_push_token: Optional[str] = None 
 
+# Schema for the high-frequency location ingest path
+class UserLocationUpdate(BaseModel):
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+
 # Schema for user login
 class UserLogin(BaseModel):
     identifier: str  # This can be either the username or email
@@ -0,0 +1,62 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+from src.auth.models import User
+
+# Slotted dataclasses that orjson encodes natively, so auth responses skip
+# FastAPI's jsonable_encoder and response-model validation entirely.
+
+
+@dataclass(slots=True)
+class UserPayload:
+    id: int
+    username: Optional[str]
+    email: str
+    profile_picture_url: Optional[str]
+    latitude: Optional[float]
+    longitude: Optional[float]
+    role: str
+    created_dt: datetime
+    expo_push_token: Optional[str]
+
+    @classmethod
+    def from_user(cls, user: User) -> "UserPayload":
+        return cls(
+            user.id,
+            user.username,
+            user.email,
+            user.profile_picture_url,
+            user.latitude,
+            user.longitude,
+            user.role.value,
+            user.created_dt,
+            user.expo_push_token,
+        )
+
+
+@dataclass(slots=True)
+class AdminUserPayload(UserPayload):
+    is_super_admin: Optional[bool]
+
+    @classmethod
+    def from_user(cls, user: User) -> "AdminUserPayload":
+        return cls(
+            user.id,
+            user.username,
+            user.email,
+            user.profile_picture_url,
+            user.latitude,
+            user.longitude,
+            user.role.value,
+            user.created_dt,
+            user.expo_push_token,
+            user.is_super_admin,
+        )
+
+
+@dataclass(slots=True)
+class TokenPayload:
+    access_token: str
+    refresh_token: str
+    user: UserPayload
+    token_type: str = "bearer"
@@ -1,20 +1,31 @@
 import os
 import re
+import time
+from contextvars import ContextVar
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from uuid import uuid4
 from fastapi import Depends, HTTPException, status, UploadFile
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import insert, or_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
+from pydantic import ValidationError
 from passlib.context import CryptContext
 from jose import jwt, JWTError
 from datetime import timedelta, datetime
-from typing import Optional, List
-from firebase_admin import auth, storage
+from typing import Optional, List, Dict, Tuple, Iterator
+from firebase_admin import storage
 from src.firebase_utils import *
+from src.firebase_tokens import verify_firebase_id_token
 
 
 
 from src.auth.models import User, UserRole
 from src.auth.schemas import UserCreate, UserUpdate
-from src.database import get_db
+from src.database import get_db, SessionLocal
+from src.auth.location import location_buffer
+from src.auth.revocation import refresh_token_revocations
 
 # Load environment variables from .env file
 from dotenv import load_dotenv
@@ -34,41 +45,183 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 ALLOWED_IMAGE_TYPES = {"image/jpeg", "image/png", "image/jpg"}
 
+# How long a worker trusts its cached token_version for a user before re-reading it. The cache is per
+# worker, so a revoked token keeps working on other workers for up to this long.
+TOKEN_VERSION_CACHE_SECONDS = int(os.getenv("TOKEN_VERSION_CACHE_SECONDS", "60"))
+
+# user_id -> (token_version, cached_at)
+_token_versions: Dict[int, Tuple[int, float]] = {}
+
+# Identity carried in the access token's signed claims
+@dataclass(frozen=True)
+class Principal:
+    id: int
+    email: str
+    role: UserRole
+    veterinarian_id: Optional[int]
+    token_version: int
+
+# Claims embedded in access tokens so hot routes can authorize without a query
+def user_token_claims(user: User) -> dict:
+    return {
+        "role": user.role.value if user.role else UserRole.user.value,
+        "veterinarian_id": user.veterinarian.id if user.veterinarian else None,
+        "token_version": user.token_version or 0,
+    }
+
 # Utility function to create access token
-async def create_access_token(email: str, id: int) -> str:
-    encode = {"sub": email, "id": id}
+async def create_access_token(email: str, id: int, role: Optional[str] = None, veterinarian_id: Optional[int] = None, token_version: int = 0) -> str:
+    encode = {"sub": email, "id": id, "role": role, "vet": veterinarian_id, "ver": token_version}
     expires = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     encode.update({"exp": expires})
     return jwt.encode(encode, SECRET_KEY, algorithm=ALGORITHM)
 
 # Utility function to create refresh token
-async def create_refresh_token(email: str, id: int) -> str:
-    encode = {"sub": email, "id": id}
+# Every refresh token has its own id (jti) and belongs to a family that rotation keeps alive
+async def create_refresh_token(email: str, id: int, family_id: Optional[str] = None) -> str:
+    encode = {"sub": email, "id": id, "type": "refresh", "jti": uuid4().hex, "fam": family_id or uuid4().hex}
     expires = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
     encode.update({"exp": expires})
     return jwt.encode(encode, SECRET_KEY, algorithm=ALGORITHM)
 
-# Token Management
-async def refresh_access_token(refresh_token: str) -> str:
+# Bearer tokens for every route except /token/refresh and /logout, which take the refresh token itself
+def decode_access_token(token: str) -> dict:
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    # A refresh token outlives any access token and must not outlive its own revocation
+    if payload.get("type") == "refresh":
+        raise JWTError("Refresh token used as an access token")
+    return payload
+
+def _decode_refresh_token(refresh_token: str) -> dict:
     try:
         payload = jwt.decode(refresh_token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        id: int = payload.get("id")
-        if email is None or id is None:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-        return await create_access_token(email, id)
     except JWTError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+    if payload.get("sub") is None or payload.get("id") is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+    # Access tokens carry "ver"; refresh tokens issued before rotation carry neither marker
+    if payload.get("type") != "refresh" and "ver" in payload:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+    return payload
+
+def revoke_refresh_family(db: Session, family_id: str) -> None:
+    expires_at = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    refresh_token_revocations.revoke(db, f"family:{family_id}", expires_at)
+
+# Token Management
+# Rotates the refresh token: the presented one is revoked and a new one from the same family is returned.
+# Presenting an already rotated token means it leaked, so the whole family is revoked.
+async def refresh_access_token(db: Session, refresh_token: str) -> Tuple[str, str]:
+    payload = _decode_refresh_token(refresh_token)
+    jti, family_id = payload.get("jti"), payload.get("fam")
+
+    if family_id and refresh_token_revocations.is_revoked(db, f"family:{family_id}"):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+    if jti and refresh_token_revocations.is_revoked(db, f"token:{jti}"):
+        revoke_refresh_family(db, family_id)
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+
+    # Re-read the user so the new access token carries current role claims
+    user = db.query(User).filter(User.id == payload["id"]).first()
+    if user is None or not user.is_active:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+
+    # Losing the insert race to another refresh with the same token is reuse as well
+    if jti and not refresh_token_revocations.revoke(db, f"token:{jti}", datetime.utcfromtimestamp(payload["exp"])):
+        revoke_refresh_family(db, family_id)
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+    access_token = await create_access_token(user.email, user.id, **user_token_claims(user))
+    new_refresh_token = await create_refresh_token(user.email, user.id, family_id=family_id)
+    return access_token, new_refresh_token
+
+# Revokes the token's whole family, signing out every device that shares it
+async def revoke_refresh_token(db: Session, refresh_token: str) -> None:
+    payload = _decode_refresh_token(refresh_token)
+    if payload.get("fam"):
+        revoke_refresh_family(db, payload["fam"])
+
+def _current_token_version(user_id: int) -> Optional[int]:
+    cached = _token_versions.get(user_id)
+    if cached and time.monotonic() - cached[1] < TOKEN_VERSION_CACHE_SECONDS:
+        return cached[0]
+
+    db = SessionLocal()
+    try:
+        row = db.query(User.token_version, User.is_active).filter(User.id == user_id).first()
+    finally:
+        db.close()
+    if row is None or not row.is_active:
+        _token_versions.pop(user_id, None)
+        return None
+    _token_versions[user_id] = (row.token_version or 0, time.monotonic())
+    return row.token_version or 0
+
+def bump_token_version(user: User) -> None:
+    # Revokes every access token issued to the user; callers commit. Only this worker's cache is updated,
+    # other workers reject the old tokens once their entry expires (TOKEN_VERSION_CACHE_SECONDS).
+    user.token_version = (user.token_version or 0) + 1
+    _token_versions[user.id] = (user.token_version, time.monotonic())
+
+def forget_token_version(user_id: int) -> None:
+    _token_versions.pop(user_id, None)
+
+# Tokens issued before role claims existed: read the claims from the users table instead
+def _stored_claims(user_id: int) -> Optional[dict]:
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.id == user_id).first()
+        if user is None:
+            return None
+        claims = user_token_claims(user)
+        return {"role": claims["role"], "vet": claims["veterinarian_id"]}
+    finally:
+        db.close()
+
+# Set by POST /v1/batch: (token, principal, user) resolved once and reused by its sub-requests
+batch_identity: ContextVar[Optional[Tuple[str, Principal, User]]] = ContextVar("batch_identity", default=None)
+
+# Authorize from the token's claims alone; the DB is only consulted when the cached token_version expires
+async def get_current_principal(token: str = Depends(oauth2_scheme)) -> Principal:
+    identity = batch_identity.get()
+    if identity is not None and identity[0] == token:
+        return identity[1]
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    try:
+        payload = decode_access_token(token)
+        claims = payload if payload.get("role") is not None else _stored_claims(payload["id"])
+        if claims is None:
+            raise credentials_exception
+        principal = Principal(
+            id=payload["id"],
+            email=payload["sub"],
+            role=UserRole(claims["role"]),
+            veterinarian_id=claims.get("vet"),
+            # Tokens issued before token versions existed count as version 0, as in get_current_user
+            token_version=payload.get("ver", 0),
+        )
+    except (JWTError, KeyError, TypeError, ValueError):
+        raise credentials_exception
+
+    if _current_token_version(principal.id) != principal.token_version:
+        raise credentials_exception
+    return principal
 
 # Authenticate and retrieve the current user based on the JWT token
 async def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)) -> User:
+    identity = batch_identity.get()
+    if identity is not None and identity[0] == token:
+        return identity[2]
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_access_token(token)
         email: str = payload.get("sub")
         if email is None:
             raise credentials_exception
@@ -76,10 +229,93 @@ async def get_current_user(db: Session = Depends(get_db), token: str = Depends(o
         raise credentials_exception
 
     user = db.query(User).filter(User.email == email).first()
-    if user is None:
+    if user is None or payload.get("ver", 0) != (user.token_version or 0):
         raise credentials_exception
     return user
 
+# Bulk import: rows validated, deduplicated and inserted per chunk
+IMPORT_CHUNK_SIZE = 1000
+
+# bcrypt releases the GIL while hashing, so a thread pool hashes on every core
+_hash_pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 4, thread_name_prefix="bcrypt")
+
+def import_users_chunk(db: Session, rows: List[Tuple[int, dict]], seen_emails: set, seen_usernames: set, role: UserRole = UserRole.user) -> Tuple[int, List[Dict]]:
+    errors = []
+    candidates = []
+    for row_number, row in rows:
+        try:
+            user = UserCreate(**{key: value for key, value in row.items() if value not in (None, "")})
+        except ValidationError as e:
+            errors.append({"row": row_number, "error": "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())})
+            continue
+        email = user.email.lower()
+        if email in seen_emails:
+            errors.append({"row": row_number, "error": "Email already in use"})
+            continue
+        if user.username and user.username in seen_usernames:
+            errors.append({"row": row_number, "error": "Username already in use"})
+            continue
+        seen_emails.add(email)
+        if user.username:
+            seen_usernames.add(user.username)
+        candidates.append((row_number, user))
+
+    if not candidates:
+        return 0, errors
+
+    # One set-based lookup for the whole chunk instead of two queries per row
+    emails = [user.email.lower() for _, user in candidates]
+    usernames = [user.username for _, user in candidates if user.username]
+    existing = db.query(User.email, User.username).filter(or_(User.email.in_(emails), User.username.in_(usernames))).all()
+    taken_emails = {row.email for row in existing if row.email}
+    taken_usernames = {row.username for row in existing if row.username}
+
+    new_users = []
+    for row_number, user in candidates:
+        if user.email.lower() in taken_emails:
+            errors.append({"row": row_number, "error": "Email already in use"})
+        elif user.username and user.username in taken_usernames:
+            errors.append({"row": row_number, "error": "Username already in use"})
+        else:
+            new_users.append(user)
+
+    hashes = list(_hash_pool.map(lambda user: bcrypt_context.hash(user.password) if user.password else None, new_users))
+    now = datetime.utcnow()
+    values = [{
+        "username": user.username,
+        "email": user.email.lower(),  # Core inserts skip the model's normalize_email
+        "hashed_password": hashed_password,
+        "latitude": user.latitude,
+        "longitude": user.longitude,
+        "role": role,
+        "is_super_admin": False,
+        "is_active": True,
+        "token_version": 0,
+        "created_dt": now,
+        "expo_push_token": user.expo_push_token,
+    } for user, hashed_password in zip(new_users, hashes)]
+    if not values:
+        return 0, errors
+    try:
+        db.execute(insert(User), values)
+        db.commit()
+        return len(values), errors
+    except IntegrityError:
+        # A concurrent signup took one of the addresses; retry row by row to isolate it
+        db.rollback()
+
+    created = 0
+    for value in values:
+        try:
+            db.execute(insert(User), [value])
+            db.commit()
+            created += 1
+        except IntegrityError:
+            db.rollback()
+            row_number = next(number for number, user in candidates if user.email.lower() == value["email"])
+            errors.append({"row": row_number, "error": "Email or username already in use"})
+    return created, errors
+
 # User Registration & Authentication
 async def create_user(db: Session, user: UserCreate, role: UserRole = UserRole.user, is_super_admin: bool = False) -> User:
     if await existing_user_by_email(db, user.email):
@@ -107,7 +343,7 @@ async def create_user(db: Session, user: UserCreate, role: UserRole = UserRole.u
 
 
 async def authenticate(db: Session, identifier: str, password: str) -> Optional[User]:
-    db_user = db.query(User).filter((User.username == identifier) | (User.email == identifier)).first()
+    db_user = db.query(User).filter((User.username == identifier) | (User.email == identifier.lower())).first()
     if db_user and bcrypt_context.verify(password, db_user.hashed_password):
         return db_user
     return None
@@ -115,14 +351,14 @@ async def authenticate(db: Session, identifier: str, password: str) -> Optional[
 # Firebase Social Login (Google) Example
 async def google_auth(token: str, db: Session = Depends(get_db)) -> User:
     try:
-        decoded_token = auth.verify_id_token(token)
+        decoded_token = await verify_firebase_id_token(token)
         email = decoded_token['email']
         user = await existing_user_by_email(db, email)
         if not user:
             user = User(
                 email=email,
                 username=email.split('@')[0],
-                googleId=decoded_token['uid'],
+                google_id=decoded_token['uid'],
             )
             db.add(user)
             db.commit()
@@ -134,14 +370,14 @@ async def google_auth(token: str, db: Session = Depends(get_db)) -> User:
     
 async def facebook_auth(token: str, db: Session = Depends(get_db)) -> User:
     try:
-        decoded_token = auth.verify_id_token(token)  # You may need to decode the Facebook token differently
+        decoded_token = await verify_firebase_id_token(token)
         email = decoded_token['email']
         user = await existing_user_by_email(db, email)
         if not user:
             user = User(
                 email=email,
                 username=email.split('@')[0],
-                facebook_id=decoded_token['id'],  # Store Facebook ID
+                facebook_id=decoded_token['uid'],  # Store the Firebase uid of the Facebook account
             )
             db.add(user)
             db.commit()
@@ -153,24 +389,30 @@ async def facebook_auth(token: str, db: Session = Depends(get_db)) -> User:
 
 # Profile Management
 async def update_user(db: Session, db_user: User, user_update: UserUpdate):
+    # Location goes through the coalescing buffer; only the remaining fields need a write here
+    if user_update.latitude is not None or user_update.longitude is not None:
+        latitude = user_update.latitude if user_update.latitude is not None else db_user.latitude
+        longitude = user_update.longitude if user_update.longitude is not None else db_user.longitude
+        if latitude is not None and longitude is not None:
+            await update_user_location(db, db_user, latitude, longitude)
+
+    changed = False
     if user_update.profile_picture_url is not None:
         db_user.profile_picture_url = str(user_update.profile_picture_url)  # Convert HttpUrl to string
-    if user_update.latitude is not None:
-        db_user.latitude = user_update.latitude
-    if user_update.longitude is not None:
-        db_user.longitude = user_update.longitude
+        changed = True
     if user_update.email is not None:
         db_user.email = user_update.email
-    db.commit()
-    db.refresh(db_user)
+        changed = True
+    if changed:
+        db.commit()
+        db.refresh(db_user)
+    location_buffer.apply(db_user)
 
 
+# Buffered: small or frequent moves are dropped, the rest are flushed to the users table in batches
 async def update_user_location(db: Session, user: User, latitude: float, longitude: float) -> User:
-    user.latitude = latitude
-    user.longitude = longitude
-    db.commit()
-    db.refresh(user)
-    return user
+    location_buffer.record(user, latitude, longitude)
+    return location_buffer.apply(user)
 
 
 # Upload a profile picture to Firebase Storage and return its public URL
@@ -214,12 +456,32 @@ async def existing_user_by_username(db: Session, username: str) -> Optional[User
     return db.query(User).filter(User.username == username).first()
 
 async def existing_user_by_email(db: Session, email: str) -> Optional[User]:
-    return db.query(User).filter(User.email == email).first()
+    return db.query(User).filter(User.email == email.lower()).first()
 
 async def get_user_by_email(db: Session, email: str) -> Optional[User]:
-    return db.query(User).filter(User.email == email).first()
-
-async def get_all_users(db: Session) -> List[User]:
-    return db.query(User).all()
+    return db.query(User).filter(User.email == email.lower()).first()
+
+# Rows fetched per round trip when streaming the users table
+USER_EXPORT_BATCH_SIZE = 1000
+
+def _filtered_users(db: Session, role: Optional[UserRole] = None, created_after: Optional[datetime] = None, created_before: Optional[datetime] = None):
+    query = db.query(User)
+    if role is not None:
+        query = query.filter(User.role == role)
+    if created_after is not None:
+        query = query.filter(User.created_dt >= created_after)
+    if created_before is not None:
+        query = query.filter(User.created_dt < created_before)
+    return query
+
+# Keyset pagination on id: each page is an index range scan, however deep the client pages
+async def get_all_users(db: Session, after_id: Optional[int] = None, limit: int = 100, role: Optional[UserRole] = None, created_after: Optional[datetime] = None, created_before: Optional[datetime] = None) -> List[User]:
+    query = _filtered_users(db, role, created_after, created_before)
+    if after_id is not None:
+        query = query.filter(User.id > after_id)
+    return query.order_by(User.id).limit(limit).all()
+
+def iter_all_users(db: Session, role: Optional[UserRole] = None, created_after: Optional[datetime] = None, created_before: Optional[datetime] = None) -> Iterator[User]:
+    return _filtered_users(db, role, created_after, created_before).order_by(User.id).yield_per(USER_EXPORT_BATCH_SIZE)
 
 
@@ -1,8 +1,18 @@
-from fastapi import APIRouter, Depends, status, HTTPException, UploadFile, File, Body
+import csv
+import io
+import json
+import orjson
+from fastapi import APIRouter, Depends, status, HTTPException, UploadFile, File, Body, Query, Request
+from starlette.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse, ORJSONResponse
 from sqlalchemy.orm import Session
-from typing import List, Dict
-from src.auth.schemas import UserCreate, UserUpdate, UserLogin, UserLoginGoogle, UserLoginFacebook
-from src.database import get_db
+from typing import List, Dict, Optional
+from datetime import datetime
+from src.auth.schemas import UserCreate, UserUpdate, UserLogin, UserLoginGoogle, UserLoginFacebook, UserLocationUpdate
+from src.auth.location import location_buffer
+from src.auth.serializers import UserPayload, AdminUserPayload, TokenPayload
+from src.database import get_db, SessionLocal
+from src.caching import NO_STORE_HEADERS
 from fastapi.security import OAuth2PasswordBearer
 from src.auth.services import (
     google_auth, 
@@ -13,11 +23,19 @@ from src.auth.services import (
     authenticate, 
     update_user,
     refresh_access_token,
+    revoke_refresh_token,
     create_user as create_new_user,
     upload_profile_picture,
     get_user_by_email,
     get_all_users,
-    facebook_auth
+    iter_all_users,
+    import_users_chunk,
+    get_current_principal,
+    Principal,
+    IMPORT_CHUNK_SIZE,
+    facebook_auth,
+    user_token_claims,
+    forget_token_version
 )
 from src.auth.models import User, UserRole  # Import User and UserRole
 
@@ -28,137 +46,73 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 # User Registration Route
 @router.post("/signup", status_code=status.HTTP_201_CREATED)
-async def signup_user(user: UserCreate, db: Session = Depends(get_db)) -> Dict:
+async def signup_user(user: UserCreate, db: Session = Depends(get_db)) -> ORJSONResponse:
     if await existing_user_by_email(db, user.email):
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Email already in use")
     # Create a new user with the default role as 'user'
     db_user = await create_new_user(db, user, role=UserRole.user)
-    access_token = await create_access_token(db_user.email, db_user.id)
+    access_token = await create_access_token(db_user.email, db_user.id, **user_token_claims(db_user))
     refresh_token = await create_refresh_token(db_user.email, db_user.id)
-    return {
-        "access_token": access_token,
-        "refresh_token": refresh_token,
-        "token_type": "bearer",
-        "user": {
-            "id": db_user.id,
-            "username": db_user.username,
-            "email": db_user.email,
-            "profile_picture_url": db_user.profile_picture_url,
-            "latitude": db_user.latitude,
-            "longitude": db_user.longitude,
-            "role": db_user.role.value,
-            "created_dt": db_user.created_dt,
-            "expo_push_token": db_user.expo_push_token,
-        }
-    }
+    return ORJSONResponse(TokenPayload(access_token, refresh_token, UserPayload.from_user(db_user)), status_code=status.HTTP_201_CREATED, headers=NO_STORE_HEADERS)
 
 # User Login Route
 @router.post("/token", status_code=status.HTTP_200_OK)
-async def login(user: UserLogin, db: Session = Depends(get_db)) -> Dict:
+async def login(user: UserLogin, db: Session = Depends(get_db)) -> ORJSONResponse:
     db_user = await authenticate(db, user.identifier, user.password)
     if not db_user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect username or password")
-    access_token = await create_access_token(db_user.email, db_user.id)
+    access_token = await create_access_token(db_user.email, db_user.id, **user_token_claims(db_user))
     refresh_token = await create_refresh_token(db_user.email, db_user.id)
-    return {
-        "access_token": access_token,
-        "refresh_token": refresh_token,
-        "token_type": "bearer",
-        "user": {
-            "id": db_user.id,
-            "username": db_user.username,
-            "email": db_user.email,
-            "profile_picture_url": db_user.profile_picture_url,
-            "latitude": db_user.latitude,
-            "longitude": db_user.longitude,
-            "role": db_user.role.value,
-            "created_dt": db_user.created_dt,
-            "expo_push_token": db_user.expo_push_token,
-        }
-    }
+    return ORJSONResponse(TokenPayload(access_token, refresh_token, UserPayload.from_user(db_user)), headers=NO_STORE_HEADERS)
 
 # Google Login Route
 @router.post("/token/google", status_code=status.HTTP_200_OK)
-async def login_with_google(user: UserLoginGoogle, db: Session = Depends(get_db)) -> Dict:
+async def login_with_google(user: UserLoginGoogle, db: Session = Depends(get_db)) -> ORJSONResponse:
     db_user = await google_auth(user.google_id, db)
-    access_token = await create_access_token(db_user.email, db_user.id)
+    access_token = await create_access_token(db_user.email, db_user.id, **user_token_claims(db_user))
     refresh_token = await create_refresh_token(db_user.email, db_user.id)
-    return {
-        "access_token": access_token,
-        "refresh_token": refresh_token,
-        "token_type": "bearer",
-        "user": {
-            "id": db_user.id,
-            "username": db_user.username,
-            "email": db_user.email,
-            "profile_picture_url": db_user.profile_picture_url,
-            "latitude": db_user.latitude,
-            "longitude": db_user.longitude,
-            "role": db_user.role.value,
-            "created_dt": db_user.created_dt,
-        }
-    }
+    return ORJSONResponse(TokenPayload(access_token, refresh_token, UserPayload.from_user(db_user)), headers=NO_STORE_HEADERS)
 
 @router.post("/token/facebook", status_code=status.HTTP_200_OK)
-async def login_with_facebook(user: UserLoginFacebook, db: Session = Depends(get_db)) -> Dict:
+async def login_with_facebook(user: UserLoginFacebook, db: Session = Depends(get_db)) -> ORJSONResponse:
     db_user = await facebook_auth(user.facebook_id, db)
-    access_token = await create_access_token(db_user.email, db_user.id)
+    access_token = await create_access_token(db_user.email, db_user.id, **user_token_claims(db_user))
     refresh_token = await create_refresh_token(db_user.email, db_user.id)
-    return {
-        "access_token": access_token,
-        "refresh_token": refresh_token,
-        "token_type": "bearer",
-        "user": {
-            "id": db_user.id,
-            "username": db_user.username,
-            "email": db_user.email,
-            "profile_picture_url": db_user.profile_picture_url,
-            "latitude": db_user.latitude,
-            "longitude": db_user.longitude,
-            "role": db_user.role.value,
-            "created_dt": db_user.created_dt,
-        }
-    }
+    return ORJSONResponse(TokenPayload(access_token, refresh_token, UserPayload.from_user(db_user)), headers=NO_STORE_HEADERS)
 
 
 # Token Refresh Route
 @router.post("/token/refresh", status_code=status.HTTP_200_OK)
-async def refresh_token(refresh_token: str = Body(...)) -> Dict:
-    access_token = await refresh_access_token(refresh_token)
-    return {"access_token": access_token, "token_type": "bearer"}
+async def refresh_token(refresh_token: str = Body(...), db: Session = Depends(get_db)) -> ORJSONResponse:
+    access_token, new_refresh_token = await refresh_access_token(db, refresh_token)
+    return ORJSONResponse({"access_token": access_token, "refresh_token": new_refresh_token, "token_type": "bearer"}, headers=NO_STORE_HEADERS)
+
+# Logout Route (revokes the refresh token family)
+@router.post("/logout", status_code=status.HTTP_200_OK)
+async def logout(refresh_token: str = Body(..., embed=True), db: Session = Depends(get_db)) -> Dict:
+    await revoke_refresh_token(db, refresh_token)
+    return {"detail": "Logged out successfully"}
 
 # User Profile Route
 @router.get("/profile", status_code=status.HTTP_200_OK)
-async def current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> Dict:
-    db_user = await get_current_user(db, token)
-    return {
-        "id": db_user.id,
-        "username": db_user.username,
-        "email": db_user.email,
-        "profile_picture_url": db_user.profile_picture_url,
-        "latitude": db_user.latitude,
-        "longitude": db_user.longitude,
-        "role": db_user.role.value,
-        "created_dt": db_user.created_dt,
-        "expo_push_token": db_user.expo_push_token,
-    }
+async def current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> ORJSONResponse:
+    db_user = location_buffer.apply(await get_current_user(db, token))
+    return ORJSONResponse(UserPayload.from_user(db_user))
 
 # Update User Profile Route
 @router.put("/update-profile", status_code=status.HTTP_200_OK)
-async def update_user_route(user_update: UserUpdate, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> Dict:
+async def update_user_route(user_update: UserUpdate, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> ORJSONResponse:
     db_user = await get_current_user(db, token)
     await update_user(db, db_user, user_update)
-    return {
-        "id": db_user.id,
-        "username": db_user.username,
-        "email": db_user.email,
-        "profile_picture_url": db_user.profile_picture_url,
-        "latitude": db_user.latitude,
-        "longitude": db_user.longitude,
-        "role": db_user.role.value,
-        "created_dt": db_user.created_dt,
-        "expo_push_token": db_user.expo_push_token,
-    }
+    return ORJSONResponse(UserPayload.from_user(db_user))
+
+
+# Location Ingest Route
+# Positions are coalesced in memory; "accepted" is False when the move was too small to record
+@router.put("/location", status_code=status.HTTP_202_ACCEPTED)
+async def update_location_route(location: UserLocationUpdate, current_user: User = Depends(get_current_user)) -> Dict:
+    accepted = location_buffer.record(current_user, location.latitude, location.longitude)
+    return {"accepted": accepted, "latitude": location.latitude, "longitude": location.longitude}
 
 
 # Upload Profile Picture Route
@@ -179,22 +133,37 @@ async def upload_profile_picture_route(token: str = Depends(oauth2_scheme), file
 
 
 
-# Get All Users Route
+# Get All Users Route (Admins Only)
+# Pages by id: pass the X-Next-Cursor header back as after_id. format=ndjson streams every matching user instead.
 @router.get("/all-users", status_code=status.HTTP_200_OK)
-async def get_all_users_route(db: Session = Depends(get_db)) -> List[Dict]:
-    users = await get_all_users(db)
-    return [{
-        "id": user.id,
-        "username": user.username,
-        "email": user.email,
-        "profile_picture_url": user.profile_picture_url,
-        "latitude": user.latitude,
-        "longitude": user.longitude,
-        "role": user.role.value,
-        "created_dt": user.created_dt,
-        "is_super_admin": user.is_super_admin,
-        "expo_push_token": user.expo_push_token,
-    } for user in users]
+async def get_all_users_route(
+    after_id: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    role: Optional[UserRole] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    db: Session = Depends(get_db),
+    principal: Principal = Depends(get_current_principal)
+) -> ORJSONResponse:
+    if principal.role != UserRole.admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only admins can list users")
+
+    if format == "ndjson":
+        # The request-scoped session is closed before the body streams, so the export owns its own
+        def stream():
+            export_db = SessionLocal()
+            try:
+                for user in iter_all_users(export_db, role, created_after, created_before):
+                    yield orjson.dumps(AdminUserPayload.from_user(user), option=orjson.OPT_APPEND_NEWLINE)
+            finally:
+                export_db.close()
+
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    users = await get_all_users(db, after_id, limit, role, created_after, created_before)
+    headers = {"X-Next-Cursor": str(users[-1].id)} if len(users) == limit else None
+    return ORJSONResponse([AdminUserPayload.from_user(user) for user in users], headers=headers)
 
 # Admin Management Routes
 
@@ -219,6 +188,7 @@ async def delete_admin(admin_id: int, db: Session = Depends(get_db), current_use
     
     db.delete(admin_to_delete)
     db.commit()
+    forget_token_version(admin_id)
     return {"detail": f"Admin {admin_to_delete.username} deleted successfully"}
 
 # List All Admins Route
@@ -230,6 +200,81 @@ async def list_admins(db: Session = Depends(get_db), current_user = Depends(get_
     admins = db.query(User).filter(User.role == UserRole.admin).all()
     return {"admins": [{"id": admin.id, "username": admin.username, "email": admin.email} for admin in admins]}
 
+# Bulk User Import Route (Admins Only)
+# The body is read as a stream of CSV (with a header row) or NDJSON lines and imported in chunks
+@router.post("/admin/import", status_code=status.HTTP_200_OK)
+async def import_users(
+    request: Request,
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    db: Session = Depends(get_db),
+    principal: Principal = Depends(get_current_principal)
+) -> Dict:
+    if principal.role != UserRole.admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only admins can import users")
+
+    async def lines():
+        pending = b""
+        async for data in request.stream():
+            pending += data
+            *complete, pending = pending.split(b"\n")
+            for line in complete:
+                yield line.decode("utf-8") + "\n"
+        if pending:
+            yield pending.decode("utf-8")
+
+    # A quoted CSV field may contain newlines, so lines are gathered until their quotes balance
+    # and csv.reader is handed the whole record
+    async def records():
+        record = ""
+        async for line in lines():
+            record += line
+            if format == "csv" and record.count('"') % 2:
+                continue
+            yield record
+            record = ""
+        if record:
+            yield record
+
+    def parse_csv(record: str) -> List[str]:
+        # strict, so an unterminated quote at the end of the body is reported instead of truncated
+        return next(csv.reader(io.StringIO(record, newline=""), strict=True))
+
+    created = 0
+    errors = []
+    seen_emails, seen_usernames = set(), set()
+    header = None
+    chunk = []
+    row_number = 0
+    async for record in records():
+        if not record.strip():
+            continue
+        if format == "csv" and header is None:
+            try:
+                header = parse_csv(record)
+            except csv.Error as e:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unparseable header: {e}")
+            continue
+        row_number += 1
+        try:
+            row = dict(zip(header, parse_csv(record))) if format == "csv" else json.loads(record)
+            if not isinstance(row, dict):
+                raise ValueError("Expected an object")
+        except (ValueError, csv.Error) as e:
+            errors.append({"row": row_number, "error": f"Unparseable row: {e}"})
+            continue
+        chunk.append((row_number, row))
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            chunk_created, chunk_errors = await run_in_threadpool(import_users_chunk, db, chunk, seen_emails, seen_usernames)
+            created += chunk_created
+            errors.extend(chunk_errors)
+            chunk = []
+    if chunk:
+        chunk_created, chunk_errors = await run_in_threadpool(import_users_chunk, db, chunk, seen_emails, seen_usernames)
+        created += chunk_created
+        errors.extend(chunk_errors)
+
+    return {"created": created, "failed": len(errors), "errors": sorted(errors, key=lambda error: error["row"])}
+
 # Setup Super Admin Route (This should be used once to create the first super admin)
 @router.post("/admin/setup-super-admin", status_code=status.HTTP_201_CREATED)
 async def setup_super_admin(user: UserCreate, db: Session = Depends(get_db)) -> Dict:
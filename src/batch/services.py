@@ -0,0 +1,104 @@
+import logging
+import orjson
+from typing import Dict, List
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session
+from src.admission import AdmissionControlMiddleware
+from src.batch.schemas import BatchOperation
+from src.metrics import MetricsMiddleware
+from src.query_stats import QueryStatsMiddleware
+
+logger = logging.getLogger(__name__)
+
+# Sub-requests that cannot be answered inside a batch: nested batches and open-ended streams
+FORBIDDEN_PREFIXES = ("/v1/batch", "/v1/events/")
+# Request headers carried over from the batch request to each sub-request
+FORWARDED_HEADERS = {b"authorization", b"accept-language", b"user-agent"}
+# Response headers that mean nothing once the body is embedded in the batch response
+DROPPED_HEADERS = {"content-length", "content-type"}
+
+def normalize_path(path: str) -> str:
+    if not path.startswith("/"):
+        path = "/" + path
+    if not path.startswith("/v1/"):
+        path = "/v1" + path
+    if path.startswith(FORBIDDEN_PREFIXES):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"{path} cannot be called from a batch")
+    return path
+
+def _sub_scope(parent: dict, operation: BatchOperation, body: bytes) -> dict:
+    path, _, query = normalize_path(operation.path).partition("?")
+    headers = [(name, value) for name, value in parent["headers"] if name in FORWARDED_HEADERS]
+    if body:
+        headers += [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    # Keeps app, client, state and the exception handlers installed for the batch request
+    scope = {key: value for key, value in parent.items() if key not in ("route", "endpoint", "path_params")}
+    scope.update(method=operation.method, path=path, raw_path=path.encode(), query_string=query.encode(), headers=headers)
+    return scope
+
+# id(router) -> middleware stack around it; routers are not hashable, so lru_cache cannot key on them
+_dispatchers: Dict[int, object] = {}
+
+def _dispatcher(router):
+    dispatcher = _dispatchers.get(id(router))
+    if dispatcher is None:
+        dispatcher = _dispatchers[id(router)] = _build_dispatcher(router)
+    return dispatcher
+
+def _build_dispatcher(router):
+    # The per-request middleware from src.main, so a sub-request is classified, rate limited, counted
+    # and timed like the same call made on its own. It runs inside the batch's concurrency slot rather
+    # than taking one of its own. Idempotency-Key applies to the batch as a whole.
+    return MetricsMiddleware(AdmissionControlMiddleware(QueryStatsMiddleware(router), hold_slot=False))
+
+async def run_operation(parent: dict, operation: BatchOperation) -> Dict:
+    """Dispatches one sub-request through the rate limit, metrics and query stats middleware and captures its response."""
+    body = orjson.dumps(operation.body) if operation.body is not None else b""
+    scope = _sub_scope(parent, operation, body)
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        return {"type": "http.disconnect"}
+
+    response = {"status": 500, "headers": {}}
+    chunks = []
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = {name.decode("latin-1"): value.decode("latin-1") for name, value in message.get("headers", [])}
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    try:
+        await _dispatcher(parent["app"].router)(scope, receive, send)
+    except Exception:
+        logger.exception("Batch sub-request %s %s failed", operation.method, scope["path"])
+        return {"id": operation.id, "status": 500, "headers": {}, "body": {"detail": "Internal Server Error"}}
+
+    content = b"".join(chunks)
+    content_type = response["headers"].get("content-type", "")
+    if not content:
+        payload = None
+    elif content_type.startswith("application/json"):
+        payload = orjson.loads(content)
+    else:
+        payload = content.decode("utf-8", errors="replace")
+    headers = {name: value for name, value in response["headers"].items() if name not in DROPPED_HEADERS}
+    return {"id": operation.id, "status": response["status"], "headers": headers, "body": payload}
+
+async def run_batch(parent: dict, operations: List[BatchOperation], db: Session) -> List[Dict]:
+    """Runs the operations one at a time, in order, so later reads see earlier writes.
+
+    Every sub-request uses the batch's single Session, which must not be shared by interleaved handlers;
+    the handlers query synchronously, so running GETs together would not overlap them anyway.
+    """
+    results: List[Dict] = []
+    for operation in operations:
+        results.append(await run_operation(parent, operation))
+        if operation.method != "GET":
+            # Drop anything a failed mutation left uncommitted so the next one cannot commit it
+            db.rollback()
+    return results
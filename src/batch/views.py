@@ -0,0 +1,34 @@
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.orm import Session
+from src.database import get_db, shared_session
+from src.auth.models import User
+from src.auth.services import get_current_user, get_current_principal, batch_identity, oauth2_scheme, Principal
+from src.batch.schemas import BatchRequest, BatchResponse
+from src.batch.services import normalize_path, run_batch
+
+router = APIRouter(prefix="/batch", tags=["batch"])
+
+# Several API calls in one round trip, e.g. the app's launch sequence of profile, appointments,
+# pet records and chat rooms. The caller is authenticated once and every sub-request runs on the
+# same session; responses come back in request order, each with its own status, headers and body.
+@router.post("", response_model=BatchResponse)
+async def batch_route(
+    batch: BatchRequest,
+    request: Request,
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+    principal: Principal = Depends(get_current_principal)
+):
+    for operation in batch.requests:
+        normalize_path(operation.path)
+
+    identity_token = batch_identity.set((token, principal, current_user))
+    session_token = shared_session.set(db)
+    try:
+        responses = await run_batch(request.scope, batch.requests, db)
+    finally:
+        shared_session.reset(session_token)
+        batch_identity.reset(identity_token)
+    return ORJSONResponse({"responses": responses})
@@ -0,0 +1,60 @@
+# src/caching.py
+import hashlib
+import threading
+from typing import Optional, Tuple
+from cachetools import TTLCache
+from fastapi import Request, Response
+
+
+# For responses carrying credentials: kept out of HTTP caches and never stored for Idempotency-Key replays
+NO_STORE_HEADERS = {"Cache-Control": "no-store"}
+
+
+def make_etag(*parts) -> str:
+    # Weak validator: built from row versions (counts, max ids, updated_at), not from the serialized body
+    return 'W/"' + hashlib.sha1(repr(parts).encode()).hexdigest() + '"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return header.strip() == "*" or etag in (tag.strip() for tag in header.split(","))
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
+
+
+class ResponseCache:
+    """Serialized response bodies for public reads, dropped by the writes that change them.
+
+    Each worker has its own copy, so the TTL bounds how stale another worker's entry can be.
+    """
+
+    def __init__(self, maxsize: int = 2048, ttl: float = 30):
+        self._entries: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Tuple[str, bytes]]:
+        with self._lock:
+            return self._entries.get(key)
+
+    def set(self, key: str, etag: str, body: bytes) -> None:
+        with self._lock:
+            self._entries[key] = (etag, body)
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate_prefix(self, prefix: str) -> None:
+        with self._lock:
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                self._entries.pop(key, None)
+
+
+def cached_response(request: Request, etag: str, body: bytes) -> Response:
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    return Response(body, media_type="application/json", headers={"ETag": etag})
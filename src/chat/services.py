@@ -1,3 +1,4 @@
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from fastapi import HTTPException, status
 from src.chat.models import ChatRoom, ChatMessage
@@ -6,7 +7,7 @@ from src.auth.models import User
 from src.veterinarians.models import Veterinarian
 from src.petlisting.models import PetListing
 from src.notifications import send_push_notification
-from typing import List
+from typing import List, Optional
 
 def create_chat_room(db: Session, user: User, room_data: ChatRoomCreate) -> ChatRoom:
     if room_data.veterinarian_id:
@@ -44,8 +45,23 @@ def get_chat_room_by_id(db: Session, chat_room_id: int) -> ChatRoom:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat room not found")
     return chat_room
 
-def get_user_chat_rooms(db: Session, user: User) -> List[ChatRoom]:
-    return db.query(ChatRoom).filter(ChatRoom.user_id == user.id).all()
+# The user who opened the room, the veterinarian it was opened with, or the owner of its listing
+def is_chat_room_member(chat_room: ChatRoom, user: User) -> bool:
+    if chat_room.user_id == user.id:
+        return True
+    if chat_room.veterinarian is not None and chat_room.veterinarian.user_id == user.id:
+        return True
+    return chat_room.listing is not None and chat_room.listing.user_id == user.id
+
+def get_user_chat_rooms(db: Session, user_id: int) -> List[ChatRoom]:
+    return db.query(ChatRoom).filter(ChatRoom.user_id == user_id).all()
 
 def get_veterinarian_chat_rooms(db: Session, veterinarian_id: int) -> List[ChatRoom]:
     return db.query(ChatRoom).filter(ChatRoom.veterinarian_id == veterinarian_id).all()
+
+# Counts and highest ids of the rooms and their messages, so a new room or message changes the version
+def get_chat_rooms_version(db: Session, user_id: Optional[int] = None, veterinarian_id: Optional[int] = None) -> tuple:
+    room_filter = ChatRoom.veterinarian_id == veterinarian_id if veterinarian_id is not None else ChatRoom.user_id == user_id
+    rooms = db.query(func.count(ChatRoom.id), func.max(ChatRoom.id)).filter(room_filter).one()
+    messages = db.query(func.count(ChatMessage.id), func.max(ChatMessage.id)).join(ChatRoom).filter(room_filter).one()
+    return tuple(rooms) + tuple(messages)
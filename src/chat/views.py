@@ -1,31 +1,39 @@
-from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect, HTTPException, status
+from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect, HTTPException, Request, Response, status
 from sqlalchemy.orm import Session
-from typing import List
+from typing import Dict, List
+from pydantic import ValidationError
 from src.database import get_db
-from src.auth.services import get_current_user
+from src.auth.services import get_current_user, get_current_principal, Principal
 from src.chat.models import ChatRoom
 from src.chat.schemas import ChatRoomCreate, ChatRoomSchema, ChatMessageCreate, ChatMessageSchema
-from src.chat.services import create_chat_room, create_chat_message, get_chat_room_by_id, get_user_chat_rooms, get_veterinarian_chat_rooms
+from src.chat.services import create_chat_room, create_chat_message, get_chat_room_by_id, is_chat_room_member, get_user_chat_rooms, get_veterinarian_chat_rooms, get_chat_rooms_version
+from src.caching import make_etag, etag_matches, not_modified
+from src.metrics import WEBSOCKETS
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
-# WebSocket connection manager
+# WebSocket connection manager, keyed by chat room so messages only reach that room's sockets
 class ConnectionManager:
     def __init__(self):
-        self.active_connections: List[WebSocket] = []
+        self.active_connections: Dict[int, List[WebSocket]] = {}
 
-    async def connect(self, websocket: WebSocket):
+    async def connect(self, chat_room_id: int, websocket: WebSocket):
         await websocket.accept()
-        self.active_connections.append(websocket)
+        self.active_connections.setdefault(chat_room_id, []).append(websocket)
+        WEBSOCKETS.inc()
 
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+    def disconnect(self, chat_room_id: int, websocket: WebSocket):
+        connections = self.active_connections[chat_room_id]
+        connections.remove(websocket)
+        if not connections:
+            del self.active_connections[chat_room_id]
+        WEBSOCKETS.dec()
 
     async def send_personal_message(self, message: str, websocket: WebSocket):
         await websocket.send_text(message)
 
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
+    async def broadcast(self, chat_room_id: int, message: str):
+        for connection in list(self.active_connections.get(chat_room_id, [])):
             await connection.send_text(message)
 
 manager = ConnectionManager()
@@ -50,31 +58,59 @@ async def send_message_route(
     message = create_chat_message(db, chat_room, current_user, message_data)
     return message
 
+# Browsers cannot set headers on a WebSocket, so the access token comes as ?token=
 @router.websocket("/ws/{chat_room_id}")
-async def websocket_endpoint(websocket: WebSocket, chat_room_id: int, db: Session = Depends(get_db)):
-    await manager.connect(websocket)
+async def websocket_endpoint(websocket: WebSocket, chat_room_id: int, token: str, db: Session = Depends(get_db)):
+    try:
+        current_user = await get_current_user(db, token)
+        chat_room = get_chat_room_by_id(db, chat_room_id)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    if not is_chat_room_member(chat_room, current_user):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await manager.connect(chat_room_id, websocket)
     try:
         while True:
             data = await websocket.receive_text()
-            chat_room = get_chat_room_by_id(db, chat_room_id)
-            message = create_chat_message(db, chat_room, websocket, data)
-            await manager.broadcast(f"Message: {data}")
+            try:
+                message_data = ChatMessageCreate(content=data)
+            except ValidationError:
+                await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+                break
+            create_chat_message(db, chat_room, current_user, message_data)
+            await manager.broadcast(chat_room_id, f"Message: {data}")
     except WebSocketDisconnect:
-        manager.disconnect(websocket)
+        pass
+    finally:
+        # Otherwise the closed socket stays registered and every later broadcast fails on it
+        manager.disconnect(chat_room_id, websocket)
 
 @router.get("/user-rooms", response_model=List[ChatRoomSchema])
 async def list_user_chat_rooms(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    principal: Principal = Depends(get_current_principal)
 ):
-    return get_user_chat_rooms(db, current_user)
+    etag = make_etag("user-rooms", principal.id, get_chat_rooms_version(db, user_id=principal.id))
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    return get_user_chat_rooms(db, principal.id)
 
 @router.get("/vet-rooms", response_model=List[ChatRoomSchema])
 async def list_veterinarian_chat_rooms(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    principal: Principal = Depends(get_current_principal)
 ):
-    veterinarian = current_user.veterinarian
-    if not veterinarian:
+    if not principal.veterinarian_id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
-    return get_veterinarian_chat_rooms(db, veterinarian.id)
+    etag = make_etag("vet-rooms", principal.veterinarian_id, get_chat_rooms_version(db, veterinarian_id=principal.veterinarian_id))
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    return get_veterinarian_chat_rooms(db, principal.veterinarian_id)
@@ -1,27 +1,317 @@
-from sqlalchemy import create_engine
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+from cachetools import TTLCache
+from sqlalchemy import create_engine, event, exc, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool
+from starlette.requests import HTTPConnection
 
 # It's a good practice to use environment variables for sensitive information
 import os
 from dotenv import load_dotenv
 
-load_dotenv()  
+load_dotenv()
+
+logger = logging.getLogger(__name__)
 
 DATABASE_URL = os.getenv("DATABASE_URL")
+# Optional read replica; GET requests read from it unless read-your-writes needs the primary
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+
+# Pool sizing is per worker process: total connections = workers * (size + overflow)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Connections older than this are replaced on checkout; keep it below the server's or proxy's idle timeout
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# How a checked-out connection is known to be alive:
+#   "pre_ping" - SELECT 1 on every checkout (one extra round trip per request)
+#   "idle"     - SELECT 1 only when the connection sat in the pool longer than DB_POOL_PING_IDLE_SECONDS
+#   "none"     - rely on recycle; a dead connection fails its first statement and is invalidated
+# The default keeps the pre-ping behaviour the engine always had; "idle" is the cheaper opt-in.
+DB_POOL_LIVENESS = os.getenv("DB_POOL_LIVENESS", "pre_ping")
+DB_POOL_PING_IDLE_SECONDS = float(os.getenv("DB_POOL_PING_IDLE_SECONDS", "30"))
+
+# Upper bounds (seconds) of the checkout wait histogram
+POOL_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+class PoolMetrics:
+    """Checkout wait, in-use and overflow counters for one engine's pool."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.checkouts = 0
+        self.overflow_checkouts = 0  # Checkouts served beyond pool_size
+        self.connects = 0
+        self.invalidations = 0
+        self.liveness_failures = 0
+        self.timeouts = 0
+        self.wait_count = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.wait_buckets = [0] * (len(POOL_WAIT_BUCKETS) + 1)
+
+    def observe_wait(self, seconds: float) -> None:
+        with self._lock:
+            self.wait_count += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            index = next((i for i, bound in enumerate(POOL_WAIT_BUCKETS) if seconds <= bound), len(POOL_WAIT_BUCKETS))
+            self.wait_buckets[index] += 1
+
+    def checked_out(self, pool_size: Optional[int]) -> None:
+        with self._lock:
+            self.in_use += 1
+            self.checkouts += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+            if pool_size is not None and self.in_use > pool_size:
+                self.overflow_checkouts += 1
+
+    def checked_in(self) -> None:
+        with self._lock:
+            self.in_use = max(0, self.in_use - 1)
+
+    def snapshot(self, pool) -> Dict:
+        with self._lock:
+            stats = {
+                "in_use": self.in_use,
+                "peak_in_use": self.peak_in_use,
+                "checkouts": self.checkouts,
+                "overflow_checkouts": self.overflow_checkouts,
+                "connects": self.connects,
+                "invalidations": self.invalidations,
+                "liveness_failures": self.liveness_failures,
+                "timeouts": self.timeouts,
+                "wait_count": self.wait_count,
+                "wait_seconds_total": round(self.wait_total, 6),
+                "wait_seconds_max": round(self.wait_max, 6),
+                "wait_buckets": dict(zip([str(bound) for bound in POOL_WAIT_BUCKETS] + ["+Inf"], self.wait_buckets)),
+            }
+        if isinstance(pool, QueuePool):
+            stats.update(size=pool.size(), idle=pool.checkedin(), overflow=max(0, pool.overflow()), max_overflow=pool._max_overflow)
+        return stats
+
+
+def _instrumented_pool_class(metrics: PoolMetrics):
+    # A class per engine, so the metrics survive pool.recreate() (which instantiates self.__class__)
+    class InstrumentedQueuePool(QueuePool):
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                return super()._do_get()
+            except exc.TimeoutError:
+                with metrics._lock:
+                    metrics.timeouts += 1
+                raise
+            finally:
+                metrics.observe_wait(time.perf_counter() - started)
+
+    return InstrumentedQueuePool
+
+
+def _instrument(engine, metrics: PoolMetrics) -> None:
+    pool_size = engine.pool.size() if isinstance(engine.pool, QueuePool) else None
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        with metrics._lock:
+            metrics.connects += 1
+
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        checked_in_at = connection_record.info.get("checked_in_at")
+        if DB_POOL_LIVENESS == "idle" and checked_in_at is not None and time.monotonic() - checked_in_at > DB_POOL_PING_IDLE_SECONDS:
+            cursor = dbapi_connection.cursor()
+            try:
+                cursor.execute("SELECT 1")
+            except Exception:
+                with metrics._lock:
+                    metrics.liveness_failures += 1
+                # The pool discards this connection and retries the checkout with a fresh one
+                raise exc.DisconnectionError()
+            finally:
+                cursor.close()
+        metrics.checked_out(pool_size)
+
+    @event.listens_for(engine, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        connection_record.info["checked_in_at"] = time.monotonic()
+        metrics.checked_in()
+
+    @event.listens_for(engine, "invalidate")
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        with metrics._lock:
+            metrics.invalidations += 1
+
+
+pool_metrics: Dict[str, PoolMetrics] = {}
+engines: Dict[str, object] = {}
+
+def make_engine(url: str, name: str):
+    metrics = pool_metrics[name] = PoolMetrics(name)
+    if url.startswith("sqlite"):
+        # SQLite keeps SQLAlchemy's default pool (a QueuePool for files, a SingletonThreadPool for :memory:);
+        # sizing and the checkout wait histogram are for server databases, liveness and the counters still apply
+        engine = create_engine(url, pool_pre_ping=DB_POOL_LIVENESS == "pre_ping")
+    else:
+        engine = create_engine(
+            url,
+            poolclass=_instrumented_pool_class(metrics),
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_pre_ping=DB_POOL_LIVENESS == "pre_ping",
+        )
+    _instrument(engine, metrics)
+    engines[name] = engine
+    return engine
+
+def pool_stats() -> Dict[str, Dict]:
+    stats = {name: pool_metrics[name].snapshot(engine.pool) for name, engine in engines.items()}
+    if replica_engine is not None:
+        stats["read_routing"] = {**read_routing, "replica_lag_seconds": replica_lag.value}
+    return stats
 
 # Create the SQLAlchemy engine
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+engine = make_engine(DATABASE_URL, "primary")
+replica_engine = make_engine(DATABASE_REPLICA_URL, "replica") if DATABASE_REPLICA_URL else None
 
 # Create a sessionmaker that will be used to create sessions
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReplicaSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=replica_engine) if replica_engine is not None else None
+
+# Read-your-writes: after a client commits, its reads stay on the primary for at least this long,
+# or for the measured replica lag plus a second when that is longer
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+# Above this lag (or when it cannot be measured) every read goes to the primary
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "30"))
+REPLICA_LAG_CHECK_SECONDS = 5
+
+READ_METHODS = {"GET", "HEAD"}
+# Key in the signed session cookie (SessionMiddleware) holding the wall-clock time of the client's last commit.
+# The client carries it to whichever worker serves its next read, so read-your-writes holds across workers.
+LAST_WRITE_SESSION_KEY = "last_write"
+# Bearer-only clients send no cookie: their last commit is kept here, keyed by the admission client key
+# ("user:<id>" from the signed token, else the IP). The cache is per worker, so a read that lands on
+# another worker within the window can still see the replica; sticky sessions close that gap.
+last_writes: TTLCache = TTLCache(maxsize=100_000, ttl=max(READ_YOUR_WRITES_SECONDS, REPLICA_MAX_LAG_SECONDS + 1))
+_last_writes_lock = threading.Lock()  # Commits also happen on threadpool workers
+
+read_routing = {"replica": 0, "primary_recent_write": 0, "primary_replica_lagging": 0}
+
+
+class ReplicaLag:
+    """Replica lag in seconds, measured at most every REPLICA_LAG_CHECK_SECONDS; None when unknown."""
+
+    def __init__(self):
+        self.value: Optional[float] = 0.0
+        self.checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def current(self) -> Optional[float]:
+        if time.monotonic() - self.checked_at < REPLICA_LAG_CHECK_SECONDS or not self._lock.acquire(blocking=False):
+            return self.value
+        try:
+            self.checked_at = time.monotonic()
+            self.value = self._measure()
+        finally:
+            self._lock.release()
+        return self.value
+
+    def _measure(self) -> Optional[float]:
+        if replica_engine.dialect.name != "postgresql":
+            return 0.0
+        try:
+            with replica_engine.connect() as connection:
+                # An idle primary leaves the replay timestamp old, so a fully replayed replica counts as 0
+                lag = connection.execute(text(
+                    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+                )).scalar()
+            return float(lag or 0)
+        except Exception as e:
+            logger.warning("Failed to measure replica lag: %s", e)
+            return None
+
+replica_lag = ReplicaLag()
+
+@event.listens_for(SessionLocal, "after_commit")
+def _remember_write(session):
+    http_session = session.info.get("http_session")
+    if http_session is not None:
+        http_session[LAST_WRITE_SESSION_KEY] = time.time()
+    key = session.info.get("writer_key")
+    if key is not None:
+        with _last_writes_lock:
+            last_writes[key] = time.time()
+
+def writer_key(scope) -> str:
+    # Imported here: src.admission reaches this module through src.auth.services
+    from src.admission import client_key
+    return client_key(scope)
+
+def use_replica(last_write: Optional[float]) -> bool:
+    lag = replica_lag.current()
+    if lag is None or lag > REPLICA_MAX_LAG_SECONDS:
+        read_routing["primary_replica_lagging"] += 1
+        return False
+    if last_write is not None and time.time() - last_write < max(READ_YOUR_WRITES_SECONDS, lag + 1):
+        read_routing["primary_recent_write"] += 1
+        return False
+    read_routing["replica"] += 1
+    return True
 
 # SQLAlchemy's base class for declarative ORM models
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
+def add_missing_columns(bind, table_name: str, columns: Dict[str, str]) -> None:
+    """Adds columns introduced after a table was created; create_all only creates missing tables.
+
+    columns maps each column name to its DDL, e.g. {"token_version": "INTEGER NOT NULL DEFAULT 0"}.
+    """
+    existing = {column["name"] for column in inspect(bind).get_columns(table_name)}
+    missing = {name: ddl for name, ddl in columns.items() if name not in existing}
+    if not missing:
+        return
+    with bind.begin() as connection:
+        for name, ddl in missing.items():
+            connection.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {name} {ddl}"))
+
+# Set by POST /v1/batch so all of its sub-requests run on the batch's session
+shared_session: ContextVar[Optional[Session]] = ContextVar("shared_session", default=None)
+
+def get_db(connection: HTTPConnection):
+    db = shared_session.get()
+    if db is not None:
+        # Owned and closed by the batch request
+        yield db
+        return
+    if ReplicaSessionLocal is None:
+        db = SessionLocal()
+    else:
+        # Present when SessionMiddleware is installed; changes to it go out in the response's session cookie
+        http_session = connection.scope.get("session")
+        key = writer_key(connection.scope)
+        with _last_writes_lock:
+            cached = last_writes.get(key)
+        cookie = http_session.get(LAST_WRITE_SESSION_KEY) if http_session is not None else None
+        last_write = max((seen for seen in (cached, cookie) if seen is not None), default=None)
+        if connection.scope.get("method") in READ_METHODS and use_replica(last_write):
+            db = ReplicaSessionLocal()
+        else:
+            db = SessionLocal()
+            db.info["http_session"] = http_session
+            db.info["writer_key"] = key
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
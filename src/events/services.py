@@ -0,0 +1,140 @@
+import asyncio
+import json
+import logging
+import os
+import select
+import threading
+from collections import defaultdict
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Set
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Events buffered per subscriber before the oldest are dropped (slow or stalled clients)
+SUBSCRIBER_QUEUE_SIZE = 100
+# Postgres channel used by the cross-worker backend
+EVENTS_CHANNEL = "vetlink_events"
+
+
+class LocalBackend:
+    """Delivers events to subscribers in this process only."""
+
+    def start(self, dispatch: Callable[[dict], None]) -> None:
+        self.dispatch = dispatch
+
+    def publish(self, message: dict) -> None:
+        self.dispatch(message)
+
+
+class PostgresBackend:
+    """Fans events out to every worker through LISTEN/NOTIFY on the application database."""
+
+    def __init__(self, dsn: str):
+        self.dsn = dsn
+        self._lock = threading.Lock()
+        self._publisher = None
+
+    def start(self, dispatch: Callable[[dict], None]) -> None:
+        self.dispatch = dispatch
+        threading.Thread(target=self._listen, name="event-bus-listener", daemon=True).start()
+
+    def _connect(self):
+        import psycopg2
+        connection = psycopg2.connect(self.dsn)
+        connection.autocommit = True
+        return connection
+
+    def publish(self, message: dict) -> None:
+        with self._lock:
+            try:
+                if self._publisher is None or self._publisher.closed:
+                    self._publisher = self._connect()
+                with self._publisher.cursor() as cursor:
+                    cursor.execute("SELECT pg_notify(%s, %s)", (EVENTS_CHANNEL, json.dumps(message, default=str)))
+            except Exception:
+                self._publisher = None
+                logger.exception("Failed to publish event %s", message["event"].get("type"))
+
+    def _listen(self) -> None:
+        while True:
+            try:
+                connection = self._connect()
+                with connection.cursor() as cursor:
+                    cursor.execute(f"LISTEN {EVENTS_CHANNEL}")
+                while True:
+                    if select.select([connection], [], [], 30) == ([], [], []):
+                        continue
+                    connection.poll()
+                    while connection.notifies:
+                        self.dispatch(json.loads(connection.notifies.pop(0).payload))
+            except Exception as e:
+                logger.warning("Event listener disconnected, reconnecting: %s", e)
+                threading.Event().wait(1)
+
+
+class EventBus:
+    def __init__(self, backend=None):
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.backend = backend or LocalBackend()
+        self.backend.start(self._dispatch)
+
+    def subscribe(self, keys: List[str]) -> asyncio.Queue:
+        self._loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        for key in keys:
+            self._subscribers[key].add(queue)
+        return queue
+
+    def unsubscribe(self, keys: List[str], queue: asyncio.Queue) -> None:
+        for key in keys:
+            subscribers = self._subscribers.get(key)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[key]
+
+    def publish(self, keys: List[str], event: dict) -> None:
+        self.backend.publish({"keys": keys, "event": event})
+
+    def _dispatch(self, message: dict) -> None:
+        # Publishers may run in the threadpool, a Timer or the listener thread; hop onto the loop
+        if self._loop is None or self._loop.is_closed():
+            return
+        self._loop.call_soon_threadsafe(self._deliver, message)
+
+    def _deliver(self, message: dict) -> None:
+        queues = set()
+        for key in message["keys"]:
+            queues.update(self._subscribers.get(key, ()))
+        for queue in queues:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(message["event"])
+
+    def subscriber_count(self) -> int:
+        return len({queue for queues in self._subscribers.values() for queue in queues})
+
+
+def _make_backend():
+    if os.getenv("EVENT_BUS_BACKEND", "local") == "postgres":
+        from sqlalchemy.engine import make_url
+        url = make_url(os.getenv("DATABASE_URL")).set(drivername="postgresql")
+        return PostgresBackend(url.render_as_string(hide_password=False))
+    return LocalBackend()
+
+
+event_bus = EventBus(_make_backend())
+
+
+def publish_event(event_type: str, entity_id: int, user_id: Optional[int] = None, veterinarian_id: Optional[int] = None, **data) -> None:
+    keys = []
+    if user_id is not None:
+        keys.append(f"user:{user_id}")
+    if veterinarian_id is not None:
+        keys.append(f"vet:{veterinarian_id}")
+    if keys:
+        event_bus.publish(keys, {"type": event_type, "id": entity_id, "at": datetime.utcnow().isoformat(), **data})
@@ -0,0 +1,53 @@
+import asyncio
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+from fastapi.security import OAuth2PasswordBearer
+from typing import Optional
+from src.auth.services import get_current_principal
+from src.events.services import event_bus
+
+router = APIRouter(prefix="/events", tags=["events"])
+
+# EventSource cannot set headers, so browsers pass the token as ?access_token= instead
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
+
+# A comment line this often keeps proxies from closing an idle stream
+HEARTBEAT_SECONDS = 15
+
+# Server-sent events for the caller's appointments and pet records:
+# appointment.created/updated/canceled and pet_record.created/updated, each with the row id and status.
+# Clients refetch the row (or call /sync) on an event instead of polling.
+@router.get("/stream")
+async def event_stream_route(
+    request: Request,
+    access_token: Optional[str] = None,
+    token: Optional[str] = Depends(optional_oauth2_scheme)
+):
+    if not (token or access_token):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    principal = await get_current_principal(token or access_token)
+
+    keys = [f"user:{principal.id}"]
+    if principal.veterinarian_id is not None:
+        keys.append(f"vet:{principal.veterinarian_id}")
+    queue = event_bus.subscribe(keys)
+
+    async def stream():
+        try:
+            yield "retry: 5000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {orjson.dumps(event).decode()}\n\n"
+        finally:
+            event_bus.unsubscribe(keys, queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,52 @@
+# src/fieldsets.py
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple, Type
+from fastapi import HTTPException, Query, status
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, ConfigDict, create_model
+from sqlalchemy.orm import load_only
+
+Fields = Optional[Tuple[str, ...]]
+
+FIELDS_QUERY = Query(None, description="Comma separated fields to return, e.g. id,title,price; every field when omitted")
+
+
+def parse_fields(fields: Optional[str], schema: Type[BaseModel]) -> Fields:
+    """Validates a `fields=` value against the response schema; None means the full schema."""
+    if not fields:
+        return None
+    requested = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in requested if name not in schema.model_fields]
+    if unknown:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown fields: {', '.join(unknown)}")
+    # Clients always get the id back so partial rows can be merged into their cache
+    if "id" in schema.model_fields:
+        requested.insert(0, "id")
+    return tuple(dict.fromkeys(requested))
+
+
+@lru_cache(maxsize=256)
+def partial_model(schema: Type[BaseModel], fields: Tuple[str, ...]) -> Type[BaseModel]:
+    definitions = {name: (schema.model_fields[name].annotation, schema.model_fields[name]) for name in fields}
+    return create_model(f"{schema.__name__}Partial", __config__=ConfigDict(from_attributes=True), **definitions)
+
+
+def column_options(model, fields: Fields, extra: Iterable[str] = ()) -> list:
+    """load_only() for the requested columns plus any the caller needs itself (extra).
+
+    Any other column is left out of the SELECT and raises if touched, instead of lazy loading row by row.
+    """
+    if fields is None:
+        return []
+    columns = model.__table__.columns.keys()
+    names = [name for name in dict.fromkeys((*fields, *extra)) if name in columns]
+    return [load_only(*(getattr(model, name) for name in names), raiseload=True)]
+
+
+def partial_rows(schema: Type[BaseModel], fields: Tuple[str, ...], rows: Iterable) -> List[dict]:
+    model = partial_model(schema, fields)
+    return [model.model_validate(row).model_dump() for row in rows]
+
+
+def partial_response(schema: Type[BaseModel], fields: Tuple[str, ...], rows: Iterable, headers: Optional[dict] = None) -> ORJSONResponse:
+    return ORJSONResponse(partial_rows(schema, fields, rows), headers=headers)
@@ -0,0 +1,152 @@
+# src/firebase_tokens.py
+import logging
+import os
+import re
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+import requests
+from jose import jwt, JWTError
+from starlette.concurrency import run_in_threadpool
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Google's x509 certificates for Firebase ID tokens, keyed by "kid"
+FIREBASE_CERTS_URL = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+
+# Refresh in the background this many seconds before the cached certificates expire
+CERTS_REFRESH_MARGIN = 300
+
+# Minimum spacing between forced refreshes triggered by an unknown "kid"
+CERTS_MIN_REFRESH_INTERVAL = 30
+
+# Fallback lifetime when the response carries no Cache-Control max-age
+CERTS_DEFAULT_MAX_AGE = 3600
+
+MAX_AGE = re.compile(r"max-age=(\d+)")
+
+
+def fetch_google_certs() -> Tuple[Dict[str, str], int]:
+    response = requests.get(FIREBASE_CERTS_URL, timeout=5)
+    response.raise_for_status()
+    match = MAX_AGE.search(response.headers.get("Cache-Control", ""))
+    max_age = int(match.group(1)) if match else CERTS_DEFAULT_MAX_AGE
+    return response.json(), max_age
+
+
+class FirebaseTokenVerifier:
+    """Verifies Firebase ID tokens locally against cached Google signing certificates.
+
+    `fetch_certs` returns ``(certs_by_kid, max_age_seconds)``; tests can pass a function
+    serving certificates for locally generated keys so no network access is needed.
+    """
+
+    def __init__(self, project_id: str, fetch_certs: Callable[[], Tuple[Dict[str, str], int]] = fetch_google_certs):
+        self.project_id = project_id
+        self.fetch_certs = fetch_certs
+        self._certs: Dict[str, str] = {}
+        self._expires_at = 0.0
+        self._last_refresh = 0.0
+        self._lock = threading.Lock()
+        # Held for the whole fetch, so concurrent requests wait for one fetch instead of each making their own
+        self._fetch_lock = threading.Lock()
+        self._refreshing = False
+
+    def _refresh(self) -> None:
+        certs, max_age = self.fetch_certs()
+        with self._lock:
+            self._certs = certs
+            self._expires_at = time.monotonic() + max_age
+            self._last_refresh = time.monotonic()
+
+    def _refresh_if(self, stale: Callable[[], bool]) -> None:
+        with self._fetch_lock:
+            # Checked again under the lock: whoever held it before us may already have fetched
+            if stale():
+                self._refresh()
+
+    def _refresh_in_background(self) -> None:
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                with self._fetch_lock:
+                    self._refresh()
+            except Exception as e:
+                logger.warning("Failed to refresh Firebase signing certificates: %s", e)
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def get_cert(self, kid: str) -> Optional[str]:
+        now = time.monotonic()
+        if now >= self._expires_at:
+            self._refresh_if(lambda: time.monotonic() >= self._expires_at)
+        elif now >= self._expires_at - CERTS_REFRESH_MARGIN:
+            self._refresh_in_background()
+
+        cert = self._certs.get(kid)
+        # An unknown kid usually means Google rotated keys since our last fetch
+        if cert is None and time.monotonic() - self._last_refresh >= CERTS_MIN_REFRESH_INTERVAL:
+            self._refresh_if(lambda: kid not in self._certs and time.monotonic() - self._last_refresh >= CERTS_MIN_REFRESH_INTERVAL)
+            cert = self._certs.get(kid)
+        return cert
+
+    def verify(self, token: str) -> dict:
+        try:
+            header = jwt.get_unverified_header(token)
+        except JWTError as e:
+            raise ValueError("Malformed Firebase ID token") from e
+        if header.get("alg") != "RS256":
+            raise ValueError("Firebase ID token has an unexpected algorithm")
+
+        cert = self.get_cert(header.get("kid"))
+        if cert is None:
+            raise ValueError("Firebase ID token was signed by an unknown key")
+
+        try:
+            claims = jwt.decode(
+                token,
+                cert,
+                algorithms=["RS256"],
+                audience=self.project_id,
+                issuer=f"https://securetoken.google.com/{self.project_id}",
+                options={"verify_at_hash": False},
+            )
+        except JWTError as e:
+            raise ValueError(f"Invalid Firebase ID token: {e}") from e
+
+        if not claims.get("sub"):
+            raise ValueError("Firebase ID token has no subject")
+        if claims.get("auth_time", 0) > time.time():
+            raise ValueError("Firebase ID token has a future auth_time")
+        # Match the shape returned by firebase_admin.auth.verify_id_token
+        claims["uid"] = claims["sub"]
+        return claims
+
+
+_verifier: Optional[FirebaseTokenVerifier] = None
+
+
+def get_verifier() -> FirebaseTokenVerifier:
+    global _verifier
+    if _verifier is None:
+        project_id = os.getenv("FIREBASE_PROJECT_ID")
+        if not project_id:
+            import firebase_admin
+            project_id = firebase_admin.get_app().project_id
+        _verifier = FirebaseTokenVerifier(project_id)
+    return _verifier
+
+
+# Verification (and any certificate fetch) runs in the threadpool, off the event loop
+async def verify_firebase_id_token(token: str) -> dict:
+    return await run_in_threadpool(get_verifier().verify, token)
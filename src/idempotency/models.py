@@ -0,0 +1,15 @@
+from sqlalchemy import Column, DateTime, Integer, LargeBinary, String
+from datetime import datetime
+from src.database import Base
+
+class IdempotencyRecord(Base):
+    __tablename__ = "idempotency_records"
+
+    id = Column(Integer, primary_key=True, index=True)
+    key = Column(String, unique=True, index=True, nullable=False)  # "<client key>:<Idempotency-Key header>"
+    fingerprint = Column(String, nullable=False)  # sha256 of method, path, query and body
+    status_code = Column(Integer, nullable=True)  # NULL while the first request is still running
+    content_type = Column(String, nullable=True)
+    body = Column(LargeBinary, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)  # Also the start of the placeholder's lease
+    expires_at = Column(DateTime, nullable=False, index=True)
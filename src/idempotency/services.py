@@ -0,0 +1,179 @@
+import hashlib
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+from cachetools import TTLCache
+from sqlalchemy.exc import IntegrityError
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, Response
+from src.admission import client_key
+from src.database import SessionLocal
+from src.idempotency.models import IdempotencyRecord
+
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(24 * 3600)))
+# Bytes of response bodies each worker keeps in memory for replays; older ones are read back from the table
+IDEMPOTENCY_CACHE_BYTES = int(os.getenv("IDEMPOTENCY_CACHE_BYTES", str(32 * 1024 * 1024)))
+# Responses larger than this are not stored; a retry then runs the request again
+IDEMPOTENCY_MAX_BODY_BYTES = 256 * 1024
+# How often expired rows are deleted
+IDEMPOTENCY_SWEEP_SECONDS = 600
+# A placeholder still unfinished after this long belongs to a crashed or cancelled request and is taken over
+IDEMPOTENCY_LEASE_SECONDS = int(os.getenv("IDEMPOTENCY_LEASE_SECONDS", "60"))
+
+MUTATING_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+
+# key -> (fingerprint, status_code, content_type, body) for completed requests, bounded by body bytes
+# (plus a little per entry, so empty bodies count too)
+_completed: TTLCache = TTLCache(maxsize=IDEMPOTENCY_CACHE_BYTES, ttl=IDEMPOTENCY_TTL_SECONDS, getsizeof=lambda stored: len(stored[3]) + 256)
+_last_sweep = 0.0
+
+
+def _claim(key: str, fingerprint: str) -> Optional[IdempotencyRecord]:
+    """Inserts a placeholder for the key; returns the existing record when another request got there first.
+
+    A placeholder whose lease has run out is taken over, so a request that died mid-flight does not
+    block retries for the whole TTL.
+    """
+    global _last_sweep
+    db = SessionLocal()
+    try:
+        if time.monotonic() - _last_sweep >= IDEMPOTENCY_SWEEP_SECONDS:
+            db.query(IdempotencyRecord).filter(IdempotencyRecord.expires_at < datetime.utcnow()).delete(synchronize_session=False)
+            db.commit()
+            _last_sweep = time.monotonic()
+        try:
+            db.add(IdempotencyRecord(key=key, fingerprint=fingerprint, expires_at=datetime.utcnow() + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS)))
+            db.commit()
+            return None
+        except IntegrityError:
+            db.rollback()
+        record = db.query(IdempotencyRecord).filter(IdempotencyRecord.key == key).first()
+        now = datetime.utcnow()
+        if record is not None and record.status_code is None and record.created_at < now - timedelta(seconds=IDEMPOTENCY_LEASE_SECONDS):
+            # Compare-and-set on created_at, so only one of several concurrent retries wins the takeover
+            taken = db.query(IdempotencyRecord).filter(
+                IdempotencyRecord.id == record.id,
+                IdempotencyRecord.status_code.is_(None),
+                IdempotencyRecord.created_at == record.created_at
+            ).update({"fingerprint": fingerprint, "created_at": now}, synchronize_session=False)
+            db.commit()
+            if taken:
+                return None
+            record = db.query(IdempotencyRecord).filter(IdempotencyRecord.key == key).first()
+        if record is not None:
+            db.expunge(record)
+        return record
+    finally:
+        db.close()
+
+
+def _complete(key: str, status_code: int, content_type: Optional[str], body: bytes) -> None:
+    db = SessionLocal()
+    try:
+        db.query(IdempotencyRecord).filter(IdempotencyRecord.key == key).update(
+            {"status_code": status_code, "content_type": content_type, "body": body}, synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def _release(key: str) -> None:
+    # Failed or unstorable responses give up the key so the client's retry runs again
+    db = SessionLocal()
+    try:
+        db.query(IdempotencyRecord).filter(IdempotencyRecord.key == key).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _replay(fingerprint: str, stored: Tuple[str, int, Optional[str], bytes]):
+    stored_fingerprint, status_code, content_type, body = stored
+    if stored_fingerprint != fingerprint:
+        return JSONResponse({"detail": "Idempotency-Key was already used with a different request"}, status_code=422)
+    return Response(body, status_code=status_code, media_type=content_type, headers={"Idempotent-Replayed": "true"})
+
+
+class IdempotencyMiddleware:
+    """Replays the stored response for retried mutating requests carrying an Idempotency-Key header."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in MUTATING_METHODS:
+            await self.app(scope, receive, send)
+            return
+        header = next((value for name, value in scope["headers"] if name == b"idempotency-key"), None)
+        if not header:
+            await self.app(scope, receive, send)
+            return
+
+        # Buffer the body so it can be fingerprinted and then handed to the route unchanged
+        messages = []
+        digest = hashlib.sha256(f"{scope['method']} {scope['path']}?{scope.get('query_string', b'').decode()}\n".encode())
+        while True:
+            message = await receive()
+            messages.append(message)
+            digest.update(message.get("body", b""))
+            if message["type"] != "http.request" or not message.get("more_body"):
+                break
+        fingerprint = digest.hexdigest()
+        key = f"{client_key(scope)}:{header.decode('latin-1')[:255]}"
+
+        if key in _completed:
+            await _replay(fingerprint, _completed[key])(scope, receive, send)
+            return
+        existing = await run_in_threadpool(_claim, key, fingerprint)
+        if existing is not None:
+            if existing.status_code is None:
+                response = JSONResponse({"detail": "A request with this Idempotency-Key is still in progress"}, status_code=409, headers={"Retry-After": "1"})
+            else:
+                stored = (existing.fingerprint, existing.status_code, existing.content_type, existing.body)
+                _completed[key] = stored
+                response = _replay(fingerprint, stored)
+            await response(scope, receive, send)
+            return
+
+        async def replay_receive():
+            if messages:
+                return messages.pop(0)
+            return await receive()
+
+        status_code = None
+        content_type = None
+        no_store = False
+        chunks = []
+        size = 0
+
+        async def capture_send(message):
+            nonlocal status_code, content_type, no_store, size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = message.get("headers", [])
+                content_type = next((value.decode("latin-1") for name, value in headers if name == b"content-type"), None)
+                no_store = any(name == b"cache-control" and b"no-store" in value.lower() for name, value in headers)
+            elif message["type"] == "http.response.body" and size <= IDEMPOTENCY_MAX_BODY_BYTES:
+                chunk = message.get("body", b"")
+                size += len(chunk)
+                chunks.append(chunk)
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, capture_send)
+        except BaseException:
+            # Includes CancelledError when the client disconnects; a crashed worker is covered by the lease
+            await run_in_threadpool(_release, key)
+            raise
+
+        # Cache-Control: no-store marks responses carrying credentials (login, signup, token refresh),
+        # which must never be written to the idempotency table
+        if status_code is not None and 200 <= status_code < 300 and size <= IDEMPOTENCY_MAX_BODY_BYTES and not no_store:
+            response_body = b"".join(chunks)
+            await run_in_threadpool(_complete, key, status_code, content_type, response_body)
+            _completed[key] = (fingerprint, status_code, content_type, response_body)
+        else:
+            await run_in_threadpool(_release, key)
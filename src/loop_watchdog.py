@@ -0,0 +1,163 @@
+# src/loop_watchdog.py
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+import weakref
+from typing import Dict, List, Optional, Tuple
+
+# Off unless set: report any time the event loop is held longer than this many milliseconds
+LOOP_WATCHDOG_MS = float(os.getenv("LOOP_WATCHDOG_MS", "0"))
+LOOP_WATCHDOG_ENABLED = LOOP_WATCHDOG_MS > 0
+# Offenders kept in the report, worst first
+LOOP_WATCHDOG_MAX_ENTRIES = 200
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class BlockingSite:
+    def __init__(self, route: str, call_site: str, blocked_in: str):
+        self.route = route
+        self.call_site = call_site  # Innermost frame in our own code
+        self.blocked_in = blocked_in  # Innermost frame overall (the library call that held the loop)
+        self.stalls = 0
+        self.blocked_seconds = 0.0
+        self.max_stall_seconds = 0.0
+        self.stack: List[str] = []
+
+    def as_dict(self) -> Dict:
+        return {
+            "route": self.route,
+            "call_site": self.call_site,
+            "blocked_in": self.blocked_in,
+            "stalls": self.stalls,
+            "blocked_ms": round(self.blocked_seconds * 1000, 1),
+            "max_stall_ms": round(self.max_stall_seconds * 1000, 1),
+            "stack": self.stack,
+        }
+
+
+class LoopWatchdog:
+    """A heartbeat task on the loop plus a thread that samples the loop thread's stack while the heartbeat is late.
+
+    Each sample charges the time since the previous one to the route and call site holding the loop.
+    """
+
+    def __init__(self, threshold_ms: float):
+        self.threshold = threshold_ms / 1000
+        self.interval = max(0.005, self.threshold / 4)
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.loop_thread_id: Optional[int] = None
+        self.last_beat = time.monotonic()
+        self.beat = 0
+        self.max_lag = 0.0
+        self.stalls = 0
+        self._sampled_beat = -1
+        self._sampled_at = 0.0
+        self._sites: Dict[Tuple[str, str], BlockingSite] = {}
+        self._lock = threading.Lock()
+        # Request task -> ASGI scope, filled by LoopWatchdogMiddleware
+        self.task_scopes: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        self.loop = loop
+        self.loop_thread_id = threading.get_ident()
+        loop.create_task(self._heartbeat())
+        threading.Thread(target=self._watch, name="loop-watchdog", daemon=True).start()
+
+    async def _heartbeat(self) -> None:
+        while True:
+            scheduled = time.monotonic()
+            self.last_beat = scheduled
+            self.beat += 1
+            await asyncio.sleep(self.interval)
+            self.max_lag = max(self.max_lag, time.monotonic() - scheduled - self.interval)
+
+    def _watch(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            now = time.monotonic()
+            stalled = now - self.last_beat - self.interval
+            if stalled < self.threshold:
+                continue
+            frame = sys._current_frames().get(self.loop_thread_id)
+            if frame is not None:
+                self._sample(frame, stalled, now)
+
+    def _route(self) -> str:
+        try:
+            task = asyncio.current_task(self.loop)
+        except RuntimeError:
+            task = None
+        scope = self.task_scopes.get(task) if task is not None else None
+        if scope is None:
+            return "-"
+        route = scope.get("route")
+        return f"{scope.get('method', 'WS')} {getattr(route, 'path', scope.get('path'))}"
+
+    def _sample(self, frame, stalled: float, now: float) -> None:
+        stack = traceback.extract_stack(frame)
+        ours = [entry for entry in stack if entry.filename.startswith(SRC_DIR) and not entry.filename.endswith("loop_watchdog.py")]
+        call_site = f"{os.path.relpath(ours[-1].filename, os.path.dirname(SRC_DIR))}:{ours[-1].lineno} in {ours[-1].name}" if ours else "-"
+        blocked_in = f"{stack[-1].filename}:{stack[-1].lineno} in {stack[-1].name}"
+        route = self._route()
+        with self._lock:
+            site = self._sites.get((route, call_site))
+            if site is None:
+                if len(self._sites) >= LOOP_WATCHDOG_MAX_ENTRIES:
+                    return
+                site = self._sites[(route, call_site)] = BlockingSite(route, call_site, blocked_in)
+            if self._sampled_beat != self.beat:
+                # First sample of this stall: everything since the threshold was crossed belongs to it
+                self._sampled_beat = self.beat
+                self.stalls += 1
+                site.stalls += 1
+                site.blocked_seconds += stalled
+            else:
+                site.blocked_seconds += now - self._sampled_at
+            self._sampled_at = now
+            site.max_stall_seconds = max(site.max_stall_seconds, stalled)
+            site.blocked_in = blocked_in
+            site.stack = [f"{entry.filename}:{entry.lineno} in {entry.name}" for entry in stack[-15:]]
+
+    def report(self, limit: int = 50) -> Dict:
+        with self._lock:
+            sites = sorted(self._sites.values(), key=lambda site: site.blocked_seconds, reverse=True)[:limit]
+            offenders = [site.as_dict() for site in sites]
+        return {
+            "enabled": True,
+            "threshold_ms": self.threshold * 1000,
+            "stalls": self.stalls,
+            "max_lag_ms": round(self.max_lag * 1000, 1),
+            "offenders": offenders,
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._sites.clear()
+            self.stalls = 0
+            self.max_lag = 0.0
+
+
+loop_watchdog = LoopWatchdog(LOOP_WATCHDOG_MS) if LOOP_WATCHDOG_ENABLED else None
+
+
+def loop_blocking_report(limit: int = 50) -> Dict:
+    if loop_watchdog is None:
+        return {"enabled": False}
+    return loop_watchdog.report(limit)
+
+
+class LoopWatchdogMiddleware:
+    """Remembers which request each task serves, so stalls can be charged to a route. Only installed when enabled."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        task = asyncio.current_task()
+        if task is not None:
+            loop_watchdog.task_scopes[task] = scope
+        await self.app(scope, receive, send)
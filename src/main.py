@@ -1,15 +1,44 @@
-from fastapi import FastAPI
+import asyncio
+from fastapi import Depends, FastAPI
+from fastapi.responses import ORJSONResponse
 from starlette.middleware.sessions import SessionMiddleware
 from starlette.middleware.cors import CORSMiddleware
 from src.api import router as api_routers
+from src.admission import AdmissionControlMiddleware, admission_stats
+from src.idempotency.services import IdempotencyMiddleware
+from src.query_stats import QueryStatsMiddleware
+from src.metrics import MetricsMiddleware, metrics_response, start_sampler, mark_worker_dead
+from src.loop_watchdog import LOOP_WATCHDOG_ENABLED, LoopWatchdogMiddleware, loop_watchdog, loop_blocking_report
+from src.profiling import PROFILING_ENABLED, ProfilingMiddleware, require_admin
+from src.periodic import start_periodic
+from src.petRecord.services import DUE_REMINDER_INTERVAL_SECONDS, run_due_reminders
+from src.sync.services import CHANGE_LOG_PRUNE_INTERVAL_SECONDS, run_change_log_pruning
 
-from src.database import engine, Base
+from src.database import engine, Base, pool_stats, add_missing_columns
+from src.auth.location import location_buffer
 from dotenv import load_dotenv
 import os
 
 load_dotenv() 
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
+
+# Statement count and DB time per request, X-DB-Queries/X-DB-Time headers when DEBUG is set
+app.add_middleware(QueryStatsMiddleware)
+
+# cProfile around admin requests sent with X-Profile or a sampled fraction (only when enabled)
+if PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+
+# Tags each request's task with its route for the event loop watchdog (only when LOOP_WATCHDOG_MS is set)
+if LOOP_WATCHDOG_ENABLED:
+    app.add_middleware(LoopWatchdogMiddleware)
+
+# Per-route-class concurrency and rate limits (inside CORS, so rejections still get CORS headers)
+app.add_middleware(AdmissionControlMiddleware)
+
+# Replay stored responses for retried requests carrying an Idempotency-Key (outside admission control, so replays are cheap)
+app.add_middleware(IdempotencyMiddleware)
 
 # Add CORS middleware
 app.add_middleware(
@@ -23,12 +52,74 @@ app.add_middleware(
 # Add session middleware
 app.add_middleware(SessionMiddleware, secret_key=os.getenv("SECRET_KEY"))
 
+# Latency, status and in-flight metrics (outermost, so admission rejections and replays are counted too)
+app.add_middleware(MetricsMiddleware)
+
 # Initialize database tables
 Base.metadata.create_all(bind=engine)
 
+# Columns added to tables that existing deployments already have
+add_missing_columns(engine, "users", {"token_version": "INTEGER NOT NULL DEFAULT 0"})
+add_missing_columns(engine, "appointments", {"updated_at": "TIMESTAMP"})
+
 # Include the main API router
 app.include_router(api_routers)
 
+@app.on_event("startup")
+def start_metrics_sampler():
+    start_sampler()
+
+# Follow-up and vaccination reminders from the due index
+@app.on_event("startup")
+def start_due_reminders():
+    if DUE_REMINDER_INTERVAL_SECONDS > 0:
+        start_periodic("due-reminders", DUE_REMINDER_INTERVAL_SECONDS, run_due_reminders)
+
+# Change log rows past the retention horizon; clients that far behind get a full snapshot
+@app.on_event("startup")
+def start_change_log_pruning():
+    if CHANGE_LOG_PRUNE_INTERVAL_SECONDS > 0:
+        start_periodic("change-log-pruning", CHANGE_LOG_PRUNE_INTERVAL_SECONDS, run_change_log_pruning)
+
+@app.on_event("startup")
+async def start_loop_watchdog():
+    if loop_watchdog is not None:
+        loop_watchdog.start(asyncio.get_running_loop())
+
+# Write out buffered user locations before the worker exits
+@app.on_event("shutdown")
+def flush_location_buffer():
+    location_buffer.stop()
+    mark_worker_dead()
+
+# Queue depth and rejection counters per route class, for sizing workers (admins only)
+@app.get("/admission", dependencies=[Depends(require_admin)])
+def read_admission_stats():
+    return admission_stats()
+
+# Connection pool usage per engine (checkout waits, in-use, overflow), for sizing pools per worker (admins only)
+@app.get("/pool", dependencies=[Depends(require_admin)])
+def read_pool_stats():
+    return pool_stats()
+
+# Routes and call sites that held the event loop longest (LOOP_WATCHDOG_MS must be set).
+# Admins only: the report includes source paths and stacks.
+@app.get("/loop-blocking", dependencies=[Depends(require_admin)])
+def read_loop_blocking_report(limit: int = 50):
+    return loop_blocking_report(limit)
+
+# Starts a fresh report, e.g. after a deploy
+@app.delete("/loop-blocking", dependencies=[Depends(require_admin)])
+def reset_loop_blocking_report():
+    if loop_watchdog is not None:
+        loop_watchdog.reset()
+    return {"detail": "Loop blocking report reset"}
+
+# Prometheus scrape target; totals cover every worker when PROMETHEUS_MULTIPROC_DIR is set
+@app.get("/metrics", include_in_schema=False)
+def read_metrics():
+    return metrics_response()
+
 @app.get("/")
 def read_root():
     return {"message": "Welcome to VetLink MarketPlace API"}
@@ -0,0 +1,123 @@
+# src/metrics.py
+import logging
+import os
+import threading
+import time
+from typing import Dict, Tuple
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+from starlette.responses import Response
+from src.admission import admission_stats
+from src.database import pool_stats
+from src.events.services import event_bus
+
+logger = logging.getLogger(__name__)
+
+# With several uvicorn workers, point PROMETHEUS_MULTIPROC_DIR at an empty directory shared by them (set before
+# they start): each worker writes its samples to mmapped files there and any worker's scrape returns the totals
+
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+# How often pool, admission and stream gauges are refreshed from each worker's own counters
+SAMPLE_INTERVAL_SECONDS = 5
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "Request latency by route template", ["method", "route"], buckets=LATENCY_BUCKETS)
+REQUESTS = Counter("http_requests", "Responses by route template and status", ["method", "route", "status"])
+IN_FLIGHT = Gauge("http_requests_in_flight", "Requests currently being served", multiprocess_mode="livesum")
+WEBSOCKETS = Gauge("websocket_connections", "Open chat WebSocket connections", multiprocess_mode="livesum")
+EVENT_STREAMS = Gauge("event_stream_subscribers", "Open server-sent event streams", multiprocess_mode="livesum")
+NOTIFICATION_LATENCY = Histogram("push_notification_duration_seconds", "Expo push send latency", buckets=LATENCY_BUCKETS)
+NOTIFICATION_FAILURES = Counter("push_notification_failures", "Failed push notifications by reason", ["reason"])
+DB_POOL_CONNECTIONS = Gauge("db_pool_connections", "Pool connections by engine and state", ["engine", "state"], multiprocess_mode="livesum")
+DB_POOL_EVENTS = Gauge("db_pool_events", "Cumulative pool events by engine (checkouts, timeouts, ...)", ["engine", "event"], multiprocess_mode="livesum")
+DB_POOL_WAIT = Gauge("db_pool_checkout_wait_seconds", "Cumulative time spent waiting for a pooled connection", ["engine"], multiprocess_mode="livesum")
+ADMISSION = Gauge("admission_requests", "Admission control state and counters by route class", ["route_class", "state"], multiprocess_mode="livesum")
+
+# Label lookups take a lock, so the children for each (method, route, status) are kept here
+_children: Dict[Tuple[str, str, int], Tuple] = {}
+
+
+def _route_children(method: str, route: str, status_code: int) -> Tuple:
+    key = (method, route, status_code)
+    children = _children.get(key)
+    if children is None:
+        children = _children[key] = (REQUEST_LATENCY.labels(method, route), REQUESTS.labels(method, route, str(status_code)))
+    return children
+
+
+def sample() -> None:
+    for engine, stats in pool_stats().items():
+        if engine == "read_routing":
+            continue
+        for state in ("in_use", "idle", "overflow", "size"):
+            if state in stats:
+                DB_POOL_CONNECTIONS.labels(engine, state).set(stats[state])
+        for name in ("checkouts", "overflow_checkouts", "connects", "invalidations", "liveness_failures", "timeouts"):
+            DB_POOL_EVENTS.labels(engine, name).set(stats[name])
+        DB_POOL_WAIT.labels(engine).set(stats["wait_seconds_total"])
+    for route_class, stats in admission_stats().items():
+        for state in ("in_flight", "queued", "admitted", "rejected_rate_limited", "rejected_overloaded"):
+            ADMISSION.labels(route_class, state).set(stats[state])
+    EVENT_STREAMS.set(event_bus.subscriber_count())
+
+
+def _sample_forever() -> None:
+    while True:
+        time.sleep(SAMPLE_INTERVAL_SECONDS)
+        try:
+            sample()
+        except Exception:
+            logger.exception("Failed to sample metrics")
+
+
+def start_sampler() -> None:
+    threading.Thread(target=_sample_forever, name="metrics-sampler", daemon=True).start()
+
+
+def mark_worker_dead() -> None:
+    # Drops this worker's live gauges from the shared totals
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+def metrics_response() -> Response:
+    sample()
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+
+class MetricsMiddleware:
+    """Latency, status and in-flight metrics per route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            IN_FLIGHT.dec()
+            # Unmatched paths share one label so scanners cannot blow up the series count
+            route = getattr(scope.get("route"), "path", "unmatched")
+            latency, requests = _route_children(scope["method"], route, status_code)
+            latency.observe(elapsed)
+            requests.inc()
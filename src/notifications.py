@@ -1,3 +1,4 @@
+import time
 from exponent_server_sdk import (
     PushClient,
     PushMessage,
@@ -5,6 +6,7 @@ from exponent_server_sdk import (
     DeviceNotRegisteredError,
     PushTicketError,
 )
+from src.metrics import NOTIFICATION_FAILURES, NOTIFICATION_LATENCY
 
 def send_push_notification(expo_token, title, message):
     # Create the PushMessage object
@@ -16,18 +18,25 @@ def send_push_notification(expo_token, title, message):
     )
 
     # Initialize the PushClient
+    started = time.perf_counter()
     try:
         response = PushClient().publish(message)
         response.validate_response()
     except DeviceNotRegisteredError:
         # Handle the case where the device is no longer registered
+        NOTIFICATION_FAILURES.labels("device_not_registered").inc()
         print("Device is not registered. Could not send the notification.")
     except PushTicketError as exc:
         # Handle specific errors related to the push ticket
+        NOTIFICATION_FAILURES.labels("push_ticket_error").inc()
         print(f"Push ticket error: {exc}")
     except PushServerError as exc:
         # Handle server errors
+        NOTIFICATION_FAILURES.labels("push_server_error").inc()
         print(f"Push server error: {exc}")
     except Exception as e:
         # Handle other exceptions
+        NOTIFICATION_FAILURES.labels("error").inc()
         print(f"Failed to send push notification: {e}")
+    finally:
+        NOTIFICATION_LATENCY.observe(time.perf_counter() - started)
@@ -0,0 +1,23 @@
+# src/periodic.py
+import logging
+import threading
+import time
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+
+def start_periodic(name: str, interval_seconds: float, task: Callable[[], None]) -> None:
+    """Runs task every interval_seconds in a daemon thread of this worker; a failed run is logged and retried next interval.
+
+    Every worker runs its own copy, so tasks must be safe to run concurrently (idempotent deletes, claimed rows).
+    """
+    def run():
+        while True:
+            time.sleep(interval_seconds)
+            try:
+                task()
+            except Exception:
+                logger.exception("Periodic task %s failed", name)
+
+    threading.Thread(target=run, name=name, daemon=True).start()
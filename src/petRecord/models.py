@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, Float
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, Float, Boolean, LargeBinary, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from src.database import Base
@@ -16,7 +16,7 @@ class PetRecord(Base):
     
     veterinarian_id = Column(Integer, ForeignKey("veterinarians.id"), nullable=False)
     appointment_id = Column(Integer, ForeignKey("appointments.id"), nullable=False)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)  # Add this line to establish the relationship
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)  # Pet owner, copied from the appointment
 
     condition = Column(Text, nullable=False)  # Diagnosed condition
     symptoms = Column(Text, nullable=True)  # Symptoms observed
@@ -34,3 +34,41 @@ class PetRecord(Base):
     veterinarian = relationship("Veterinarian", back_populates="pet_records")
     appointment = relationship("Appointment", back_populates="pet_record")
     user = relationship("User", back_populates="pet_records")  # Relationship with User
+    revisions = relationship("PetRecordRevision", back_populates="pet_record", order_by="PetRecordRevision.revision")
+    due_items = relationship("PetRecordDueItem", back_populates="pet_record", cascade="all, delete-orphan")
+
+
+class PetRecordRevision(Base):
+    __tablename__ = "pet_record_revisions"
+    __table_args__ = (Index("ix_pet_record_revisions_record_revision", "pet_record_id", "revision", unique=True),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    pet_record_id = Column(Integer, ForeignKey("pet_records.id"), nullable=False)
+    revision = Column(Integer, nullable=False)  # 1 for the first update, 2 for the second, ...
+    veterinarian_id = Column(Integer, ForeignKey("veterinarians.id"), nullable=False)  # Who made the change
+    changed_fields = Column(String, nullable=False)  # Comma separated, for listing without decoding the delta
+    delta = Column(LargeBinary, nullable=False)  # JSON of the values *before* this update, only for changed fields
+    compressed = Column(Boolean, default=False)  # True when delta is zlib compressed
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    pet_record = relationship("PetRecord", back_populates="revisions")
+
+
+class PetRecordDueItem(Base):
+    __tablename__ = "pet_record_due_items"
+    __table_args__ = (
+        Index("ix_pet_record_due_items_vet_due", "veterinarian_id", "due_date"),
+        Index("ix_pet_record_due_items_user_due", "user_id", "due_date"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    pet_record_id = Column(Integer, ForeignKey("pet_records.id"), nullable=False, index=True)
+    veterinarian_id = Column(Integer, ForeignKey("veterinarians.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    kind = Column(String, nullable=False)  # "follow_up" or "vaccination"
+    description = Column(String, nullable=True)  # Vaccine name, or "Follow-up visit"
+    pet_name = Column(String, nullable=False)  # Copied from the record so lists and reminders need no join
+    due_date = Column(DateTime, nullable=False, index=True)
+    reminded_at = Column(DateTime, nullable=True)  # Set once the reminder batch has notified the owner
+
+    pet_record = relationship("PetRecord", back_populates="due_items")
@@ -51,3 +51,22 @@ class PetRecordSchema(BaseModel):
 
     class Config:
         from_attributes = True
+
+class PetRecordRevisionSchema(BaseModel):
+    revision: int
+    veterinarian_id: int
+    changed_fields: List[str]
+    created_at: datetime
+
+class PetRecordDueItemSchema(BaseModel):
+    id: int
+    pet_record_id: int
+    veterinarian_id: int
+    user_id: int
+    kind: str
+    description: Optional[str] = None
+    pet_name: str
+    due_date: datetime
+
+    class Config:
+        from_attributes = True
@@ -1,10 +1,34 @@
-from sqlalchemy.orm import Session
+import csv
+import io
+import json
+import os
+import re
+import zlib
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from sqlalchemy.orm import Session, raiseload, defer
 from fastapi import HTTPException
-from src.petRecord.models import PetRecord
-from src.petRecord.schemas import PetRecordCreate, PetRecordUpdate
+from src.database import SessionLocal
+from src.petRecord.models import PetRecord, PetRecordRevision, PetRecordDueItem
+from src.petRecord.schemas import PetRecordCreate, PetRecordUpdate, PetRecordSchema
 from src.appointments.models import Appointment
 from src.appointments.services import send_notification
-from typing import List
+from src.events.services import publish_event
+from src.fieldsets import Fields, column_options
+from typing import Iterator, List, Optional, Tuple
+
+# Rows fetched per round trip while streaming exports
+EXPORT_BATCH_SIZE = 500
+EXPORT_FIELDS = list(PetRecordSchema.model_fields.keys())
+
+# Revision deltas larger than this (in bytes) are stored zlib compressed
+REVISION_COMPRESS_THRESHOLD = 512
+
+# How often each worker runs the reminder batch (items due within a day); 0 turns it off
+DUE_REMINDER_INTERVAL_SECONDS = int(os.getenv("DUE_REMINDER_INTERVAL_SECONDS", "3600"))
+
+# Vaccination entries carry their due date as "Rabies: 2025-03-01", one per line or separated by ; or ,
+VACCINATION_DUE_DATE = re.compile(r"(\d{4}-\d{2}-\d{2})")
 
 def create_pet_record(db: Session, veterinarian_id: int, appointment_id: int, pet_record_data: PetRecordCreate) -> PetRecord:
     appointment = db.query(Appointment).filter(Appointment.id == appointment_id, Appointment.veterinarian_id == veterinarian_id).first()
@@ -20,6 +44,7 @@ def create_pet_record(db: Session, veterinarian_id: int, appointment_id: int, pe
         sex=pet_record_data.sex,
         veterinarian_id=veterinarian_id,
         appointment_id=appointment_id,
+        user_id=appointment.user_id,  # Denormalized owner so reads never need the appointment
         condition=pet_record_data.condition,
         symptoms=pet_record_data.symptoms,
         treatment=pet_record_data.treatment,
@@ -30,8 +55,11 @@ def create_pet_record(db: Session, veterinarian_id: int, appointment_id: int, pe
         additional_notes=pet_record_data.additional_notes
     )
     db.add(pet_record)
+    db.flush()
+    sync_due_items(db, pet_record)
     db.commit()
     db.refresh(pet_record)
+    publish_event("pet_record.created", pet_record.id, pet_record.user_id, pet_record.veterinarian_id, appointment_id=appointment_id)
 
     send_notification(
         title="New Pet Record Created",
@@ -43,33 +71,226 @@ def create_pet_record(db: Session, veterinarian_id: int, appointment_id: int, pe
     return pet_record
 
 def update_pet_record(db: Session, pet_record_id: int, pet_record_data: PetRecordUpdate, veterinarian_id: int) -> PetRecord:
-    pet_record = db.query(PetRecord).filter(PetRecord.id == pet_record_id, PetRecord.veterinarian_id == veterinarian_id).first()
+    # Row lock held until commit: concurrent updates of the same record queue here, so each one sees the
+    # previous one's values and revision number instead of colliding on the unique revision index
+    pet_record = db.query(PetRecord).options(raiseload(PetRecord.appointment)).filter(
+        PetRecord.id == pet_record_id, PetRecord.veterinarian_id == veterinarian_id
+    ).with_for_update().populate_existing().first()
     if not pet_record:
         raise HTTPException(status_code=404, detail="Pet record not found")
 
-    for key, value in pet_record_data.dict(exclude_unset=True).items():
+    changes = pet_record_data.dict(exclude_unset=True)
+    record_pet_record_revision(db, pet_record, changes, veterinarian_id)
+    for key, value in changes.items():
         setattr(pet_record, key, value)
+    if "follow_up_date" in changes or "vaccinations" in changes:
+        sync_due_items(db, pet_record)
     
     db.commit()
     db.refresh(pet_record)
+    publish_event("pet_record.updated", pet_record.id, pet_record.user_id, pet_record.veterinarian_id, changed_fields=sorted(changes))
 
     send_notification(
         title="Pet Record Updated",
         body=f"The record for your pet {pet_record.pet_name} has been updated.",
-        recipient_user_id=pet_record.appointment.user_id,
+        recipient_user_id=pet_record.user_id,
         db=db
     )
     
     return pet_record
 
 def get_pet_record_by_id(db: Session, pet_record_id: int) -> PetRecord:
-    pet_record = db.query(PetRecord).filter(PetRecord.id == pet_record_id).first()
+    pet_record = db.query(PetRecord).options(raiseload(PetRecord.appointment)).filter(PetRecord.id == pet_record_id).first()
     if not pet_record:
         raise HTTPException(status_code=404, detail="Pet record not found")
     return pet_record
 
-def get_pet_records_for_user(db: Session, user_id: int) -> List[PetRecord]:
-    return db.query(PetRecord).join(Appointment).filter(Appointment.user_id == user_id).all()
+def get_pet_records_for_user(db: Session, user_id: int, fields: Fields = None) -> List[PetRecord]:
+    return db.query(PetRecord).options(raiseload(PetRecord.appointment), *column_options(PetRecord, fields)).filter(PetRecord.user_id == user_id).all()
+
+def get_pet_records_for_veterinarian(db: Session, veterinarian_id: int, fields: Fields = None) -> List[PetRecord]:
+    return db.query(PetRecord).options(raiseload(PetRecord.appointment), *column_options(PetRecord, fields)).filter(PetRecord.veterinarian_id == veterinarian_id).all()
+
+# Row count, newest change and highest id of the records a list would return
+def get_pet_records_version(db: Session, veterinarian_id: Optional[int] = None, user_id: Optional[int] = None) -> tuple:
+    query = db.query(func.count(PetRecord.id), func.max(PetRecord.updated_at), func.max(PetRecord.id))
+    if veterinarian_id is not None:
+        query = query.filter(PetRecord.veterinarian_id == veterinarian_id)
+    else:
+        query = query.filter(PetRecord.user_id == user_id)
+    return tuple(query.one())
+
+# Streaming export
+def iter_pet_records_for_export(db: Session, veterinarian_id: Optional[int] = None, user_id: Optional[int] = None, since: Optional[datetime] = None) -> Iterator[PetRecord]:
+    query = db.query(PetRecord).options(raiseload(PetRecord.appointment))
+    if veterinarian_id is not None:
+        query = query.filter(PetRecord.veterinarian_id == veterinarian_id)
+    if user_id is not None:
+        query = query.filter(PetRecord.user_id == user_id)
+    if since is not None:
+        query = query.filter(PetRecord.updated_at >= since)
+    # yield_per enables server-side cursors, so only one batch is held in memory at a time
+    return query.order_by(PetRecord.updated_at, PetRecord.id).yield_per(EXPORT_BATCH_SIZE)
+
+def export_pet_records_ndjson(records: Iterator[PetRecord]) -> Iterator[str]:
+    for record in records:
+        yield PetRecordSchema.model_validate(record).model_dump_json() + "\n"
+
+def export_pet_records_csv(records: Iterator[PetRecord]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    for record in records:
+        writer.writerow(PetRecordSchema.model_validate(record).model_dump(mode="json"))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    # Header-only export when nothing matched
+    if buffer.tell():
+        yield buffer.getvalue()
+
+# Revision history
+def _encode_delta(values: dict) -> Tuple[bytes, bool]:
+    raw = json.dumps(values, default=lambda value: value.isoformat(), separators=(",", ":")).encode()
+    if len(raw) > REVISION_COMPRESS_THRESHOLD:
+        return zlib.compress(raw), True
+    return raw, False
+
+def _decode_delta(revision: PetRecordRevision) -> dict:
+    raw = zlib.decompress(revision.delta) if revision.compressed else revision.delta
+    return json.loads(raw)
+
+def record_pet_record_revision(db: Session, pet_record: PetRecord, changes: dict, veterinarian_id: int) -> Optional[PetRecordRevision]:
+    # Store the previous values of the fields that actually change; the live row is always the newest version.
+    # Callers hold the record's row lock (SELECT ... FOR UPDATE), which makes max + 1 safe.
+    previous = {key: getattr(pet_record, key) for key, value in changes.items() if getattr(pet_record, key) != value}
+    if not previous:
+        return None
+
+    last_revision = db.query(func.max(PetRecordRevision.revision)).filter(PetRecordRevision.pet_record_id == pet_record.id).scalar() or 0
+    delta, compressed = _encode_delta(previous)
+    revision = PetRecordRevision(
+        pet_record_id=pet_record.id,
+        revision=last_revision + 1,
+        veterinarian_id=veterinarian_id,
+        changed_fields=",".join(previous),
+        delta=delta,
+        compressed=compressed
+    )
+    db.add(revision)
+    return revision
+
+def get_pet_record_history(db: Session, pet_record_id: int) -> List[PetRecordRevision]:
+    return db.query(PetRecordRevision).options(defer(PetRecordRevision.delta)).filter(
+        PetRecordRevision.pet_record_id == pet_record_id
+    ).order_by(PetRecordRevision.revision).all()
+
+def get_pet_record_version(db: Session, pet_record: PetRecord, revision: int) -> PetRecordSchema:
+    # Walk backwards from the live row, undoing every update made after the requested revision
+    revisions = db.query(PetRecordRevision).filter(
+        PetRecordRevision.pet_record_id == pet_record.id,
+        PetRecordRevision.revision >= revision
+    ).order_by(PetRecordRevision.revision.desc()).all()
+    if revision < 0 or (revision > 0 and (not revisions or revisions[-1].revision != revision)):
+        raise HTTPException(status_code=404, detail="Pet record revision not found")
+
+    state = PetRecordSchema.model_validate(pet_record).model_dump()
+    for newer in revisions:
+        if newer.revision > revision:
+            state.update(_decode_delta(newer))
+    state["updated_at"] = revisions[-1].created_at if revision > 0 else pet_record.created_at
+    return PetRecordSchema.model_validate(state)
+
+# Due items (follow-ups and vaccinations)
+def parse_vaccination_due_dates(vaccinations: Optional[str]) -> List[Tuple[str, datetime]]:
+    due_dates = []
+    for entry in re.split(r"[\n;,]", vaccinations or ""):
+        match = VACCINATION_DUE_DATE.search(entry)
+        if not match:
+            continue
+        try:
+            due_date = datetime.strptime(match.group(1), "%Y-%m-%d")
+        except ValueError:
+            continue
+        name = re.sub(r"\bdue\b", "", entry[:match.start()], flags=re.IGNORECASE).strip(" :-\t")
+        due_dates.append((name or "Vaccination", due_date))
+    return due_dates
+
+def sync_due_items(db: Session, pet_record: PetRecord) -> List[PetRecordDueItem]:
+    # Bring the record's rows in the due index in line with its dates; callers commit. Items whose
+    # (kind, description, due_date) is unchanged are kept with their reminded_at, so an edit to one date
+    # does not send the reminders for the others again.
+    wanted = [("vaccination", name, due_date) for name, due_date in parse_vaccination_due_dates(pet_record.vaccinations)]
+    if pet_record.follow_up_date:
+        wanted.append(("follow_up", "Follow-up visit", pet_record.follow_up_date))
+
+    items = []
+    for item in db.query(PetRecordDueItem).filter(PetRecordDueItem.pet_record_id == pet_record.id).all():
+        key = (item.kind, item.description, item.due_date)
+        if key in wanted:
+            wanted.remove(key)
+            items.append(item)
+        else:
+            db.delete(item)
+
+    for kind, description, due_date in wanted:
+        item = PetRecordDueItem(
+            pet_record_id=pet_record.id,
+            veterinarian_id=pet_record.veterinarian_id,
+            user_id=pet_record.user_id,
+            pet_name=pet_record.pet_name,
+            kind=kind,
+            description=description,
+            due_date=due_date
+        )
+        db.add(item)
+        items.append(item)
+    return items
+
+def get_due_items(db: Session, veterinarian_id: Optional[int] = None, user_id: Optional[int] = None, days: int = 7, limit: int = 50, offset: int = 0) -> List[PetRecordDueItem]:
+    start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    query = db.query(PetRecordDueItem).filter(
+        PetRecordDueItem.due_date >= start,
+        PetRecordDueItem.due_date < start + timedelta(days=days + 1)
+    )
+    if veterinarian_id is not None:
+        query = query.filter(PetRecordDueItem.veterinarian_id == veterinarian_id)
+    if user_id is not None:
+        query = query.filter(PetRecordDueItem.user_id == user_id)
+    return query.order_by(PetRecordDueItem.due_date, PetRecordDueItem.id).offset(offset).limit(limit).all()
+
+def send_due_reminders(db: Session, days_ahead: int = 1) -> int:
+    # Reminder batch: notify owners about items due within days_ahead, straight from the index.
+    # pet_name is copied onto each item; PetRecordUpdate cannot rename a pet, so the copy stays current.
+    now = datetime.utcnow()
+    due_items = db.query(PetRecordDueItem).filter(
+        PetRecordDueItem.due_date >= now,
+        PetRecordDueItem.due_date < now + timedelta(days=days_ahead),
+        PetRecordDueItem.reminded_at.is_(None)
+    ).order_by(PetRecordDueItem.due_date).all()
+
+    sent = 0
+    for item in due_items:
+        # Every worker runs this batch: the item is claimed first and only the worker whose update lands sends it
+        claimed = db.query(PetRecordDueItem).filter(
+            PetRecordDueItem.id == item.id, PetRecordDueItem.reminded_at.is_(None)
+        ).update({"reminded_at": now}, synchronize_session=False)
+        db.commit()
+        if not claimed:
+            continue
+        what = "a follow-up visit" if item.kind == "follow_up" else f"the {item.description} vaccination"
+        send_notification(
+            title="Pet Care Reminder",
+            body=f"{item.pet_name} is due for {what} on {item.due_date:%Y-%m-%d}.",
+            recipient_user_id=item.user_id,
+            db=db
+        )
+        sent += 1
+    return sent
 
-def get_pet_records_for_veterinarian(db: Session, veterinarian_id: int) -> List[PetRecord]:
-    return db.query(PetRecord).filter(PetRecord.veterinarian_id == veterinarian_id).all()
+def run_due_reminders() -> None:
+    db = SessionLocal()
+    try:
+        send_due_reminders(db)
+    finally:
+        db.close()
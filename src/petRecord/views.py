@@ -1,59 +1,164 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
-from src.database import get_db
-from src.auth.services import get_current_user
-from src.petRecord.schemas import PetRecordCreate, PetRecordUpdate, PetRecordSchema
+from typing import List, Optional
+from datetime import datetime
+from src.database import get_db, SessionLocal
+from src.auth.services import get_current_principal, Principal
+from src.auth.models import UserRole
+from src.petRecord.schemas import PetRecordCreate, PetRecordUpdate, PetRecordSchema, PetRecordRevisionSchema, PetRecordDueItemSchema
 from src.petRecord.services import (
     create_pet_record,
     update_pet_record,
     get_pet_record_by_id,
     get_pet_records_for_user,
-    get_pet_records_for_veterinarian
+    get_pet_records_for_veterinarian,
+    iter_pet_records_for_export,
+    export_pet_records_ndjson,
+    export_pet_records_csv,
+    get_pet_record_history,
+    get_pet_record_version,
+    get_due_items,
+    get_pet_records_version
 )
+from src.caching import make_etag, etag_matches, not_modified
+from src.fieldsets import FIELDS_QUERY, parse_fields, partial_response
 
 router = APIRouter(prefix="/pet-records", tags=["pet-records"])
 
+def can_view_pet_record(pet_record, principal: Principal) -> bool:
+    return pet_record.user_id == principal.id or (principal.veterinarian_id is not None and pet_record.veterinarian_id == principal.veterinarian_id)
+
 @router.post("/", response_model=PetRecordSchema, status_code=status.HTTP_201_CREATED)
 async def create_pet_record_route(
     pet_record_data: PetRecordCreate,
     appointment_id: int,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    principal: Principal = Depends(get_current_principal)
 ):
-    if current_user.role != 'veterinarian':
+    if principal.role != UserRole.veterinarian or not principal.veterinarian_id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only veterinarians can create pet records")
     
-    return create_pet_record(db, current_user.id, appointment_id, pet_record_data)
+    return create_pet_record(db, principal.veterinarian_id, appointment_id, pet_record_data)
 
 @router.put("/{pet_record_id}", response_model=PetRecordSchema)
 async def update_pet_record_route(
     pet_record_id: int,
     pet_record_data: PetRecordUpdate,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    principal: Principal = Depends(get_current_principal)
 ):
-    if current_user.role != 'veterinarian':
+    if principal.role != UserRole.veterinarian or not principal.veterinarian_id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only veterinarians can update pet records")
     
-    return update_pet_record(db, pet_record_id, pet_record_data, current_user.id)
+    return update_pet_record(db, pet_record_id, pet_record_data, principal.veterinarian_id)
+
+# Stream the caller's full record history as NDJSON or CSV (declared before /{pet_record_id})
+@router.get("/export")
+async def export_pet_records_route(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    since: Optional[datetime] = None,
+    principal: Principal = Depends(get_current_principal)
+):
+    if principal.role == UserRole.veterinarian:
+        if not principal.veterinarian_id:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Veterinarian profile not found")
+        filters = {"veterinarian_id": principal.veterinarian_id}
+    else:
+        filters = {"user_id": principal.id}
+
+    serializer = export_pet_records_csv if format == "csv" else export_pet_records_ndjson
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+
+    # The request-scoped session is closed before the body streams, so the export owns its own
+    def stream():
+        db = SessionLocal()
+        try:
+            yield from serializer(iter_pet_records_for_export(db, since=since, **filters))
+        finally:
+            db.close()
+
+    return StreamingResponse(
+        stream(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="pet_records.{format}"'},
+    )
+
+# Follow-ups and vaccinations due in the next `days` days, paged
+@router.get("/due", response_model=List[PetRecordDueItemSchema])
+async def list_due_items_route(
+    days: int = Query(7, ge=0, le=365),
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+    principal: Principal = Depends(get_current_principal)
+):
+    if principal.role == UserRole.veterinarian:
+        if not principal.veterinarian_id:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Veterinarian profile not found")
+        return get_due_items(db, veterinarian_id=principal.veterinarian_id, days=days, limit=limit, offset=offset)
+    return get_due_items(db, user_id=principal.id, days=days, limit=limit, offset=offset)
 
 @router.get("/{pet_record_id}", response_model=PetRecordSchema)
 async def get_pet_record_route(
     pet_record_id: int,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    principal: Principal = Depends(get_current_principal)
 ):
     pet_record = get_pet_record_by_id(db, pet_record_id)
-    if pet_record.appointment.user_id != current_user.id and pet_record.veterinarian_id != current_user.id:
+    if not can_view_pet_record(pet_record, principal):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to view this pet record")
     return pet_record
 
+# fields= (e.g. id,pet_name,follow_up_date) skips the long clinical text columns entirely
 @router.get("/", response_model=List[PetRecordSchema])
 async def list_user_pet_records(
+    request: Request,
+    response: Response,
+    fields: Optional[str] = FIELDS_QUERY,
+    db: Session = Depends(get_db),
+    principal: Principal = Depends(get_current_principal)
+):
+    selected = parse_fields(fields, PetRecordSchema)
+    is_veterinarian = principal.role == UserRole.veterinarian and principal.veterinarian_id
+    filters = {"veterinarian_id": principal.veterinarian_id} if is_veterinarian else {"user_id": principal.id}
+    etag = make_etag("pet-records", principal.id, get_pet_records_version(db, **filters), selected)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+
+    if is_veterinarian:
+        pet_records = get_pet_records_for_veterinarian(db, principal.veterinarian_id, selected)
+    else:
+        pet_records = get_pet_records_for_user(db, principal.id, selected)
+    if selected:
+        return partial_response(PetRecordSchema, selected, pet_records, headers={"ETag": etag})
+    return pet_records
+
+@router.get("/{pet_record_id}/history", response_model=List[PetRecordRevisionSchema])
+async def get_pet_record_history_route(
+    pet_record_id: int,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    principal: Principal = Depends(get_current_principal)
 ):
-    if current_user.role == 'veterinarian':
-        return get_pet_records_for_veterinarian(db, current_user.id)
-    return get_pet_records_for_user(db, current_user.id)
+    pet_record = get_pet_record_by_id(db, pet_record_id)
+    if not can_view_pet_record(pet_record, principal):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to view this pet record")
+    return [{
+        "revision": revision.revision,
+        "veterinarian_id": revision.veterinarian_id,
+        "changed_fields": revision.changed_fields.split(","),
+        "created_at": revision.created_at,
+    } for revision in get_pet_record_history(db, pet_record_id)]
+
+@router.get("/{pet_record_id}/versions/{revision}", response_model=PetRecordSchema)
+async def get_pet_record_version_route(
+    pet_record_id: int,
+    revision: int,
+    db: Session = Depends(get_db),
+    principal: Principal = Depends(get_current_principal)
+):
+    pet_record = get_pet_record_by_id(db, pet_record_id)
+    if not can_view_pet_record(pet_record, principal):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to view this pet record")
+    return get_pet_record_version(db, pet_record, revision)
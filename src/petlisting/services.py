@@ -1,17 +1,71 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
 from src.petlisting.models import PetListing, PetImage
-from src.petlisting.schemas import PetListingCreate, PetListingUpdate, PetImageCreate
+from src.petlisting.schemas import PetListingCreate, PetListingUpdate, PetImageCreate, PetListingSchema
+from src.caching import ResponseCache, make_etag
+from src.fieldsets import Fields, column_options, partial_model
 from fastapi import HTTPException, status, UploadFile, File
-from typing import List
+from typing import List, Tuple
+import orjson
+from pydantic import TypeAdapter
 import firebase_admin
 from firebase_admin import storage
 from uuid import uuid4
 
+# Serialized public listing reads ("listing:<id>", "search:<term>"), invalidated by listing writes
+listing_cache = ResponseCache()
+
+def invalidate_listing(listing_id: int) -> None:
+    listing_cache.invalidate(f"listing:{listing_id}")
+    listing_cache.invalidate_prefix("search:")
+
+def pet_listing_payload(pet_listing: PetListing, fields: Fields = None):
+    if fields is None:
+        data = {column.name: getattr(pet_listing, column.name) for column in PetListing.__table__.columns}
+        data["images"] = [image.image_url for image in pet_listing.images]
+        return PetListingSchema.model_validate(data)
+    data = {name: getattr(pet_listing, name) for name in fields if name != "images"}
+    if "images" in fields:
+        data["images"] = [image.image_url for image in pet_listing.images]
+    return partial_model(PetListingSchema, fields).model_validate(data)
+
+def pet_listing_etag(pet_listing: PetListing, with_images: bool = True) -> str:
+    return make_etag(pet_listing.id, pet_listing.updated_at, [image.id for image in pet_listing.images] if with_images else None)
+
+listing_list_adapter = TypeAdapter(List[PetListingSchema])
+
+# Cached JSON body and ETag for a single listing
+def get_pet_listing_response(db: Session, listing_id: int) -> Tuple[str, bytes]:
+    key = f"listing:{listing_id}"
+    cached = listing_cache.get(key)
+    if cached is None:
+        pet_listing = get_pet_listing_by_id(db, listing_id)
+        cached = (pet_listing_etag(pet_listing), pet_listing_payload(pet_listing).model_dump_json().encode())
+        listing_cache.set(key, *cached)
+    return cached
+
+# Cached JSON body and ETag for a search, one entry per field selection
+def search_pet_listings_response(db: Session, search_term: str, fields: Fields = None) -> Tuple[str, bytes]:
+    key = f"search:{search_term.lower()}" + (f":{','.join(fields)}" if fields else "")
+    cached = listing_cache.get(key)
+    if cached is None:
+        listings = search_pet_listings(db, search_term, fields)
+        if fields is None:
+            etag = make_etag(key, [pet_listing_etag(pet_listing) for pet_listing in listings])
+            body = listing_list_adapter.dump_json([pet_listing_payload(pet_listing) for pet_listing in listings])
+        else:
+            with_images = "images" in fields
+            etag = make_etag(key, [pet_listing_etag(pet_listing, with_images) for pet_listing in listings])
+            body = orjson.dumps([pet_listing_payload(pet_listing, fields).model_dump() for pet_listing in listings])
+        cached = (etag, body)
+        listing_cache.set(key, *cached)
+    return cached
+
 def create_pet_listing(db: Session, pet_listing_data: PetListingCreate, user_id: int) -> PetListing:
     pet_listing = PetListing(**pet_listing_data.dict(), user_id=user_id)
     db.add(pet_listing)
     db.commit()
     db.refresh(pet_listing)
+    listing_cache.invalidate_prefix("search:")
     return pet_listing
 
 def update_pet_listing(db: Session, listing_id: int, pet_listing_data: PetListingUpdate, user_id: int) -> PetListing:
@@ -24,16 +78,21 @@ def update_pet_listing(db: Session, listing_id: int, pet_listing_data: PetListin
     
     db.commit()
     db.refresh(pet_listing)
+    invalidate_listing(listing_id)
     return pet_listing
 
 def get_pet_listing_by_id(db: Session, listing_id: int) -> PetListing:
-    pet_listing = db.query(PetListing).filter(PetListing.id == listing_id).first()
+    pet_listing = db.query(PetListing).options(selectinload(PetListing.images)).filter(PetListing.id == listing_id).first()
     if not pet_listing:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Pet listing not found")
     return pet_listing
 
-def search_pet_listings(db: Session, search_term: str) -> List[PetListing]:
-    return db.query(PetListing).filter(
+def search_pet_listings(db: Session, search_term: str, fields: Fields = None) -> List[PetListing]:
+    # The ETag needs updated_at; images are only loaded when they are returned
+    options = column_options(PetListing, fields, extra=("updated_at",))
+    if fields is None or "images" in fields:
+        options.append(selectinload(PetListing.images))
+    return db.query(PetListing).options(*options).filter(
         PetListing.title.ilike(f"%{search_term}%") | 
         PetListing.description.ilike(f"%{search_term}%") | 
         PetListing.breed.ilike(f"%{search_term}%")
@@ -70,4 +129,5 @@ def add_pet_images(db: Session, pet_listing_id: int, images: List[UploadFile]) -
         db.refresh(pet_image)
         pet_images.append(pet_image)
 
+    invalidate_listing(pet_listing_id)
     return pet_images
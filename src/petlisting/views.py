@@ -1,16 +1,19 @@
-from fastapi import APIRouter, Depends, UploadFile, File, status
+from fastapi import APIRouter, Depends, UploadFile, File, Request, status
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from src.database import get_db
 from src.auth.services import get_current_user
 from src.petlisting.schemas import PetListingCreate, PetListingUpdate, PetListingSchema, PetImageSchema
 from src.petlisting.services import (
     create_pet_listing,
     update_pet_listing,
-    get_pet_listing_by_id,
-    search_pet_listings,
-    add_pet_images
+    add_pet_images,
+    pet_listing_payload,
+    get_pet_listing_response,
+    search_pet_listings_response
 )
+from src.caching import cached_response
+from src.fieldsets import FIELDS_QUERY, parse_fields
 from src.auth.models import User
 
 router = APIRouter(prefix="/listings", tags=["listings"])
@@ -21,7 +24,7 @@ async def create_pet_listing_route(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    return create_pet_listing(db, pet_listing_data, current_user.id)
+    return pet_listing_payload(create_pet_listing(db, pet_listing_data, current_user.id))
 
 @router.put("/{listing_id}", response_model=PetListingSchema)
 async def update_pet_listing_route(
@@ -30,21 +33,28 @@ async def update_pet_listing_route(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    return update_pet_listing(db, listing_id, pet_listing_data, current_user.id)
-
-@router.get("/{listing_id}", response_model=PetListingSchema)
-async def get_pet_listing_route(
-    listing_id: int,
-    db: Session = Depends(get_db)
-):
-    return get_pet_listing_by_id(db, listing_id)
+    return pet_listing_payload(update_pet_listing(db, listing_id, pet_listing_data, current_user.id))
 
+# Public reads are served from the shared listing cache and honour If-None-Match.
+# fields= (e.g. id,title,price,images) returns listing cards without the description.
 @router.get("/search", response_model=List[PetListingSchema])
 async def search_pet_listings_route(
     search_term: str,
+    request: Request,
+    fields: Optional[str] = FIELDS_QUERY,
+    db: Session = Depends(get_db)
+):
+    etag, body = search_pet_listings_response(db, search_term, parse_fields(fields, PetListingSchema))
+    return cached_response(request, etag, body)
+
+@router.get("/{listing_id}", response_model=PetListingSchema)
+async def get_pet_listing_route(
+    listing_id: int,
+    request: Request,
     db: Session = Depends(get_db)
 ):
-    return search_pet_listings(db, search_term)
+    etag, body = get_pet_listing_response(db, listing_id)
+    return cached_response(request, etag, body)
 
 @router.post("/{listing_id}/images/", response_model=List[PetImageSchema])
 async def add_pet_images_route(
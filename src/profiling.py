@@ -0,0 +1,161 @@
+# src/profiling.py
+import cProfile
+import io
+import itertools
+import marshal
+import os
+import pstats
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Deque, Dict, List
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import PlainTextResponse, Response
+from src.auth.models import UserRole
+from src.auth.services import get_current_principal, Principal
+
+# Admins may send "X-Profile: true" to profile that one request
+PROFILE_HEADER_ENABLED = os.getenv("PROFILE_HEADER_ENABLED", "false").lower() in ("1", "true", "yes")
+# Fraction of all requests profiled at random, e.g. 0.001
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+# Only installed when one of the above is on, so a disabled profiler costs nothing per request
+PROFILING_ENABLED = PROFILE_HEADER_ENABLED or PROFILE_SAMPLE_RATE > 0
+# Most recent profiles kept per worker
+PROFILE_BUFFER_SIZE = int(os.getenv("PROFILE_BUFFER_SIZE", "20"))
+# Functions listed in a profile's text summary
+PROFILE_SUMMARY_LINES = 40
+
+
+class RequestProfile:
+    def __init__(self, profile_id: int, method: str, path: str, route: str, reason: str, status_code: int, duration: float, profiler: cProfile.Profile):
+        self.id = profile_id
+        self.method = method
+        self.path = path
+        self.route = route
+        self.reason = reason  # "header" or "sampled"
+        self.status_code = status_code
+        self.duration = duration
+        self.created_at = datetime.utcnow()
+        stream = io.StringIO()
+        stats = pstats.Stats(profiler, stream=stream)
+        stats.sort_stats("cumulative").print_stats(PROFILE_SUMMARY_LINES)
+        self.summary = stream.getvalue()
+        # Same format as pstats.dump_stats, so the download opens in snakeviz, flameprof or pstats
+        self.raw = marshal.dumps(stats.stats)
+
+    def as_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "reason": self.reason,
+            "status_code": self.status_code,
+            "duration_ms": round(self.duration * 1000, 1),
+            "created_at": self.created_at.isoformat(),
+        }
+
+
+_profiles: Deque[RequestProfile] = deque(maxlen=PROFILE_BUFFER_SIZE)
+_profile_ids = itertools.count(1)
+# cProfile hooks the whole thread, so only one request is profiled at a time
+_active = threading.Lock()
+
+
+async def _is_admin(scope) -> bool:
+    for name, value in scope.get("headers", ()):
+        if name == b"authorization" and value[:7].lower() == b"bearer ":
+            try:
+                principal = await get_current_principal(value[7:].decode("latin-1"))
+            except HTTPException:
+                return False
+            return principal.role == UserRole.admin
+    return False
+
+
+class ProfilingMiddleware:
+    """Runs cProfile around requests chosen by the admin header or the sampling rate.
+
+    The profiler sees everything the event loop thread does while it is on, including other requests
+    interleaved at await points; work handed to the threadpool is not included.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        reason = None
+        if PROFILE_HEADER_ENABLED and any(name == b"x-profile" and value.lower() in (b"1", b"true") for name, value in scope["headers"]):
+            if await _is_admin(scope):
+                reason = "header"
+        elif PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+            reason = "sampled"
+        if reason is None or not _active.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", str(profile_id).encode())]
+            await send(message)
+
+        profile_id = next(_profile_ids)
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            profiler.enable()
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                profiler.disable()
+        finally:
+            _active.release()
+        route = getattr(scope.get("route"), "path", scope["path"])
+        _profiles.append(RequestProfile(profile_id, scope["method"], scope["path"], route, reason, status_code, time.perf_counter() - started, profiler))
+
+
+def _get_profile(profile_id: int) -> RequestProfile:
+    profile = next((profile for profile in _profiles if profile.id == profile_id), None)
+    if profile is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found or already evicted")
+    return profile
+
+
+def require_admin(principal: Principal = Depends(get_current_principal)) -> Principal:
+    if principal.role != UserRole.admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only admins can view diagnostics")
+    return principal
+
+
+router = APIRouter(prefix="/admin/profiles", tags=["admin"], dependencies=[Depends(require_admin)])
+
+# Profiles held by the worker that serves this request, newest first
+@router.get("")
+async def list_profiles_route() -> List[Dict]:
+    return [profile.as_dict() for profile in reversed(_profiles)]
+
+# Top functions by cumulative time
+@router.get("/{profile_id}", response_class=PlainTextResponse)
+async def get_profile_summary_route(profile_id: int) -> str:
+    profile = _get_profile(profile_id)
+    return f"{profile.method} {profile.path} ({profile.route}) -> {profile.status_code} in {profile.duration * 1000:.1f} ms\n\n{profile.summary}"
+
+# Raw pstats data, e.g. for `snakeviz profile.prof` or `flameprof profile.prof > flame.svg`
+@router.get("/{profile_id}/pstats")
+async def download_profile_route(profile_id: int) -> Response:
+    profile = _get_profile(profile_id)
+    return Response(
+        profile.raw,
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="profile-{profile.id}.prof"'}
+    )
@@ -0,0 +1,113 @@
+# src/query_stats.py
+import logging
+import os
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Adds X-DB-Queries / X-DB-Time to every response; meant for development and staging
+DEBUG = os.getenv("DEBUG", "false").lower() in ("1", "true", "yes")
+# Statements slower than this are logged with their route
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+# The same SQL run this many times in one request is logged as a likely N+1
+REPEATED_QUERY_THRESHOLD = int(os.getenv("REPEATED_QUERY_THRESHOLD", "10"))
+
+
+_current: ContextVar[Optional["QueryStats"]] = ContextVar("query_stats", default=None)
+
+
+class QueryStats:
+    """Statements and DB time for one request (or one count_queries() block).
+
+    Statements are also counted on every enclosing QueryStats, so a count_queries() block around a test
+    request, or a batch around its sub-requests, sees the totals of the requests it contains.
+    """
+
+    def __init__(self, scope: Optional[dict] = None):
+        self.scope = scope
+        self.parent = _current.get()
+        self.count = 0
+        self.seconds = 0.0
+        self.statements: Counter = Counter()
+
+    @property
+    def route(self) -> str:
+        if self.scope is None:
+            return "-"
+        # The router stores the matched route in the scope, so templates like /pet-records/{pet_record_id} group together
+        route = self.scope.get("route")
+        return f"{self.scope.get('method', 'WS')} {getattr(route, 'path', self.scope.get('path'))}"
+
+    def repeated(self, threshold: int = REPEATED_QUERY_THRESHOLD):
+        return [(statement, count) for statement, count in self.statements.items() if count >= threshold]
+
+
+# Registered on the Engine class, so the primary, the replica and any test engine are all covered
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    stats = _current.get()
+    enclosing = stats
+    while enclosing is not None:
+        enclosing.count += 1
+        enclosing.seconds += elapsed
+        enclosing.statements[statement] += 1
+        enclosing = enclosing.parent
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        logger.warning("Slow query (%.1f ms) in %s: %s", elapsed * 1000, stats.route if stats else "-", " ".join(statement.split())[:500])
+
+
+@contextmanager
+def count_queries() -> Iterator[QueryStats]:
+    """Counts the statements run inside the block, e.g. to hold a code path to a query budget:
+
+        with count_queries() as stats:
+            get_pet_records_for_user(db, user_id)
+        assert stats.count <= 1
+    """
+    stats = QueryStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+class QueryStatsMiddleware:
+    """Counts statements and DB time per request; warns about slow and repeated statements."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats(scope)
+        token = _current.set(stats)
+
+        async def send_with_headers(message):
+            if DEBUG and message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-db-queries", str(stats.count).encode()),
+                    (b"x-db-time", f"{stats.seconds * 1000:.1f}ms".encode()),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            _current.reset(token)
+            for statement, count in stats.repeated():
+                logger.warning("Statement ran %d times in %s (likely N+1): %s", count, stats.route, " ".join(statement.split())[:500])
@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Integer, String, DateTime, Index
+from datetime import datetime
+from src.database import Base
+
+class ChangeLog(Base):
+    __tablename__ = "change_log"
+    __table_args__ = (
+        Index("ix_change_log_user_id_id", "user_id", "id"),
+        Index("ix_change_log_veterinarian_id_id", "veterinarian_id", "id"),
+        # Ids are sync positions and must never be reused, even after pruning empties the table
+        {"sqlite_autoincrement": True},
+    )
+
+    id = Column(Integer, primary_key=True, index=True)  # Doubles as the sync position
+    entity = Column(String, nullable=False)  # "appointment", "pet_record", "listing" or "chat_room"
+    entity_id = Column(Integer, nullable=False)
+    action = Column(String, nullable=False)  # "upsert" or "delete" (a tombstone)
+    user_id = Column(Integer, nullable=True)  # Owner who should receive the change
+    veterinarian_id = Column(Integer, nullable=True)  # Veterinarian who should receive the change
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
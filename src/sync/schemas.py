@@ -0,0 +1,31 @@
+from pydantic import BaseModel
+from typing import List
+from src.appointments.schemas import AppointmentSchema
+from src.petRecord.schemas import PetRecordSchema
+from src.petlisting.schemas import PetListingSchema
+from src.chat.schemas import ChatRoomSchema
+
+class AppointmentChanges(BaseModel):
+    upserted: List[AppointmentSchema] = []
+    deleted: List[int] = []
+
+class PetRecordChanges(BaseModel):
+    upserted: List[PetRecordSchema] = []
+    deleted: List[int] = []
+
+class PetListingChanges(BaseModel):
+    upserted: List[PetListingSchema] = []
+    deleted: List[int] = []
+
+class ChatRoomChanges(BaseModel):
+    upserted: List[ChatRoomSchema] = []
+    deleted: List[int] = []
+
+class SyncResponse(BaseModel):
+    next_token: str  # Pass back as ?since= on the next sync
+    full: bool  # True when this is a full snapshot and the client should replace its local copy
+    has_more: bool  # True when more changes are waiting; sync again with next_token
+    appointments: AppointmentChanges
+    pet_records: PetRecordChanges
+    listings: PetListingChanges
+    chat_rooms: ChatRoomChanges
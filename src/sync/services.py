@@ -0,0 +1,156 @@
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import event, func, or_, select
+from sqlalchemy.orm import Session, selectinload
+from src.database import SessionLocal
+from src.sync.models import ChangeLog
+from src.appointments.models import Appointment
+from src.appointments.schemas import AppointmentSchema
+from src.petRecord.models import PetRecord
+from src.petRecord.schemas import PetRecordSchema
+from src.petlisting.models import PetListing, PetImage
+from src.petlisting.services import pet_listing_payload
+from src.chat.models import ChatRoom, ChatMessage
+from src.chat.schemas import ChatRoomSchema
+
+# Changes returned per sync call; clients keep syncing while has_more is set
+SYNC_PAGE_SIZE = 500
+# Change log rows older than this are pruned; clients further behind get a full snapshot
+CHANGE_LOG_RETENTION_DAYS = 30
+# How often each worker prunes the change log; 0 turns it off
+CHANGE_LOG_PRUNE_INTERVAL_SECONDS = int(os.getenv("CHANGE_LOG_PRUNE_INTERVAL_SECONDS", "3600"))
+# Change log ids are assigned at insert but become visible at commit, so a lower id can appear after a
+# higher one. Sync tokens never move past rows younger than this (longer than any write transaction);
+# changes inside the window are still returned, and returned again on the next sync.
+SYNC_SAFETY_WINDOW_SECONDS = 30
+
+# Change capture: every ORM write to a synced model appends to change_log in the same transaction,
+# which also covers deletes such as cancel_appointment and admin deletion.
+
+def _record_change(connection, entity: str, entity_id: int, action: str, user_id: Optional[int], veterinarian_id: Optional[int]) -> None:
+    connection.execute(ChangeLog.__table__.insert().values(
+        entity=entity,
+        entity_id=entity_id,
+        action=action,
+        user_id=user_id,
+        veterinarian_id=veterinarian_id,
+        created_at=datetime.utcnow()
+    ))
+
+def _track(model, entity: str, with_veterinarian: bool = True) -> None:
+    def audience(target):
+        return target.user_id, (target.veterinarian_id if with_veterinarian else None)
+
+    def upserted(mapper, connection, target):
+        _record_change(connection, entity, target.id, "upsert", *audience(target))
+
+    def deleted(mapper, connection, target):
+        _record_change(connection, entity, target.id, "delete", *audience(target))
+
+    event.listen(model, "after_insert", upserted)
+    event.listen(model, "after_update", upserted)
+    event.listen(model, "after_delete", deleted)
+
+_track(Appointment, "appointment")
+_track(PetRecord, "pet_record")
+_track(PetListing, "listing", with_veterinarian=False)
+_track(ChatRoom, "chat_room")
+
+# Rooms are synced with their messages, so a new message is a change to its room
+@event.listens_for(ChatMessage, "after_insert")
+def _chat_message_inserted(mapper, connection, target):
+    room = connection.execute(select(ChatRoom.user_id, ChatRoom.veterinarian_id).where(ChatRoom.id == target.chat_room_id)).first()
+    if room:
+        _record_change(connection, "chat_room", target.chat_room_id, "upsert", room.user_id, room.veterinarian_id)
+
+# Listings are synced with their image URLs
+@event.listens_for(PetImage, "after_insert")
+def _pet_image_inserted(mapper, connection, target):
+    listing = connection.execute(select(PetListing.user_id).where(PetListing.id == target.pet_listing_id)).first()
+    if listing:
+        _record_change(connection, "listing", target.pet_listing_id, "upsert", listing.user_id, None)
+
+
+def _owned_by(model, user_id: int, veterinarian_id: Optional[int]):
+    if veterinarian_id is not None and hasattr(model, "veterinarian_id"):
+        return or_(model.user_id == user_id, model.veterinarian_id == veterinarian_id)
+    return model.user_id == user_id
+
+def _load_rows(db: Session, entity: str, ids: List[int]) -> list:
+    if entity == "appointment":
+        return [AppointmentSchema.model_validate(row) for row in db.query(Appointment).filter(Appointment.id.in_(ids)).all()]
+    if entity == "pet_record":
+        return [PetRecordSchema.model_validate(row) for row in db.query(PetRecord).filter(PetRecord.id.in_(ids)).all()]
+    if entity == "listing":
+        rows = db.query(PetListing).options(selectinload(PetListing.images)).filter(PetListing.id.in_(ids)).all()
+        return [pet_listing_payload(row) for row in rows]
+    rows = db.query(ChatRoom).options(selectinload(ChatRoom.messages)).filter(ChatRoom.id.in_(ids)).all()
+    return [ChatRoomSchema.model_validate(row) for row in rows]
+
+SECTIONS = {"appointment": "appointments", "pet_record": "pet_records", "listing": "listings", "chat_room": "chat_rooms"}
+
+def _empty_sections() -> Dict[str, Dict[str, list]]:
+    return {section: {"upserted": [], "deleted": []} for section in SECTIONS.values()}
+
+def get_sync_position(db: Session) -> int:
+    """The highest change log id at or below which no row can still be waiting to commit."""
+    cutoff = datetime.utcnow() - timedelta(seconds=SYNC_SAFETY_WINDOW_SECONDS)
+    return db.query(ChangeLog.id).filter(ChangeLog.created_at <= cutoff).order_by(ChangeLog.id.desc()).limit(1).scalar() or 0
+
+def full_snapshot(db: Session, user_id: int, veterinarian_id: Optional[int]) -> Dict:
+    # Read the position first: anything after it, including writes made while the snapshot loads, is delivered again on the next sync
+    position = get_sync_position(db)
+    sections = _empty_sections()
+    for entity, model in (("appointment", Appointment), ("pet_record", PetRecord), ("listing", PetListing), ("chat_room", ChatRoom)):
+        ids = [row.id for row in db.query(model.id).filter(_owned_by(model, user_id, veterinarian_id)).all()]
+        sections[SECTIONS[entity]]["upserted"] = _load_rows(db, entity, ids) if ids else []
+    return {"next_token": str(position), "full": True, "has_more": False, **sections}
+
+def delta_sync(db: Session, user_id: int, veterinarian_id: Optional[int], since: int) -> Dict:
+    # A client behind the pruned horizon may have missed tombstones, so it starts over
+    floor = db.query(func.min(ChangeLog.id)).scalar()
+    if since <= 0 or (floor is not None and since < floor - 1):
+        return full_snapshot(db, user_id, veterinarian_id)
+
+    audience = [ChangeLog.user_id == user_id]
+    if veterinarian_id is not None:
+        audience.append(ChangeLog.veterinarian_id == veterinarian_id)
+    changes = db.query(ChangeLog).filter(ChangeLog.id > since, or_(*audience)).order_by(ChangeLog.id).limit(SYNC_PAGE_SIZE + 1).all()
+    has_more = len(changes) > SYNC_PAGE_SIZE
+    changes = changes[:SYNC_PAGE_SIZE]
+
+    # Only the last action per row matters
+    latest: Dict[Tuple[str, int], str] = {}
+    for change in changes:
+        latest[(change.entity, change.entity_id)] = change.action
+
+    sections = _empty_sections()
+    for entity, section in SECTIONS.items():
+        upserted_ids = [entity_id for (kind, entity_id), action in latest.items() if kind == entity and action == "upsert"]
+        deleted_ids = [entity_id for (kind, entity_id), action in latest.items() if kind == entity and action == "delete"]
+        rows = _load_rows(db, entity, upserted_ids) if upserted_ids else []
+        found = {row.id for row in rows}
+        sections[section]["upserted"] = rows
+        sections[section]["deleted"] = deleted_ids + [entity_id for entity_id in upserted_ids if entity_id not in found]
+
+    settled = get_sync_position(db)
+    if has_more and changes[-1].id <= settled:
+        next_token = changes[-1].id
+    else:
+        # Every settled change for this client is in this response; the rest arrive again next time
+        next_token = max(since, settled)
+        has_more = False
+    return {"next_token": str(next_token), "full": False, "has_more": has_more, **sections}
+
+def prune_change_log(db: Session, retention_days: int = CHANGE_LOG_RETENTION_DAYS) -> int:
+    deleted = db.query(ChangeLog).filter(ChangeLog.created_at < datetime.utcnow() - timedelta(days=retention_days)).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+def run_change_log_pruning() -> None:
+    db = SessionLocal()
+    try:
+        prune_change_log(db)
+    finally:
+        db.close()
@@ -0,0 +1,23 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from typing import Optional
+from src.database import get_db
+from src.auth.services import get_current_principal, Principal
+from src.sync.schemas import SyncResponse
+from src.sync.services import delta_sync
+
+router = APIRouter(prefix="/sync", tags=["sync"])
+
+# Changes to the caller's appointments, pet records, listings and chat rooms since the last sync.
+# Without a token (or with one older than the retained change log) a full snapshot is returned.
+@router.get("", response_model=SyncResponse)
+async def sync_route(
+    since: Optional[str] = None,
+    db: Session = Depends(get_db),
+    principal: Principal = Depends(get_current_principal)
+):
+    try:
+        position = int(since) if since else 0
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid sync token")
+    return delta_sync(db, principal.id, principal.veterinarian_id, position)
@@ -33,6 +33,13 @@ class VeterinarianSchema(BaseModel):
         from_attributes = True
 
 
+# Registration changes the caller's role claims, so it returns the new profile with a fresh token pair
+class VeterinarianRegistrationSchema(VeterinarianSchema):
+    access_token: str
+    refresh_token: str
+    token_type: str = "bearer"
+
+
 class UserVeterinarianCreate(BaseModel):
     veterinarian_id: int
     notes: Optional[str] = None
@@ -6,6 +6,7 @@ from firebase_admin import storage
 from typing import List
 from src.veterinarians.models import Veterinarian, UserVeterinarian
 from src.veterinarians.schemas import VeterinarianCreate, VeterinarianUpdate, UserVeterinarianCreate
+from src.fieldsets import Fields, column_options
 import logging
 
 ALLOWED_DOC_TYPES = {"application/pdf", "image/jpeg", "image/png"}
@@ -59,9 +60,11 @@ def create_user_veterinarian_interaction(db: Session, user_id: int, interaction_
     db.refresh(user_vet_interaction)
     return user_vet_interaction
 
-def get_nearby_veterinarians(db: Session, latitude: float, longitude: float, radius: float = 10.0) -> List[Veterinarian]:
+def get_nearby_veterinarians(db: Session, latitude: float, longitude: float, radius: float = 10.0, fields: Fields = None) -> List[Veterinarian]:
     user_location = (latitude, longitude)
-    all_vets = db.query(Veterinarian).filter(Veterinarian.approved == True).all()
+    # Coordinates are always loaded for the distance check, whatever the caller asked for
+    options = column_options(Veterinarian, fields, extra=("latitude", "longitude"))
+    all_vets = db.query(Veterinarian).options(*options).filter(Veterinarian.approved == True).all()
 
     nearby_vets = []
     for vet in all_vets:
@@ -1,10 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, Response, status, UploadFile, File
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from src.veterinarians.schemas import (
     VeterinarianCreate,
     VeterinarianUpdate,
     VeterinarianSchema,
+    VeterinarianRegistrationSchema,
     UserVeterinarianCreate,
     UserVeterinarianSchema
 )
@@ -17,15 +18,19 @@ from src.veterinarians.services import (
     upload_vet_document
 )
 from src.auth.models import User, UserRole
+from src.auth.location import location_buffer
 from src.database import get_db
-from src.auth.services import get_current_user
+from src.auth.services import get_current_user, get_current_principal, bump_token_version, create_access_token, create_refresh_token, user_token_claims, Principal
+from src.caching import NO_STORE_HEADERS
 from src.veterinarians.models import Veterinarian
+from src.fieldsets import FIELDS_QUERY, parse_fields, partial_response
 
 router = APIRouter(prefix="/vet", tags=["vet"])
 
-@router.post("/register", response_model=VeterinarianSchema, status_code=status.HTTP_201_CREATED)
+@router.post("/register", response_model=VeterinarianRegistrationSchema, status_code=status.HTTP_201_CREATED)
 async def register_veterinarian(
     veterinarian_data: VeterinarianCreate,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -34,11 +39,13 @@ async def register_veterinarian(
 
     Parameters:
     - veterinarian_data (VeterinarianCreate): The data for creating a new veterinarian.
+    - response (Response): The outgoing response, marked no-store because it carries tokens.
     - db (Session): The database session.
     - current_user (User): The currently authenticated user.
 
     Returns:
-    - VeterinarianSchema: The newly created veterinarian record.
+    - VeterinarianRegistrationSchema: The newly created veterinarian record, with a new access and refresh
+      token. Registration revokes the caller's earlier access tokens, which lack the veterinarian claims.
 
     Raises:
     - HTTPException: If the user is already registered as a veterinarian.
@@ -50,15 +57,24 @@ async def register_veterinarian(
     veterinarian = create_veterinarian(db, veterinarian_data, user_id=current_user.id)
 
     current_user.role = UserRole.veterinarian
+    bump_token_version(current_user)  # Tokens issued before registration lack the veterinarian claims
     db.commit()
+    db.refresh(current_user)
 
-    return veterinarian
+    access_token = await create_access_token(current_user.email, current_user.id, **user_token_claims(current_user))
+    refresh_token = await create_refresh_token(current_user.email, current_user.id)
+    response.headers.update(NO_STORE_HEADERS)
+    return VeterinarianRegistrationSchema(
+        **VeterinarianSchema.model_validate(veterinarian).model_dump(),
+        access_token=access_token,
+        refresh_token=refresh_token
+    )
 
 @router.put("/update", response_model=VeterinarianSchema)
 async def update_veterinarian_info(
     update_data: VeterinarianUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    principal: Principal = Depends(get_current_principal)
 ):
     """
     Updates the veterinarian's information.
@@ -66,7 +82,7 @@ async def update_veterinarian_info(
     Parameters:
     - update_data (VeterinarianUpdate): The data for updating the veterinarian's information.
     - db (Session): The database session.
-    - current_user (User): The currently authenticated user.
+    - principal (Principal): The authenticated caller, resolved from the access token's claims.
 
     Returns:
     - VeterinarianSchema: The updated veterinarian record.
@@ -74,7 +90,7 @@ async def update_veterinarian_info(
     Raises:
     - HTTPException: If the veterinarian profile is not found.
     """
-    veterinarian = db.query(Veterinarian).filter(Veterinarian.user_id == current_user.id).first()
+    veterinarian = db.get(Veterinarian, principal.veterinarian_id) if principal.veterinarian_id else None
     if not veterinarian:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Veterinarian profile not found")
     updated_veterinarian = update_veterinarian(db, veterinarian, update_data)
@@ -134,48 +150,59 @@ async def interact_with_veterinarian(
 @router.post("/nearby", response_model=List[VeterinarianSchema])
 async def get_nearby_vets(
     data: dict,
+    fields: Optional[str] = FIELDS_QUERY,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    principal: Principal = Depends(get_current_principal)
 ):
     """
     Retrieves a list of nearby veterinarians based on the provided geographical coordinates.
 
     Parameters:
-    - data (dict): A dictionary containing 'latitude' and 'longitude' keys.
+    - data (dict): A dictionary containing 'latitude' and 'longitude' keys. When omitted, the user's
+      most recent position is used, including one still waiting in the location buffer.
+    - fields (str, optional): Comma separated fields to return (e.g. "id,clinic_name,latitude,longitude");
+      only those columns are loaded.
     - db (Session): The database session.
-    - current_user (User): The currently authenticated user.
+    - principal (Principal): The authenticated caller; the users table is only read when no position is sent or buffered.
 
     Returns:
     - List[VeterinarianSchema]: A list of veterinarian records that are within the specified radius of the user's location.
     """
     latitude = data.get("latitude")
     longitude = data.get("longitude")
+    if latitude is None or longitude is None:
+        latitude, longitude = location_buffer.latest(principal.id) or tuple(
+            db.query(User.latitude, User.longitude).filter(User.id == principal.id).one()
+        )
 
     if latitude is None or longitude is None:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Latitude and Longitude are required.")
 
     radius = 10.0  # Default radius in kilometers
 
-    veterinarians = get_nearby_veterinarians(db, latitude, longitude, radius)
+    selected = parse_fields(fields, VeterinarianSchema)
+    veterinarians = get_nearby_veterinarians(db, latitude, longitude, radius, selected)
+    if selected:
+        return partial_response(VeterinarianSchema, selected, veterinarians)
     return veterinarians
 
 @router.post("/upload-document", status_code=status.HTTP_200_OK)
 async def upload_veterinarian_document(
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    principal: Principal = Depends(get_current_principal)
 ):
     """
     Uploads a qualification document for the veterinarian's profile.
 
     This function handles the upload of a qualification document for a veterinarian's profile.
-    It first checks if the veterinarian profile exists for the current user. If not, it raises a 404 Not Found exception.
+    It first checks that the caller's token carries a veterinarian profile. If not, it raises a 404 Not Found exception.
     Then, it calls the `upload_vet_document` service to upload the document and returns the URL of the uploaded document.
 
     Parameters:
     - file (UploadFile): The file to be uploaded. This parameter is expected to be a file uploaded by the user.
     - db (Session): The database session. This parameter is used to interact with the database.
-    - current_user (User): The currently authenticated user. This parameter is used to identify the veterinarian's profile.
+    - principal (Principal): The authenticated caller. Its veterinarian_id claim identifies the veterinarian's profile.
 
     Returns:
     - dict: A dictionary containing the URL of the uploaded qualification document. The dictionary has the following structure:
@@ -183,9 +210,8 @@ async def upload_veterinarian_document(
         "qualification_document_url": str
       }
     """
-    veterinarian = db.query(Veterinarian).filter(Veterinarian.user_id == current_user.id).first()
-    if not veterinarian:
+    if not principal.veterinarian_id:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Veterinarian profile not found")
 
-    document_url = await upload_vet_document(veterinarian.id, file, db)
+    document_url = await upload_vet_document(principal.veterinarian_id, file, db)
     return {"qualification_document_url": document_url}
@@ -0,0 +1,110 @@
+import asyncio
+import itertools
+import os
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+
+# Settings are read when src is imported, so the environment and the Firebase / Expo fakes come first
+os.environ.setdefault("FAKE_STORAGE_LATENCY_MS", "0")
+os.environ.setdefault("FAKE_PUSH_LATENCY_MS", "0")
+from tests.fakes import configure_environment, install_fakes
+
+configure_environment(f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='vetlink-tests-'), 'test.db')}")
+install_fakes()
+
+from starlette.testclient import TestClient
+from src.main import app
+from src.database import SessionLocal
+from src.query_stats import count_queries
+from src.auth.models import User, UserRole
+from src.auth.services import create_access_token, user_token_claims, _current_token_version
+from src.appointments.models import Appointment
+from src.petRecord.models import PetRecord
+from src.veterinarians.models import Veterinarian
+
+_sequence = itertools.count(1)
+
+
+@pytest.fixture(scope="session")
+def client():
+    return TestClient(app)
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+class Factory:
+    """Creates committed rows with unique names; every test works on its own users."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def _save(self, row):
+        self.db.add(row)
+        self.db.commit()
+        self.db.refresh(row)
+        return row
+
+    def user(self, role: UserRole = UserRole.user, **values) -> User:
+        n = next(_sequence)
+        values = {"username": f"user{n}", "email": f"user{n}@example.com", "latitude": 6.52, "longitude": 3.38, **values}
+        return self._save(User(role=role, **values))
+
+    def veterinarian(self, **values) -> Veterinarian:
+        user = self.user(role=UserRole.veterinarian)
+        values = {"clinic_name": f"Clinic {user.id}", "specialty": ["general"], "services_offered": ["vaccination"], "approved": True, "latitude": 6.52, "longitude": 3.38, **values}
+        return self._save(Veterinarian(user_id=user.id, **values))
+
+    def appointment(self, user: User, veterinarian: Veterinarian, **values) -> Appointment:
+        values = {"appointment_date": datetime.utcnow() + timedelta(days=1), **values}
+        return self._save(Appointment(user_id=user.id, veterinarian_id=veterinarian.id, **values))
+
+    def pet_record(self, appointment: Appointment, **values) -> PetRecord:
+        values = {
+            "pet_name": "Rex", "pet_type": "dog", "breed": "mixed", "age": 3, "weight": 12.5, "sex": "male",
+            "condition": "Healthy", "treatment": "None", **values,
+        }
+        return self._save(PetRecord(
+            appointment_id=appointment.id, user_id=appointment.user_id, veterinarian_id=appointment.veterinarian_id, **values
+        ))
+
+
+@pytest.fixture
+def make(db):
+    return Factory(db)
+
+
+@pytest.fixture
+def auth_headers(db):
+    def headers(user: User) -> dict:
+        db.refresh(user)
+        token = asyncio.run(create_access_token(user.email, user.id, **user_token_claims(user)))
+        # Warm the token version cache so budgets count the route's own statements
+        _current_token_version(user.id)
+        return {"Authorization": f"Bearer {token}"}
+    return headers
+
+
+@pytest.fixture
+def query_budget():
+    """Fails the test when the block runs more SQL statements than the budget:
+
+        with query_budget(2):
+            client.get("/v1/pet-records/", headers=headers)
+    """
+    @contextmanager
+    def budget(limit: int):
+        with count_queries() as stats:
+            yield stats
+        statements = "\n".join(f"{count}x {' '.join(statement.split())[:200]}" for statement, count in stats.statements.items())
+        assert stats.count <= limit, f"{stats.count} statements, budget is {limit}:\n{statements}"
+    return budget
@@ -0,0 +1,72 @@
+"""In-process stand-ins for Firebase Storage and the Expo push service.
+
+Shared by the test suite and the load test (benchmarks/load_test.py), so neither needs credentials
+or leaves the machine. Install them before anything under src is imported.
+"""
+import os
+import time
+from typing import List
+
+# Simulated round trips of the external services
+FAKE_STORAGE_LATENCY = float(os.getenv("FAKE_STORAGE_LATENCY_MS", "50")) / 1000
+FAKE_PUSH_LATENCY = float(os.getenv("FAKE_PUSH_LATENCY_MS", "30")) / 1000
+
+
+class FakeBlob:
+    def __init__(self, name: str):
+        self.name = name
+        self.public_url = f"https://storage.example.invalid/bench/{name}"
+
+    def upload_from_file(self, file, content_type=None):
+        file.read()
+        time.sleep(FAKE_STORAGE_LATENCY)
+
+    def make_public(self):
+        pass
+
+    def exists(self):
+        return False
+
+    def delete(self):
+        pass
+
+
+class FakeBucket:
+    def blob(self, name: str) -> FakeBlob:
+        return FakeBlob(name)
+
+
+class FakePushResponse:
+    def validate_response(self):
+        pass
+
+
+class FakePushClient:
+    # Every message published in this process, oldest first
+    published: List = []
+
+    def publish(self, message):
+        time.sleep(FAKE_PUSH_LATENCY)
+        FakePushClient.published.append(message)
+        return FakePushResponse()
+
+
+def configure_environment(database_url: str) -> None:
+    os.environ["DATABASE_URL"] = database_url
+    os.environ.setdefault("SECRET_KEY", "bench-secret")
+    # Admission control stays on, but per-client rate limits would turn the test into a 429 count
+    for route_class in ("AUTH", "UPLOAD", "GEO", "DEFAULT"):
+        os.environ.setdefault(f"ADMISSION_{route_class}_RATE", "1000000")
+        os.environ.setdefault(f"ADMISSION_{route_class}_BURST", "1000000")
+
+
+def install_fakes() -> None:
+    # Must run before anything under src is imported: firebase_utils initializes the app at import time
+    import exponent_server_sdk
+    import firebase_admin
+    from firebase_admin import credentials, storage
+
+    credentials.Certificate = lambda path: None
+    firebase_admin.initialize_app = lambda *args, **kwargs: None
+    storage.bucket = lambda *args, **kwargs: FakeBucket()
+    exponent_server_sdk.PushClient = FakePushClient
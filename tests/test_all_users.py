@@ -0,0 +1,37 @@
+import json
+from datetime import datetime
+
+from src.auth.models import UserRole
+
+
+def test_pages_follow_the_cursor_header(client, make, auth_headers):
+    headers = auth_headers(make.user(role=UserRole.admin))
+    created_after = datetime.utcnow()
+    users = [make.user() for _ in range(5)]
+    params = {"limit": 2, "role": "user", "created_after": created_after.isoformat()}
+
+    pages, cursor = [], None
+    while True:
+        response = client.get("/v1/auth/all-users", params={**params, **({"after_id": cursor} if cursor else {})}, headers=headers)
+        assert response.status_code == 200
+        pages.append([user["id"] for user in response.json()])
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+        assert int(cursor) == pages[-1][-1]
+
+    assert pages == [[users[0].id, users[1].id], [users[2].id, users[3].id], [users[4].id]]
+
+
+def test_ndjson_streams_every_matching_user(client, make, auth_headers):
+    headers = auth_headers(make.user(role=UserRole.admin))
+    created_after = datetime.utcnow()
+    users = [make.user() for _ in range(3)]
+    params = {"format": "ndjson", "role": "user", "created_after": created_after.isoformat()}
+    response = client.get("/v1/auth/all-users", params=params, headers=headers)
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert [json.loads(line)["id"] for line in response.text.splitlines()] == [user.id for user in users]
+
+
+def test_only_admins_list_users(client, make, auth_headers):
+    assert client.get("/v1/auth/all-users", headers=auth_headers(make.user())).status_code == 403
@@ -0,0 +1,32 @@
+from datetime import datetime
+
+from src.auth.models import UserRole
+
+USER_FIELDS = {"id", "username", "email", "profile_picture_url", "latitude", "longitude", "role", "created_dt", "expo_push_token"}
+
+
+def test_signup_and_login_return_token_payloads(client):
+    signup = client.post("/v1/auth/signup", json={"email": "payload@example.com", "username": "payload", "password": "password1"})
+    assert signup.status_code == 201
+    assert signup.headers["content-type"] == "application/json"
+    body = signup.json()
+    assert set(body) == {"access_token", "refresh_token", "token_type", "user"}
+    assert body["token_type"] == "bearer"
+    assert set(body["user"]) == USER_FIELDS
+    assert (body["user"]["email"], body["user"]["role"]) == ("payload@example.com", "user")
+    datetime.fromisoformat(body["user"]["created_dt"])
+
+    login = client.post("/v1/auth/token", json={"identifier": "payload", "password": "password1"})
+    assert login.status_code == 200
+    assert login.json()["user"] == body["user"]
+
+
+def test_profile_and_admin_listing_payloads(client, make, auth_headers):
+    user = make.user(expo_push_token="ExponentPushToken[abc]")
+    profile = client.get("/v1/auth/profile", headers=auth_headers(user)).json()
+    assert set(profile) == USER_FIELDS
+    assert (profile["id"], profile["expo_push_token"]) == (user.id, "ExponentPushToken[abc]")
+
+    admin_headers = auth_headers(make.user(role=UserRole.admin))
+    listed = client.get("/v1/auth/all-users", params={"after_id": user.id - 1, "limit": 1}, headers=admin_headers).json()
+    assert listed == [{**profile, "is_super_admin": False}]
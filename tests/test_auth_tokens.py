@@ -0,0 +1,54 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+from src.admission import client_key
+from src.auth.models import RevokedRefreshToken
+from src.auth.revocation import RefreshTokenRevocations
+from src.auth.services import create_refresh_token
+
+
+def refresh_token_for(user) -> str:
+    return asyncio.run(create_refresh_token(user.email, user.id))
+
+
+def test_revoked_refresh_token_is_not_a_bearer_token(client, make):
+    user = make.user()
+    refresh_token = refresh_token_for(user)
+    assert client.post("/v1/auth/logout", json={"refresh_token": refresh_token}).status_code == 200
+    assert client.post("/v1/auth/token/refresh", json=refresh_token).status_code == 401
+
+    headers = {"Authorization": f"Bearer {refresh_token}"}
+    assert client.get("/v1/auth/profile", headers=headers).status_code == 401
+    assert client.get("/v1/appointments/", headers=headers).status_code == 401
+
+
+def test_refresh_token_is_rejected_before_revocation(client, make):
+    headers = {"Authorization": f"Bearer {refresh_token_for(make.user())}"}
+    assert client.get("/v1/auth/profile", headers=headers).status_code == 401
+    assert client.get("/v1/appointments/", headers=headers).status_code == 401
+
+
+def test_rate_limit_key_ignores_refresh_tokens(make):
+    scope = {"headers": [(b"authorization", f"Bearer {refresh_token_for(make.user())}".encode())], "client": ("10.0.0.1", 1234)}
+    assert client_key(scope) == "ip:10.0.0.1"
+
+
+def test_revocation_rebuild_leaves_the_callers_session_alone(db, monkeypatch):
+    revocations = RefreshTokenRevocations()
+    revocations.revoke(db, "token:expired", datetime.utcnow() - timedelta(days=1))
+    revocations.revoke(db, "token:live", datetime.utcnow() + timedelta(days=1))
+
+    def commit():
+        raise AssertionError("the rebuild committed the caller's session")
+    monkeypatch.setattr(db, "commit", commit)
+    revocations._rebuilt_at = float("-inf")
+    assert revocations.is_revoked(db, "token:live")
+    # SQLite would hold the rebuild's delete behind this session's read
+    db.rollback()
+    deadline = time.monotonic() + 5
+    while revocations._rebuilding and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert db.query(RevokedRefreshToken).filter(RevokedRefreshToken.token_key == "token:expired").first() is None
+    assert "token:live" in revocations._filter
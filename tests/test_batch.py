@@ -0,0 +1,30 @@
+import asyncio
+
+from src.admission import ROUTE_CLASSES
+
+
+def test_batch_runs_inside_its_own_admission_slot(client, make, auth_headers, monkeypatch):
+    # One slot for the whole default class: the batch takes it, so its sub-requests must not queue for another
+    default = ROUTE_CLASSES["default"]
+    monkeypatch.setattr(default, "semaphore", asyncio.Semaphore(1))
+    monkeypatch.setattr(default, "queue_timeout", 0.2)
+    owner = make.user()
+    batch = {"requests": [{"id": "profile", "path": "/auth/profile"}, {"id": "appointments", "path": "/appointments/"}, {"id": "rooms", "path": "/chat/user-rooms"}]}
+
+    response = client.post("/v1/batch", json=batch, headers=auth_headers(owner))
+
+    assert response.status_code == 200
+    assert [(result["id"], result["status"]) for result in response.json()["responses"]] == [("profile", 200), ("appointments", 200), ("rooms", 200)]
+    assert not default.semaphore.locked()
+
+
+def test_batch_sub_requests_spend_rate_tokens(client, make, auth_headers, monkeypatch):
+    default = ROUTE_CLASSES["default"]
+    monkeypatch.setattr(default, "burst", 3)
+    monkeypatch.setattr(default, "rate", 0.001)
+    batch = {"requests": [{"path": "/auth/profile"}] * 3}
+
+    response = client.post("/v1/batch", json=batch, headers=auth_headers(make.user()))
+
+    # The batch itself spends one token, leaving two for three sub-requests
+    assert [result["status"] for result in response.json()["responses"]] == [200, 200, 429]
@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from src.auth.models import User
+from src.auth.services import create_access_token, user_token_claims
+from src.chat.models import ChatRoom
+from src.chat.views import manager
+
+
+@pytest.fixture
+def ws_url(db):
+    def url(room: ChatRoom, user: User) -> str:
+        db.refresh(user)
+        token = asyncio.run(create_access_token(user.email, user.id, **user_token_claims(user)))
+        return f"/v1/chat/ws/{room.id}?token={token}"
+    return url
+
+
+@pytest.fixture
+def make_room(db, make):
+    def room(user=None) -> ChatRoom:
+        room = ChatRoom(user_id=(user or make.user()).id, veterinarian_id=make.veterinarian().id)
+        db.add(room)
+        db.commit()
+        db.refresh(room)
+        return room
+    return room
+
+
+@pytest.fixture
+def room(make_room):
+    return make_room()
+
+
+def test_websocket_rejects_non_members(client, make, room, ws_url):
+    with pytest.raises(WebSocketDisconnect) as exc:
+        with client.websocket_connect(ws_url(room, make.user())) as websocket:
+            websocket.receive_text()
+    assert exc.value.code == 1008
+
+
+def test_websocket_closes_on_empty_message(client, db, room, ws_url):
+    with client.websocket_connect(ws_url(room, room.veterinarian.user)) as websocket:
+        websocket.send_text("hello")
+        assert websocket.receive_text() == "Message: hello"
+        websocket.send_text("")
+        with pytest.raises(WebSocketDisconnect) as exc:
+            websocket.receive_text()
+    assert exc.value.code == 1008
+    assert manager.active_connections == {}
+
+
+def test_messages_stay_in_their_room(client, make_room, ws_url):
+    first, second = make_room(), make_room()
+    with client.websocket_connect(ws_url(first, first.user)) as first_owner, \
+            client.websocket_connect(ws_url(first, first.veterinarian.user)) as first_vet, \
+            client.websocket_connect(ws_url(second, second.user)) as second_owner:
+        first_owner.send_text("for the first room")
+        assert first_owner.receive_text() == "Message: for the first room"
+        assert first_vet.receive_text() == "Message: for the first room"
+
+        second_owner.send_text("for the second room")
+        # The first room's message was never queued on this socket
+        assert second_owner.receive_text() == "Message: for the second room"
+    assert manager.active_connections == {}
+
+
+def test_room_list_etag_changes_when_a_room_is_added(client, make, auth_headers, make_room):
+    owner = make.user()
+    headers = auth_headers(owner)
+    make_room(owner)
+    etag = client.get("/v1/chat/user-rooms", headers=headers).headers["ETag"]
+    assert client.get("/v1/chat/user-rooms", headers={**headers, "If-None-Match": etag}).status_code == 304
+    make_room(owner)
+    response = client.get("/v1/chat/user-rooms", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200 and len(response.json()) == 2
@@ -0,0 +1,23 @@
+from src.auth.models import UserRole
+
+
+def test_loop_blocking_requires_admin(client, make, auth_headers):
+    assert client.get("/loop-blocking").status_code == 401
+    assert client.get("/loop-blocking", headers=auth_headers(make.user())).status_code == 403
+    assert client.delete("/loop-blocking", headers=auth_headers(make.user())).status_code == 403
+
+
+def test_loop_blocking_for_admin(client, make, auth_headers):
+    headers = auth_headers(make.user(role=UserRole.admin))
+    assert client.get("/loop-blocking", headers=headers).json() == {"enabled": False}
+    assert client.delete("/loop-blocking", headers=headers).status_code == 200
+
+
+def test_capacity_endpoints_require_admin(client, make, auth_headers):
+    user_headers = auth_headers(make.user())
+    admin_headers = auth_headers(make.user(role=UserRole.admin))
+    for path in ("/admission", "/pool"):
+        assert client.get(path).status_code == 401
+        assert client.get(path, headers=user_headers).status_code == 403
+        assert client.get(path, headers=admin_headers).status_code == 200
+    assert "default" in client.get("/admission", headers=admin_headers).json()
@@ -0,0 +1,54 @@
+import asyncio
+import threading
+
+from src.events import services
+from src.events.services import EventBus, event_bus
+from tests.test_auth_tokens import refresh_token_for
+
+
+def test_appointment_updates_reach_owner_and_veterinarian(client, make, auth_headers):
+    owner, vet = make.user(), make.veterinarian()
+    appointment = make.appointment(owner, vet)
+    headers = auth_headers(owner)
+
+    async def scenario():
+        owner_queue = event_bus.subscribe([f"user:{owner.id}"])
+        vet_queue = event_bus.subscribe([f"vet:{vet.id}"])
+        other_queue = event_bus.subscribe([f"user:{owner.id + 1000}"])
+        try:
+            response = await asyncio.to_thread(client.put, f"/v1/appointments/{appointment.id}", json={"status": "confirmed"}, headers=headers)
+            assert response.status_code == 200
+            events = [await asyncio.wait_for(queue.get(), 2) for queue in (owner_queue, vet_queue)]
+            assert other_queue.empty()
+            return events
+        finally:
+            event_bus.unsubscribe([f"user:{owner.id}"], owner_queue)
+            event_bus.unsubscribe([f"vet:{vet.id}"], vet_queue)
+            event_bus.unsubscribe([f"user:{owner.id + 1000}"], other_queue)
+
+    events = asyncio.run(scenario())
+    assert [(event["type"], event["id"], event["status"]) for event in events] == [("appointment.updated", appointment.id, "confirmed")] * 2
+
+
+def test_slow_subscribers_drop_the_oldest_events(monkeypatch):
+    monkeypatch.setattr(services, "SUBSCRIBER_QUEUE_SIZE", 2)
+    bus = EventBus()
+
+    async def scenario():
+        queue = bus.subscribe(["user:1"])
+        # Published from another thread, as the threadpool routes and the reminder timers do
+        publisher = threading.Thread(target=lambda: [bus.publish(["user:1"], {"n": n}) for n in range(3)])
+        publisher.start()
+        publisher.join()
+        await asyncio.sleep(0.05)
+        received = [queue.get_nowait()["n"] for _ in range(queue.qsize())]
+        bus.unsubscribe(["user:1"], queue)
+        return received
+
+    assert asyncio.run(scenario()) == [1, 2]
+    assert bus.subscriber_count() == 0
+
+
+def test_stream_requires_an_access_token(client, make):
+    assert client.get("/v1/events/stream").status_code == 401
+    assert client.get("/v1/events/stream", params={"access_token": refresh_token_for(make.user())}).status_code == 401
@@ -0,0 +1,61 @@
+"""fields= loads only the selected columns; anything else raises instead of lazy loading, so a 200 proves none was touched."""
+from src.petlisting.models import PetListing, PetImage
+
+
+def selected_columns(stats, table):
+    """The column lists of the SELECTs against table, without their WHERE clauses."""
+    statements = [" ".join(statement.split()) for statement in stats.statements]
+    return [statement.split(" FROM ")[0] for statement in statements if statement.startswith("SELECT") and f" FROM {table}" in statement]
+
+
+def test_appointment_fields(client, make, auth_headers, query_budget):
+    owner, vet = make.user(), make.veterinarian()
+    for _ in range(3):
+        make.appointment(owner, vet, notes="Bring the vaccination card")
+    headers = auth_headers(owner)
+    with query_budget(2) as stats:
+        response = client.get("/v1/appointments/", params={"fields": "appointment_date,status"}, headers=headers)
+    assert response.status_code == 200
+    assert [set(row) for row in response.json()] == [{"id", "appointment_date", "status"}] * 3
+    [columns] = [columns for columns in selected_columns(stats, "appointments") if "count(" not in columns]
+    assert "notes" not in columns
+
+
+def test_nearby_vet_fields(client, make, auth_headers, query_budget):
+    make.veterinarian(qualification_document="https://example.invalid/diploma.pdf")
+    headers = auth_headers(make.user())
+    with query_budget(1) as stats:
+        response = client.post("/v1/vet/nearby", params={"fields": "clinic_name"}, json={"latitude": 6.52, "longitude": 3.38}, headers=headers)
+    assert response.status_code == 200
+    assert set(response.json()[0]) == {"id", "clinic_name"}
+    [columns] = selected_columns(stats, "veterinarians")
+    assert "qualification_document" not in columns and "latitude" in columns
+
+
+def test_listing_search_fields(client, db, make, query_budget):
+    owner = make.user()
+    listing = PetListing(
+        title="Sparse macaw", description="A very long description " * 20, price=900, location="Abuja",
+        pet_type="parrot", breed="macaw", age=4, sex="male", user_id=owner.id
+    )
+    db.add(listing)
+    db.commit()
+    db.add(PetImage(pet_listing_id=listing.id, image_url="https://example.invalid/macaw.png"))
+    db.commit()
+
+    with query_budget(1) as stats:
+        cards = client.get("/v1/listings/search", params={"search_term": "Sparse macaw", "fields": "title,price"})
+    assert cards.status_code == 200
+    assert cards.json() == [{"id": listing.id, "title": "Sparse macaw", "price": 900.0}]
+    assert "description" not in selected_columns(stats, "pet_listings")[0]
+
+    # Images are a relationship: selected, they come from one extra selectin query
+    with query_budget(2):
+        cards = client.get("/v1/listings/search", params={"search_term": "Sparse macaw", "fields": "title,images"})
+    assert [len(card["images"]) for card in cards.json()] == [1]
+
+
+def test_unknown_fields_are_rejected(client, make, auth_headers):
+    response = client.get("/v1/appointments/", params={"fields": "status,password"}, headers=auth_headers(make.user()))
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Unknown fields: password"
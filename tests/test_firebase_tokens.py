@@ -0,0 +1,85 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from jose import jwt
+
+from src.firebase_tokens import FirebaseTokenVerifier
+
+PROJECT_ID = "vetlink-test"
+
+
+@pytest.fixture(scope="module")
+def signing_key():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "securetoken.system.gserviceaccount.com")])
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(datetime.utcnow() - timedelta(days=1))
+        .not_valid_after(datetime.utcnow() + timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    private_pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+    return private_pem.decode(), cert.public_bytes(serialization.Encoding.PEM).decode()
+
+
+def id_token(private_pem: str, kid: str = "key-1", **claims) -> str:
+    now = int(time.time())
+    claims = {
+        "iss": f"https://securetoken.google.com/{PROJECT_ID}", "aud": PROJECT_ID, "sub": "firebase-uid",
+        "iat": now, "exp": now + 3600, "auth_time": now, **claims,
+    }
+    return jwt.encode(claims, private_pem, algorithm="RS256", headers={"kid": kid})
+
+
+class FakeCerts:
+    """Serves the test certificate the way Google's endpoint does, counting fetches."""
+
+    def __init__(self, cert_pem: str, delay: float = 0):
+        self.cert_pem = cert_pem
+        self.delay = delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        return {"key-1": self.cert_pem}, 3600
+
+
+def test_verifies_locally_signed_token(signing_key):
+    private_pem, cert_pem = signing_key
+    verifier = FirebaseTokenVerifier(PROJECT_ID, fetch_certs=FakeCerts(cert_pem))
+    claims = verifier.verify(id_token(private_pem))
+    assert claims["uid"] == "firebase-uid"
+
+
+def test_rejects_wrong_audience_and_unknown_key(signing_key):
+    private_pem, cert_pem = signing_key
+    verifier = FirebaseTokenVerifier(PROJECT_ID, fetch_certs=FakeCerts(cert_pem))
+    with pytest.raises(ValueError):
+        verifier.verify(id_token(private_pem, aud="another-project"))
+    with pytest.raises(ValueError, match="unknown key"):
+        verifier.verify(id_token(private_pem, kid="key-2"))
+
+
+def test_expired_certs_are_fetched_once_under_concurrency(signing_key):
+    private_pem, cert_pem = signing_key
+    fetch_certs = FakeCerts(cert_pem, delay=0.2)
+    verifier = FirebaseTokenVerifier(PROJECT_ID, fetch_certs=fetch_certs)
+    token = id_token(private_pem)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        claims = list(pool.map(verifier.verify, [token] * 8))
+    assert all(claim["uid"] == "firebase-uid" for claim in claims)
+    assert fetch_certs.calls == 1
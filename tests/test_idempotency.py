@@ -0,0 +1,32 @@
+from src.chat.models import ChatRoom
+from src.idempotency.models import IdempotencyRecord
+from src.idempotency.services import IDEMPOTENCY_CACHE_BYTES, _completed
+
+
+def test_retry_replays_the_stored_response(client, db, make, auth_headers):
+    owner = make.user()
+    headers = {**auth_headers(owner), "Idempotency-Key": f"create-room-{owner.id}"}
+    first = client.post("/v1/chat/rooms", json={}, headers=headers)
+    retry = client.post("/v1/chat/rooms", json={}, headers=headers)
+
+    assert first.status_code == retry.status_code == 200
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.json() == first.json()
+    assert db.query(ChatRoom).filter(ChatRoom.user_id == owner.id).count() == 1
+
+
+def test_token_responses_are_never_stored(client, db):
+    headers = {"Idempotency-Key": "signup-no-store"}
+    body = {"email": "no-store@example.com", "password": "password123"}
+    response = client.post("/v1/auth/signup", json=body, headers=headers)
+
+    assert response.status_code == 201
+    assert response.headers["Cache-Control"] == "no-store"
+    assert db.query(IdempotencyRecord).filter(IdempotencyRecord.key.endswith(":signup-no-store")).count() == 0
+    # The retry runs again instead of replaying the tokens
+    assert client.post("/v1/auth/signup", json=body, headers=headers).status_code == 409
+
+
+def test_replay_cache_is_bounded_by_body_bytes():
+    assert _completed.maxsize == IDEMPOTENCY_CACHE_BYTES
+    assert _completed.getsizeof(("fingerprint", 200, "application/json", b"x" * 1000)) > 1000
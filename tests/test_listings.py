@@ -0,0 +1,61 @@
+import io
+
+import pytest
+
+LISTING = {
+    "title": "Zebra finch pair", "description": "Hand raised", "price": 40, "location": "Lagos",
+    "pet_type": "bird", "breed": "zebra finch", "age": 1, "sex": "pair",
+}
+
+
+@pytest.fixture
+def listing(client, make, auth_headers):
+    headers = auth_headers(make.user())
+    response = client.post("/v1/listings/", json=LISTING, headers=headers)
+    assert response.status_code == 201
+    return response.json(), headers
+
+
+def search_titles(client, term):
+    return sorted(listing["title"] for listing in client.get("/v1/listings/search", params={"search_term": term}).json())
+
+
+def test_cached_reads_and_revalidation(client, query_budget, listing):
+    created, _ = listing
+    url = f"/v1/listings/{created['id']}"
+    first = client.get(url)
+    etag = first.headers["ETag"]
+    # Served from the cache without touching the database
+    with query_budget(0):
+        assert client.get(url).json() == first.json()
+        assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_create_invalidates_searches(client, listing):
+    _, headers = listing
+    before = search_titles(client, "Zebra finch")
+    assert client.post("/v1/listings/", json={**LISTING, "title": "Zebra finch trio"}, headers=headers).status_code == 201
+    assert search_titles(client, "Zebra finch") == sorted(before + ["Zebra finch trio"])
+
+
+def test_update_invalidates_the_listing_and_searches(client, listing):
+    created, headers = listing
+    url = f"/v1/listings/{created['id']}"
+    etag = client.get(url).headers["ETag"]
+    assert "Zebra finch pair" in search_titles(client, "Zebra finch")
+
+    assert client.put(url, json={"title": "Zebra finch pair (reserved)"}, headers=headers).status_code == 200
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["title"] == "Zebra finch pair (reserved)"
+    assert "Zebra finch pair (reserved)" in search_titles(client, "Zebra finch")
+
+
+def test_image_upload_invalidates_the_listing(client, listing):
+    created, headers = listing
+    url = f"/v1/listings/{created['id']}"
+    assert client.get(url).json()["images"] == []
+
+    files = {"images": ("finch.png", io.BytesIO(b"\x89PNG\r\n\x1a\n"), "image/png")}
+    assert client.post(f"{url}/images/", files=files, headers=headers).status_code == 200
+    assert len(client.get(url).json()["images"]) == 1
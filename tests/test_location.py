@@ -0,0 +1,66 @@
+import pytest
+
+from src.auth import location
+from src.auth.location import LocationBuffer, location_buffer
+from src.auth.models import User
+from src.database import SessionLocal
+
+
+@pytest.fixture
+def buffer(monkeypatch):
+    # Flushed by the tests, not by the background thread
+    monkeypatch.setattr(location_buffer, "_ensure_flusher", lambda: None)
+    location_buffer.flush()
+    return location_buffer
+
+
+def stored_position(db, user):
+    db.expire_all()
+    return tuple(db.query(User.latitude, User.longitude).filter(User.id == user.id).one())
+
+
+def test_positions_are_buffered_until_flushed(client, db, make, auth_headers, buffer):
+    user = make.user(latitude=6.52, longitude=3.38)
+    headers = auth_headers(user)
+    response = client.put("/v1/auth/location", json={"latitude": 6.60, "longitude": 3.40}, headers=headers)
+    assert response.status_code == 202 and response.json()["accepted"] is True
+
+    # Profile shows the buffered position, the users table still has the old one
+    profile = client.get("/v1/auth/profile", headers=headers).json()
+    assert (profile["latitude"], profile["longitude"]) == (6.60, 3.40)
+    assert stored_position(db, user) == (6.52, 3.38)
+
+    assert buffer.flush() == 1
+    assert stored_position(db, user) == (6.60, 3.40)
+    assert buffer.latest(user.id) is None
+
+
+def test_near_duplicates_are_dropped(client, make, auth_headers, buffer):
+    headers = auth_headers(make.user(latitude=6.52, longitude=3.38))
+    # About 11 m from the stored position
+    assert client.put("/v1/auth/location", json={"latitude": 6.5201, "longitude": 3.38}, headers=headers).json()["accepted"] is False
+    assert client.put("/v1/auth/location", json={"latitude": 6.53, "longitude": 3.38}, headers=headers).json()["accepted"] is True
+    # About 11 m from the position just accepted
+    assert client.put("/v1/auth/location", json={"latitude": 6.5301, "longitude": 3.38}, headers=headers).json()["accepted"] is False
+
+
+def test_failed_flush_keeps_positions_pending(make, monkeypatch, caplog):
+    user = make.user(latitude=None, longitude=None)
+    buffer = LocationBuffer()
+    monkeypatch.setattr(buffer, "_ensure_flusher", lambda: None)
+    assert buffer.record(user, 6.60, 3.40)
+
+    def unavailable_session():
+        session = SessionLocal()
+        def execute(*args, **kwargs):
+            raise RuntimeError("database unavailable")
+        session.execute = execute
+        return session
+    monkeypatch.setattr(location, "SessionLocal", unavailable_session)
+    assert buffer.flush() == 0
+    assert buffer.latest(user.id) == (6.60, 3.40)
+    assert "Failed to flush 1 buffered locations" in caplog.text
+
+    monkeypatch.undo()
+    assert buffer.flush() == 1
+    assert buffer.latest(user.id) is None
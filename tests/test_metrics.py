@@ -0,0 +1,60 @@
+import pytest
+from exponent_server_sdk import PushServerError
+from prometheus_client import REGISTRY
+
+from src import notifications
+from tests.fakes import FakePushClient
+
+
+def sample_value(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+class FailingPushClient:
+    def __init__(self, error):
+        self.error = error
+
+    def publish(self, message):
+        raise self.error
+
+
+def test_requests_are_counted_by_route_template(client, make, auth_headers):
+    headers = auth_headers(make.user())
+    labels = {"method": "GET", "route": "/v1/appointments/{appointment_id}", "status": "404"}
+    before = sample_value("http_requests_total", **labels)
+    assert client.get("/v1/appointments/987654", headers=headers).status_code == 404
+    assert sample_value("http_requests_total", **labels) == before + 1
+
+    unmatched = {"method": "GET", "route": "unmatched", "status": "404"}
+    before = sample_value("http_requests_total", **unmatched)
+    client.get("/no/such/path/1234")
+    assert sample_value("http_requests_total", **unmatched) == before + 1
+
+
+def test_scrape_includes_pool_and_admission_gauges(client):
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'db_pool_events{engine="primary",event="checkouts"}' in response.text
+    assert 'admission_requests{route_class="default",state="admitted"}' in response.text
+
+
+def test_push_sends_are_timed():
+    before = sample_value("push_notification_duration_seconds_count")
+    published = len(FakePushClient.published)
+    notifications.send_push_notification("ExponentPushToken[metrics]", "New Message", "Hello")
+    assert sample_value("push_notification_duration_seconds_count") == before + 1
+    assert FakePushClient.published[published].to == "ExponentPushToken[metrics]"
+
+
+@pytest.mark.parametrize("error, reason", [
+    (PushServerError("Bad gateway", None), "push_server_error"),
+    (ConnectionError("Connection reset"), "error"),
+])
+def test_push_failures_are_counted_by_reason(monkeypatch, error, reason):
+    monkeypatch.setattr(notifications, "PushClient", lambda: FailingPushClient(error))
+    before = sample_value("push_notification_failures_total", reason=reason)
+    timed = sample_value("push_notification_duration_seconds_count")
+    notifications.send_push_notification("ExponentPushToken[metrics]", "New Message", "Hello")
+    assert sample_value("push_notification_failures_total", reason=reason) == before + 1
+    assert sample_value("push_notification_duration_seconds_count") == timed + 1
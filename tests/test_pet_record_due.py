@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.petRecord.models import PetRecordDueItem
+from src.petRecord.services import send_due_reminders
+
+
+def day(offset: int) -> datetime:
+    return datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=offset)
+
+
+@pytest.fixture
+def record_with_due_items(client, make, auth_headers):
+    owner, veterinarian = make.user(), make.veterinarian()
+    appointment = make.appointment(owner, veterinarian)
+    body = {
+        "pet_name": "Rex", "pet_type": "dog", "breed": "mixed", "age": 3, "weight": 12.5, "sex": "male",
+        "condition": "Healthy", "treatment": "None",
+        "vaccinations": f"Rabies: {day(2):%Y-%m-%d}; Parvo due {day(20):%Y-%m-%d}",
+        "follow_up_date": day(3).isoformat(),
+    }
+    vet_headers = auth_headers(veterinarian.user)
+    response = client.post(f"/v1/pet-records/?appointment_id={appointment.id}", json=body, headers=vet_headers)
+    assert response.status_code == 201
+    return owner, vet_headers, response.json()["id"]
+
+
+def test_due_route_lists_items_in_the_window(client, auth_headers, record_with_due_items):
+    owner, vet_headers, record_id = record_with_due_items
+    owner_items = client.get("/v1/pet-records/due", headers=auth_headers(owner)).json()
+    assert [(item["kind"], item["description"], item["pet_name"]) for item in owner_items] == [
+        ("vaccination", "Rabies", "Rex"), ("follow_up", "Follow-up visit", "Rex"),
+    ]
+    vet_items = client.get("/v1/pet-records/due", params={"days": 30}, headers=vet_headers).json()
+    assert [item["description"] for item in vet_items if item["pet_record_id"] == record_id] == ["Rabies", "Follow-up visit", "Parvo"]
+
+
+def test_editing_one_date_keeps_the_other_reminders(client, db, record_with_due_items):
+    _, vet_headers, record_id = record_with_due_items
+    assert send_due_reminders(db, days_ahead=5) >= 2
+
+    response = client.put(f"/v1/pet-records/{record_id}", json={"follow_up_date": day(10).isoformat()}, headers=vet_headers)
+    assert response.status_code == 200
+
+    db.expire_all()
+    items = {item.description: item for item in db.query(PetRecordDueItem).filter(PetRecordDueItem.pet_record_id == record_id)}
+    assert set(items) == {"Rabies", "Parvo", "Follow-up visit"}
+    assert items["Rabies"].reminded_at is not None
+    assert items["Follow-up visit"].due_date == day(10)
+    assert items["Follow-up visit"].reminded_at is None
+    # Nothing already sent goes out again
+    assert all(item.pet_record_id != record_id for item in db.query(PetRecordDueItem).filter(
+        PetRecordDueItem.reminded_at.is_(None), PetRecordDueItem.due_date < day(5)
+    ))
+
+
+def test_reminders_are_sent_once(db, record_with_due_items):
+    _, _, record_id = record_with_due_items
+    assert send_due_reminders(db, days_ahead=5) >= 2
+    assert send_due_reminders(db, days_ahead=5) == 0
+    reminded = db.query(PetRecordDueItem).filter(PetRecordDueItem.pet_record_id == record_id, PetRecordDueItem.reminded_at.isnot(None))
+    assert sorted(item.description for item in reminded) == ["Follow-up visit", "Rabies"]
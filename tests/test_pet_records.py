@@ -0,0 +1,150 @@
+"""Pet record routes authorize from PetRecord.user_id; statement counts must not grow with the number of records."""
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.petRecord import services
+from src.petRecord.models import PetRecordRevision
+
+
+@pytest.fixture
+def owner_records(make):
+    owner, veterinarian = make.user(), make.veterinarian()
+    records = [make.pet_record(make.appointment(owner, veterinarian), pet_name=f"Pet {i}") for i in range(10)]
+    return owner, veterinarian, records
+
+
+def test_owner_list(client, auth_headers, query_budget, owner_records):
+    owner, _, records = owner_records
+    headers = auth_headers(owner)
+    # Version check for the ETag, then the rows
+    with query_budget(2):
+        response = client.get("/v1/pet-records/", headers=headers)
+    assert response.status_code == 200
+    # Row attributes are reloaded here, after the budgeted block
+    assert sorted(record["id"] for record in response.json()) == sorted(record.id for record in records)
+
+
+def test_veterinarian_list(client, auth_headers, query_budget, owner_records):
+    _, veterinarian, records = owner_records
+    headers = auth_headers(veterinarian.user)
+    with query_budget(2):
+        response = client.get("/v1/pet-records/", headers=headers)
+    assert response.status_code == 200
+    assert len(response.json()) == len(records)
+
+
+def test_list_with_fields(client, auth_headers, query_budget, owner_records):
+    owner, _, records = owner_records
+    headers = auth_headers(owner)
+    with query_budget(2):
+        response = client.get("/v1/pet-records/", params={"fields": "pet_name,follow_up_date"}, headers=headers)
+    assert response.status_code == 200
+    assert set(response.json()[0]) == {"id", "pet_name", "follow_up_date"}
+
+
+def test_get_by_owner(client, auth_headers, query_budget, owner_records):
+    owner, _, records = owner_records
+    url, headers = f"/v1/pet-records/{records[0].id}", auth_headers(owner)
+    with query_budget(1):
+        response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["pet_name"] == "Pet 0"
+
+
+def test_get_by_other_user_is_forbidden(client, make, auth_headers, query_budget, owner_records):
+    _, _, records = owner_records
+    url, headers = f"/v1/pet-records/{records[0].id}", auth_headers(make.user())
+    with query_budget(1):
+        response = client.get(url, headers=headers)
+    assert response.status_code == 403
+
+
+def test_history(client, auth_headers, query_budget, owner_records):
+    owner, veterinarian, records = owner_records
+    vet_headers = auth_headers(veterinarian.user)
+    for treatment in ("Rest", "Antibiotics", "Surgery"):
+        assert client.put(f"/v1/pet-records/{records[0].id}", json={"treatment": treatment}, headers=vet_headers).status_code == 200
+
+    url, headers = f"/v1/pet-records/{records[0].id}/history", auth_headers(owner)
+    with query_budget(2):
+        response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    assert [revision["revision"] for revision in response.json()] == [1, 2, 3]
+
+
+def test_export_ndjson_streams_only_the_callers_records(client, make, auth_headers, monkeypatch, owner_records):
+    owner, _, records = owner_records
+    make.pet_record(make.appointment(make.user(), make.veterinarian()), pet_name="Someone else's")
+    # Several fetch batches per export
+    monkeypatch.setattr(services, "EXPORT_BATCH_SIZE", 3)
+    response = client.get("/v1/pet-records/export", headers=auth_headers(owner))
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    exported = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(record["id"] for record in exported) == sorted(record.id for record in records)
+    assert set(exported[0]) == set(services.EXPORT_FIELDS)
+
+
+def test_export_csv_for_veterinarian(client, auth_headers, owner_records):
+    _, veterinarian, records = owner_records
+    response = client.get("/v1/pet-records/export", params={"format": "csv"}, headers=auth_headers(veterinarian.user))
+    assert response.status_code == 200
+    assert response.headers["content-disposition"] == 'attachment; filename="pet_records.csv"'
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert sorted(int(row["id"]) for row in rows) == sorted(record.id for record in records)
+    assert {row["pet_name"] for row in rows} == {record.pet_name for record in records}
+
+
+def test_export_since_and_empty_csv(client, make, auth_headers, owner_records):
+    owner, _, _ = owner_records
+    since = (datetime.utcnow() + timedelta(days=1)).isoformat()
+    assert client.get("/v1/pet-records/export", params={"since": since}, headers=auth_headers(owner)).text == ""
+    response = client.get("/v1/pet-records/export", params={"format": "csv"}, headers=auth_headers(make.user()))
+    assert response.text.strip() == ",".join(services.EXPORT_FIELDS)
+
+
+def test_versions_are_rebuilt_from_revision_deltas(client, db, auth_headers, owner_records):
+    owner, veterinarian, records = owner_records
+    record, vet_headers = records[0], auth_headers(veterinarian.user)
+    long_notes = "Observed overnight. " * 40  # Above REVISION_COMPRESS_THRESHOLD once it is a previous value
+    updates = [
+        {"treatment": "Rest"},
+        {"additional_notes": long_notes, "condition": "Recovering"},
+        {"additional_notes": "Discharged", "treatment": "None"},
+    ]
+    for update in updates:
+        assert client.put(f"/v1/pet-records/{record.id}", json=update, headers=vet_headers).status_code == 200
+
+    revisions = db.query(PetRecordRevision).filter(PetRecordRevision.pet_record_id == record.id).order_by(PetRecordRevision.revision).all()
+    assert [revision.compressed for revision in revisions] == [False, False, True]
+    assert len(revisions[2].delta) < len(long_notes)
+
+    headers = auth_headers(owner)
+    versions = [client.get(f"/v1/pet-records/{record.id}/versions/{revision}", headers=headers).json() for revision in range(4)]
+    assert [(version["treatment"], version["condition"], version["additional_notes"]) for version in versions] == [
+        ("None", "Healthy", None),
+        ("Rest", "Healthy", None),
+        ("Rest", "Recovering", long_notes),
+        ("None", "Recovering", "Discharged"),
+    ]
+    assert client.get(f"/v1/pet-records/{record.id}/versions/4", headers=headers).status_code == 404
+
+
+def test_list_etag_revalidates_until_a_record_changes(client, auth_headers, owner_records):
+    owner, veterinarian, records = owner_records
+    headers = auth_headers(owner)
+    etag = client.get("/v1/pet-records/", headers=headers).headers["ETag"]
+    assert client.get("/v1/pet-records/", headers={**headers, "If-None-Match": etag}).status_code == 304
+    # Each field selection is its own representation
+    fields_etag = client.get("/v1/pet-records/", params={"fields": "pet_name"}, headers=headers).headers["ETag"]
+    assert fields_etag != etag
+
+    vet_headers = auth_headers(veterinarian.user)
+    assert client.put(f"/v1/pet-records/{records[3].id}", json={"treatment": "Rest"}, headers=vet_headers).status_code == 200
+    response = client.get("/v1/pet-records/", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
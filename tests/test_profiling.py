@@ -0,0 +1,49 @@
+import pstats
+
+import pytest
+from starlette.testclient import TestClient
+
+from src import profiling
+from src.auth.models import UserRole
+from src.main import app
+from tests.test_auth_tokens import refresh_token_for
+
+
+@pytest.fixture
+def profiled_client(monkeypatch):
+    # The middleware is only installed when profiling is configured at startup, so wrap the app here
+    monkeypatch.setattr(profiling, "PROFILE_HEADER_ENABLED", True)
+    return TestClient(profiling.ProfilingMiddleware(app))
+
+
+def test_profiles_are_admin_only(client, make, auth_headers):
+    assert client.get("/v1/admin/profiles").status_code == 401
+    assert client.get("/v1/admin/profiles", headers=auth_headers(make.user())).status_code == 403
+    assert client.get("/v1/admin/profiles/1/pstats", headers=auth_headers(make.user())).status_code == 403
+
+
+def test_only_admins_can_request_a_profile(profiled_client, make, auth_headers):
+    user = make.user()
+    for headers in (auth_headers(user), {"Authorization": f"Bearer {refresh_token_for(user)}"}):
+        response = profiled_client.get("/v1/appointments/", headers={**headers, "X-Profile": "true"})
+        assert "x-profile-id" not in response.headers
+
+
+def test_admin_profile_summary_and_pstats_download(profiled_client, make, auth_headers, tmp_path):
+    headers = auth_headers(make.user(role=UserRole.admin))
+    response = profiled_client.get("/v1/appointments/", headers={**headers, "X-Profile": "true"})
+    assert response.status_code == 200
+    profile_id = int(response.headers["x-profile-id"])
+
+    listed = profiled_client.get("/v1/admin/profiles", headers=headers).json()
+    assert {"id": profile_id, "route": "/v1/appointments/", "reason": "header", "status_code": 200}.items() <= listed[0].items()
+    summary = profiled_client.get(f"/v1/admin/profiles/{profile_id}", headers=headers).text
+    assert summary.startswith("GET /v1/appointments/ (/v1/appointments/) -> 200")
+
+    download = profiled_client.get(f"/v1/admin/profiles/{profile_id}/pstats", headers=headers)
+    assert download.headers["content-disposition"] == f'attachment; filename="profile-{profile_id}.prof"'
+    path = tmp_path / "profile.prof"
+    path.write_bytes(download.content)
+    assert pstats.Stats(str(path)).total_calls > 0
+
+    assert profiled_client.get("/v1/admin/profiles/999999", headers=headers).status_code == 404
@@ -0,0 +1,54 @@
+"""Statement budgets for the hot read routes; a failure lists the statements that ran."""
+from src.petlisting.models import PetListing
+
+
+def test_profile(client, make, auth_headers, query_budget):
+    user = make.user()
+    headers = auth_headers(user)
+    with query_budget(1):
+        response = client.get("/v1/auth/profile", headers=headers)
+    assert response.status_code == 200
+
+
+def test_appointments_list(client, make, auth_headers, query_budget):
+    user, veterinarian = make.user(), make.veterinarian()
+    for _ in range(5):
+        make.appointment(user, veterinarian)
+    headers = auth_headers(user)
+    with query_budget(2):
+        response = client.get("/v1/appointments/", headers=headers)
+    assert response.status_code == 200
+    assert len(response.json()) == 5
+
+
+def test_appointments_list_not_modified(client, make, auth_headers, query_budget):
+    user, veterinarian = make.user(), make.veterinarian()
+    make.appointment(user, veterinarian)
+    headers = auth_headers(user)
+    etag = client.get("/v1/appointments/", headers=headers).headers["ETag"]
+    with query_budget(1):
+        response = client.get("/v1/appointments/", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
+
+
+def test_nearby_vets(client, make, auth_headers, query_budget):
+    for _ in range(5):
+        make.veterinarian()
+    headers = auth_headers(make.user())
+    with query_budget(1):
+        response = client.post("/v1/vet/nearby", json={"latitude": 6.52, "longitude": 3.38}, headers=headers)
+    assert response.status_code == 200
+    assert len(response.json()) >= 5
+
+
+def test_listing_search(client, db, make, query_budget):
+    owner = make.user()
+    db.add_all(PetListing(
+        title=f"Budget parrot {i}", description="Talks a lot", price=100, location="Lagos",
+        pet_type="parrot", breed="grey", age=2, sex="female", user_id=owner.id
+    ) for i in range(5))
+    db.commit()
+    with query_budget(2):
+        response = client.get("/v1/listings/search", params={"search_term": "Budget parrot"})
+    assert response.status_code == 200
+    assert len(response.json()) == 5
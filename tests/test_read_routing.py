@@ -0,0 +1,43 @@
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+from cachetools import TTLCache
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src import database
+from src.database import Base
+
+
+@pytest.fixture
+def replica(monkeypatch):
+    """An empty second SQLite database standing in for a replica that has not caught up."""
+    engine = create_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='vetlink-replica-'), 'replica.db')}")
+    Base.metadata.create_all(bind=engine)
+    monkeypatch.setattr(database, "replica_engine", engine)
+    monkeypatch.setattr(database, "ReplicaSessionLocal", sessionmaker(autocommit=False, autoflush=False, bind=engine))
+    monkeypatch.setattr(database, "last_writes", TTLCache(maxsize=100, ttl=60))
+    yield engine
+    engine.dispose()
+
+
+def test_reads_follow_a_bearer_clients_own_writes(client, make, auth_headers, replica):
+    vet = make.veterinarian()
+    writer, reader = make.user(), make.user()
+    make.appointment(reader, vet)
+    writer_headers, reader_headers = auth_headers(writer), auth_headers(reader)
+    client.cookies.clear()
+
+    # Nothing written through the API yet: reads go to the (empty) replica
+    assert client.get("/v1/appointments/", headers=reader_headers).json() == []
+
+    booking = {"veterinarian_id": vet.id, "appointment_date": (datetime.now() + timedelta(hours=2)).isoformat()}  # Inside a day: no reminder timer
+    assert client.post("/v1/appointments/", json=booking, headers=writer_headers).status_code == 201
+    client.cookies.clear()
+
+    # The writer reads its booking from the primary; other users still read the replica
+    assert len(client.get("/v1/appointments/", headers=writer_headers).json()) == 1
+    assert client.get("/v1/appointments/", headers=reader_headers).json() == []
+    assert f"user:{writer.id}" in database.last_writes
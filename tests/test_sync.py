@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta
+
+from src.sync.models import ChangeLog
+from src.sync.services import SYNC_SAFETY_WINDOW_SECONDS, prune_change_log
+
+
+def backdate(db, entity_id: int, age: timedelta) -> int:
+    row = db.query(ChangeLog).filter(ChangeLog.entity == "appointment", ChangeLog.entity_id == entity_id).one()
+    row.created_at = datetime.utcnow() - age
+    db.commit()
+    return row.id
+
+
+def appointment_ids(response) -> list:
+    return [appointment["id"] for appointment in response["appointments"]["upserted"]]
+
+
+def test_sync_token_stays_behind_the_safety_window(client, db, make, auth_headers):
+    owner, veterinarian = make.user(), make.veterinarian()
+    settled = make.appointment(owner, veterinarian)
+    settled_position = backdate(db, settled.id, timedelta(seconds=SYNC_SAFETY_WINDOW_SECONDS * 2))
+    recent = make.appointment(owner, veterinarian)
+    headers = auth_headers(owner)
+
+    snapshot = client.get("/v1/sync", headers=headers).json()
+    assert snapshot["full"] is True
+    assert sorted(appointment_ids(snapshot)) == [settled.id, recent.id]
+    assert snapshot["next_token"] == str(settled_position)
+
+    # The recent change is delivered, but the token does not move past it while it could still be uncommitted
+    delta = client.get("/v1/sync", params={"since": snapshot["next_token"]}, headers=headers).json()
+    assert delta["full"] is False
+    assert appointment_ids(delta) == [recent.id]
+    assert delta["next_token"] == str(settled_position)
+
+    # Once it settles, the token moves past it and it is not delivered again
+    recent_position = backdate(db, recent.id, timedelta(seconds=SYNC_SAFETY_WINDOW_SECONDS * 2))
+    delta = client.get("/v1/sync", params={"since": delta["next_token"]}, headers=headers).json()
+    assert appointment_ids(delta) == [recent.id]
+    assert delta["next_token"] == str(recent_position)
+    delta = client.get("/v1/sync", params={"since": delta["next_token"]}, headers=headers).json()
+    assert appointment_ids(delta) == []
+
+
+def test_client_behind_the_retention_horizon_gets_a_snapshot(client, db, make, auth_headers):
+    owner, veterinarian = make.user(), make.veterinarian()
+    old = [make.appointment(owner, veterinarian) for _ in range(3)]
+    positions = [backdate(db, appointment.id, timedelta(days=40)) for appointment in old]
+    # The log ages from its oldest row, so everything up to these rows is past the horizon too
+    db.query(ChangeLog).filter(ChangeLog.id <= positions[-1]).update({"created_at": datetime.utcnow() - timedelta(days=40)})
+    db.commit()
+    assert prune_change_log(db) >= 3
+    make.appointment(owner, veterinarian)
+
+    response = client.get("/v1/sync", params={"since": str(positions[0])}, headers=auth_headers(owner))
+    assert response.json()["full"] is True
+    assert len(appointment_ids(response.json())) == 4
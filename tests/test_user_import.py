@@ -0,0 +1,41 @@
+from src.auth.models import User, UserRole
+
+
+def test_csv_import_keeps_quoted_newlines(client, db, make, auth_headers):
+    headers = auth_headers(make.user(role=UserRole.admin))
+    body = (
+        'email,username,password\r\n'
+        'multi1@example.com,multi1,"first line\r\nsecond line"\r\n'
+        'multi2@example.com,multi2,password2\r\n'
+    )
+    response = client.post("/v1/auth/admin/import?format=csv", content=body, headers=headers)
+    assert response.json() == {"created": 2, "failed": 0, "errors": []}
+    assert db.query(User).filter(User.email.in_(["multi1@example.com", "multi2@example.com"])).count() == 2
+
+
+def test_csv_import_reports_unterminated_quote(client, make, auth_headers):
+    headers = auth_headers(make.user(role=UserRole.admin))
+    body = 'email,username\nunterminated@example.com,"unterminated\n'
+    response = client.post("/v1/auth/admin/import?format=csv", content=body, headers=headers)
+    assert response.json()["failed"] == 1
+
+
+def test_import_rejects_existing_email_in_any_case(client, make, auth_headers):
+    existing = make.user()
+    headers = auth_headers(make.user(role=UserRole.admin))
+    body = f"email\n{existing.email.upper()}\n"
+    response = client.post("/v1/auth/admin/import?format=csv", content=body, headers=headers)
+    assert response.json() == {"created": 0, "failed": 1, "errors": [{"row": 1, "error": "Email already in use"}]}
+
+
+def test_signup_and_import_agree_on_email_case(client, db, make, auth_headers):
+    headers = auth_headers(make.user(role=UserRole.admin))
+    body = "email,username\nMixed.Case@Example.com,mixedcase\n"
+    assert client.post("/v1/auth/admin/import?format=csv", content=body, headers=headers).json()["created"] == 1
+    assert db.query(User).filter(User.email == "mixed.case@example.com").count() == 1
+
+    response = client.post("/v1/auth/signup", json={"email": "MIXED.case@example.com", "password": "password1"})
+    assert response.status_code == 409
+
+    assert client.post("/v1/auth/signup", json={"email": "Signed.Up@Example.com", "password": "password1"}).status_code == 201
+    assert client.post("/v1/auth/token", json={"identifier": "signed.up@EXAMPLE.com", "password": "password1"}).status_code == 200
@@ -0,0 +1,42 @@
+import asyncio
+
+from src.auth.services import create_access_token, decode_access_token, user_token_claims
+
+REGISTRATION = {"clinic_name": "Harbour Vets", "specialty": ["surgery"], "services_offered": ["vaccination"], "latitude": 6.52, "longitude": 3.38}
+
+
+def test_registration_returns_tokens_with_veterinarian_claims(client, make, auth_headers):
+    old_headers = auth_headers(make.user())
+    response = client.post("/v1/vet/register", json=REGISTRATION, headers=old_headers)
+    assert response.status_code == 201
+    assert response.headers["Cache-Control"] == "no-store"
+    body = response.json()
+    assert body["clinic_name"] == "Harbour Vets"
+
+    claims = decode_access_token(body["access_token"])
+    assert (claims["role"], claims["vet"]) == ("veterinarian", body["id"])
+    new_headers = {"Authorization": f"Bearer {body['access_token']}"}
+    assert client.get("/v1/auth/profile", headers=new_headers).status_code == 200
+    assert client.post("/v1/auth/token/refresh", json=body["refresh_token"]).status_code == 200
+    assert client.get("/v1/auth/profile", headers=old_headers).status_code == 401
+
+
+def test_stale_token_version_is_rejected(client, db, make, auth_headers):
+    user = make.user()
+    headers = auth_headers(user)
+    claims = user_token_claims(user)
+    stale = asyncio.run(create_access_token(user.email, user.id, **{**claims, "token_version": claims["token_version"] - 1}))
+
+    assert client.get("/v1/auth/profile", headers=headers).status_code == 200
+    assert client.post("/v1/vet/nearby", json={"latitude": 6.52, "longitude": 3.38}, headers=headers).status_code == 200
+    stale_headers = {"Authorization": f"Bearer {stale}"}
+    assert client.get("/v1/auth/profile", headers=stale_headers).status_code == 401
+    assert client.post("/v1/vet/nearby", json={"latitude": 6.52, "longitude": 3.38}, headers=stale_headers).status_code == 401
+
+
+def test_nearby_falls_back_to_the_stored_location(client, make, auth_headers):
+    make.veterinarian()
+    headers = auth_headers(make.user())
+    assert client.post("/v1/vet/nearby", json={}, headers=headers).status_code == 200
+    headers = auth_headers(make.user(latitude=None, longitude=None))
+    assert client.post("/v1/vet/nearby", json={}, headers=headers).status_code == 400